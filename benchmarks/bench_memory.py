@@ -0,0 +1,61 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measure how many bytes each parsed SimulationDefinition keeps alive, for
+# sizing in-memory corpora
+from glossia.comparator.parse import gssa_xml_to_definition
+from glossia.comparator.synthetic import DocumentGenerator
+from lxml import etree as ET
+import argparse
+import gc
+import tracemalloc
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--definitions", type=int, default=1000)
+    parser.add_argument("--parameters", type=int, default=DocumentGenerator.parameters)
+    parser.add_argument("--needles", type=int, default=DocumentGenerator.needles)
+    parser.add_argument("--needle-parameters", type=int, default=DocumentGenerator.needle_parameters)
+    parser.add_argument("--regions", type=int, default=DocumentGenerator.regions)
+    parser.add_argument("--algorithms", type=int, default=DocumentGenerator.algorithms)
+    args = parser.parse_args()
+
+    # Each definition has its own seed, so values differ as they would in a
+    # real corpus, while names, types and IDs repeat
+    documents = [
+        DocumentGenerator(
+            parameters=args.parameters, needles=args.needles, needle_parameters=args.needle_parameters,
+            regions=args.regions, algorithms=args.algorithms, seed=seed
+        ).document()
+        for seed in range(args.definitions)
+    ]
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    definitions = [gssa_xml_to_definition(ET.fromstring(document)) for document in documents]
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("%d definitions, %d bytes each" % (len(definitions), (after - before) / len(definitions)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Time parsing, building and diffing of synthetic documents, and measure peak
+# memory, as each knob of the generator is scaled in turn. Results may be
+# written as JSON and compared against a previous run to spot regressions.
+from glossia.comparator.parse import gssa_xml_to_definition
+from glossia.comparator.synthetic import DocumentGenerator
+from lxml import etree as ET
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+AXES = ("parameters", "needles", "needle_parameters", "regions", "region_groups", "algorithms", "definition_lines")
+
+# Every axis starts from this baseline, and only that axis is scaled
+BASELINE = {
+    "parameters": 100,
+    "needles": 4,
+    "needle_parameters": 4,
+    "regions": 4,
+    "region_groups": 2,
+    "algorithms": 4,
+    "definition_lines": 50,
+}
+
+# Changes applied to the right-hand document, so that the diff has work to do
+PERTURBATION = {
+    "changed_parameters": 2,
+    "changed_needle_parameters": 2,
+    "changed_groups": 1,
+    "changed_definition": True,
+    "reordered_needles": True,
+}
+
+
+def _best(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def measure(knobs, repeat):
+    left_document, right_document = DocumentGenerator(**knobs).pair(**PERTURBATION)
+
+    parse, (left_root, right_root) = _best(
+        lambda: (ET.fromstring(left_document), ET.fromstring(right_document)), repeat
+    )
+    build, (left, right) = _best(
+        lambda: (gssa_xml_to_definition(left_root, "Left"), gssa_xml_to_definition(right_root, "Right")), repeat
+    )
+    diff, messages = _best(lambda: left.diff(right), repeat)
+
+    # Peak memory is taken over a separate, untimed run of the whole pipeline,
+    # as tracing slows everything down
+    tracemalloc.start()
+    gssa_xml_to_definition(ET.fromstring(left_document), "Left").diff(
+        gssa_xml_to_definition(ET.fromstring(right_document), "Right")
+    )
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "bytes": len(left_document) + len(right_document),
+        "parse_ms": parse * 1000,
+        "build_ms": build * 1000,
+        "diff_ms": diff * 1000,
+        "peak_kib": peak / 1024,
+        "messages": len(messages),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--axes", nargs="+", choices=AXES, default=list(AXES))
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 4, 16],
+                        help="Multiples of the baseline for the scaled axis")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Previous --json output to compare timings against")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="Slowdown factor, relative to --compare, reported as a regression")
+    args = parser.parse_args()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = {(r["axis"], r["scale"]): r for r in json.load(f)}
+
+    results = []
+    regressions = []
+    print("%-18s %6s %10s %10s %10s %10s %10s %8s" % (
+        "axis", "scale", "bytes", "parse ms", "build ms", "diff ms", "peak KiB", "messages"))
+    for axis in args.axes:
+        for scale in args.scales:
+            knobs = dict(BASELINE)
+            knobs[axis] = BASELINE[axis] * scale
+            result = measure(knobs, args.repeat)
+            result.update(axis=axis, scale=scale)
+            results.append(result)
+
+            print("%-18s %6d %10d %10.2f %10.2f %10.2f %10.1f %8d" % (
+                axis, scale, result["bytes"], result["parse_ms"], result["build_ms"],
+                result["diff_ms"], result["peak_kib"], result["messages"]))
+
+            earlier = previous.get((axis, scale))
+            if earlier:
+                for measurement in ("parse_ms", "build_ms", "diff_ms", "peak_kib"):
+                    if result[measurement] > earlier[measurement] * args.threshold:
+                        regressions.append("%s x%d: %s %.2f -> %.2f" % (
+                            axis, scale, measurement, earlier[measurement], result[measurement]))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print("  " + regression)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compare reloading a definition from the binary format against parsing
+# the original GSSA-XML
+from glossia.comparator.parse import gssa_xml_to_definition
+from glossia.comparator.serialize import dump_definition, load_definition
+from glossia.comparator.synthetic import DocumentGenerator
+from lxml import etree as ET
+import argparse
+import timeit
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--parameters", type=int, default=10000)
+    parser.add_argument("--needles", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    document = DocumentGenerator(parameters=args.parameters, needles=args.needles).document()
+    definition = gssa_xml_to_definition(ET.fromstring(document))
+
+    timings = {
+        'xml': lambda: gssa_xml_to_definition(ET.fromstring(document)),
+    }
+    for compress in (False, True):
+        data = dump_definition(definition, compress=compress)
+        label = 'binary%s' % (' (zlib)' if compress else '')
+        timings[label] = (lambda data=data: load_definition(data))
+        print("%-16s %10d bytes" % (label, len(data)))
+    print("%-16s %10d bytes" % ('xml', len(document)))
+
+    for label, load in timings.items():
+        best = min(timeit.repeat(load, number=1, repeat=args.repeat))
+        print("%-16s %10.2f ms" % (label, best * 1000))
+
+
+if __name__ == '__main__':
+    main()
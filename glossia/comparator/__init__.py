@@ -1 +1,11 @@
 from .comparator import Comparator
+from .batch import BatchComparator, compare_one_to_many, compare_many_to_many
+from .diff_record import DiffRecord, MISSING
+from .cache import DefinitionCache
+from .incremental import DiffState
+from .similarity import SimilarityIndex
+from .stats import ComparisonStats
+from .service import ComparisonService
+from .columnar import ParameterStore
+from .three_way import ThreeWayDiff
+from .memo import ResultMemo
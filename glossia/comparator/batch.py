@@ -0,0 +1,248 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from lxml import etree as ET
+import fnmatch
+import multiprocessing
+import os
+import time
+from .comparator import Comparator
+from .diff_record import format_records
+from .parse import gssa_xml_to_definition, parse_document
+
+# Definitions installed in each worker process by the pool initializer, so
+# that they are pickled once per worker rather than once per pair
+_worker_left = None
+_worker_right = None
+_worker_tolerances = None
+_worker_memo = None
+_worker_definition_diff = None
+_worker_parallel = False
+
+
+def _initialize_worker(left, right, tolerances=None, memo=None, definition_diff=None, parallel=False):
+    global _worker_left, _worker_right, _worker_tolerances, _worker_memo, _worker_definition_diff, _worker_parallel
+    _worker_left = left
+    _worker_right = right
+    _worker_tolerances = tolerances
+    _worker_memo = memo
+    _worker_definition_diff = definition_diff
+    _worker_parallel = parallel
+
+
+def _diff_pairs(pairs):
+    return [
+        (pair, format_records(
+            _worker_left[pair[0]].diff_records(_worker_right[pair[1]], _worker_tolerances),
+            definition_diff=_worker_definition_diff
+        ))
+        for pair in pairs
+    ]
+
+
+def _keyed(documents):
+    # Accept either a mapping of keys to documents or a plain sequence, which
+    # is keyed by position
+    if hasattr(documents, 'items'):
+        return dict(documents.items())
+    return dict(enumerate(documents))
+
+
+def parse_definitions(texts, label, cache=None):
+    """Parse a mapping (or sequence) of GSSA-XML strings into a dictionary of
+    SimulationDefinitions with the same keys, through a DefinitionCache if
+    given."""
+    if cache is not None:
+        return {key: cache.get(text, label) for key, text in _keyed(texts).items()}
+
+    return {
+        key: gssa_xml_to_definition(parse_document(text), label)
+        for key, text in _keyed(texts).items()
+    }
+
+
+# This class compares every left document against every right document,
+# parsing each exactly once and spreading the diffs over a process pool
+class BatchComparator:
+    processes = None
+    chunk_size = 16
+    tolerances = None
+    definition_diff = None
+
+    def __init__(self, left_texts, right_texts, processes=None, chunk_size=None, cache=None, tolerances=None,
+                 definition_diff=None):
+        self.left = parse_definitions(left_texts, "Left", cache)
+        self.right = parse_definitions(right_texts, "Right", cache)
+        self.processes = processes
+        self.tolerances = tolerances
+        self.definition_diff = definition_diff
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+
+    def diff(self, pairs=None):
+        """Return a dictionary mapping (left key, right key) to the diff
+        messages for that pair. By default, all pairs are compared."""
+        if pairs is None:
+            pairs = [(left_key, right_key) for left_key in self.left for right_key in self.right]
+
+        results = {}
+        pending = []
+
+        # Identical fingerprints mean an empty diff, so those pairs need not
+        # be sent to a worker at all
+        for left_key, right_key in pairs:
+            if self.left[left_key].fingerprint() == self.right[right_key].fingerprint():
+                results[(left_key, right_key)] = []
+            else:
+                pending.append((left_key, right_key))
+
+        if not pending:
+            return results
+
+        chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+
+        # A single process (or a single chunk) is not worth the pool overhead
+        if self.processes == 1 or len(chunks) == 1:
+            _initialize_worker(self.left, self.right, self.tolerances, definition_diff=self.definition_diff)
+            try:
+                for chunk in chunks:
+                    results.update(_diff_pairs(chunk))
+            finally:
+                _initialize_worker(None, None)
+        else:
+            initargs = (self.left, self.right, self.tolerances, None, self.definition_diff)
+            with multiprocessing.Pool(self.processes, _initialize_worker, initargs) as pool:
+                for chunk_results in pool.imap_unordered(_diff_pairs, chunks):
+                    results.update(chunk_results)
+
+        return results
+
+    def equal(self, pairs=None):
+        """Return a dictionary mapping (left key, right key) to equality."""
+        if pairs is None:
+            pairs = [(left_key, right_key) for left_key in self.left for right_key in self.right]
+
+        # Matching fingerprints are enough, but otherwise (allowing for
+        # tolerances) the pair is checked properly
+        return {
+            (left_key, right_key): (
+                self.left[left_key].fingerprint() == self.right[right_key].fingerprint() or
+                (self.tolerances is not None and self.left[left_key].matches(self.right[right_key], self.tolerances))
+            )
+            for left_key, right_key in pairs
+        }
+
+
+def compare_one_to_many(left_text, right_texts, processes=None, cache=None, definition_diff=None):
+    """Compare one document against many, returning a dictionary keyed as
+    right_texts is, with diff messages as values."""
+    comparator = BatchComparator([left_text], right_texts, processes, cache=cache, definition_diff=definition_diff)
+    return {right_key: messages for (_, right_key), messages in comparator.diff().items()}
+
+
+def compare_many_to_many(left_texts, right_texts, processes=None, cache=None, definition_diff=None):
+    """Compare every left document against every right document, returning
+    a dictionary keyed by (left key, right key) pairs."""
+    return BatchComparator(left_texts, right_texts, processes, cache=cache, definition_diff=definition_diff).diff()
+
+
+def directory_pairs(left_directory, right_directory, pattern="*.xml"):
+    """Pair up files with the same relative path under two directories
+    (searched recursively for names matching pattern). A file present on
+    only one side is paired with None."""
+    def found(directory):
+        paths = {}
+        for root, _, filenames in os.walk(directory):
+            for filename in fnmatch.filter(filenames, pattern):
+                path = os.path.join(root, filename)
+                paths[os.path.relpath(path, directory)] = path
+        return paths
+
+    left = found(left_directory)
+    right = found(right_directory)
+    return [(left.get(name), right.get(name)) for name in sorted(set(left) | set(right))]
+
+
+def manifest_pairs(manifest):
+    """Read (left, right) pairs of paths from a manifest file, one
+    tab-separated pair per line. Blank lines and lines starting with # are
+    skipped, and relative paths are taken from the manifest's directory."""
+    base = os.path.dirname(os.path.abspath(manifest))
+    pairs = []
+    with open(manifest, 'r') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            paths = line.split('\t')
+            if len(paths) != 2:
+                raise RuntimeError("%s:%d: expected two tab-separated paths" % (manifest, number))
+            pairs.append(tuple(os.path.join(base, path.strip()) for path in paths))
+
+    return pairs
+
+
+def _compare_file_pair(pair):
+    left, right = pair
+    result = {'left': left, 'right': right}
+    start = time.perf_counter()
+
+    # Anything wrong with this pair alone is reported in its record, rather
+    # than stopping the whole batch
+    try:
+        if left is None or right is None:
+            raise RuntimeError("No counterpart for %s" % (left or right))
+        messages = Comparator.from_files(
+            left, right, tolerances=_worker_tolerances, definition_diff=_worker_definition_diff,
+            parallel=_worker_parallel, memo=_worker_memo
+        ).diff()
+    except (RuntimeError, OSError, ValueError, ET.XMLSyntaxError) as e:
+        result['error'] = str(e)
+    else:
+        result['equal'] = not messages
+        result['messages'] = messages
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def compare_files(pairs, processes=None, tolerances=None, chunk_size=4, memo=None, definition_diff=None, parallel=False):
+    """Compare (left path, right path) pairs across a pool of worker
+    processes, yielding one result dictionary per pair, in order, as soon as
+    it is ready.
+
+    Each result holds the two paths, the time taken in seconds, and either
+    "equal" and "messages" or, if the pair could not be compared, "error".
+    With a ResultMemo, pairs compared before are answered from it (each
+    worker opening the same store). A DefinitionDiff and parallel are passed
+    on to Comparator.from_files for each pair.
+
+    """
+    initargs = (None, None, tolerances, memo, definition_diff, parallel)
+    if processes == 1 or len(pairs) <= 1:
+        _initialize_worker(*initargs)
+        try:
+            for pair in pairs:
+                yield _compare_file_pair(pair)
+        finally:
+            _initialize_worker(None, None)
+        return
+
+    with multiprocessing.Pool(processes, _initialize_worker, initargs) as pool:
+        yield from pool.imap(_compare_file_pair, pairs, chunk_size)
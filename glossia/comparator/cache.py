@@ -0,0 +1,147 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+import copy
+import hashlib
+import os
+import struct
+import tempfile
+import zlib
+from .parse import gssa_xml_to_definition, document_buffer, parse_document
+from .serialize import dump_definition, load_definition
+
+
+def document_key(document):
+    """Content hash of a raw GSSA-XML document (str, bytes or any other
+    buffer)."""
+    if isinstance(document, str):
+        document = document.encode('utf-8')
+    return hashlib.sha256(document).hexdigest()
+
+
+# This class sits in front of gssa_xml_to_definition, so that a document seen
+# before is not parsed, converted and constructed again
+class DefinitionCache:
+    """Parsed-definition cache keyed by a hash of the raw document.
+
+    The in-memory tier holds at most max_entries definitions, evicting the
+    least recently used. If a directory is given, definitions are also
+    written there, in the compact binary format of the serialize module, and
+    survive restarts; an in-memory miss falls through to it before parsing.
+
+    Definitions are shared between all callers asking for the same document
+    (only the label differs) and should be treated as read-only.
+
+    """
+    max_entries = 128
+    directory = None
+
+    def __init__(self, max_entries=None, directory=None):
+        if max_entries is not None:
+            self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def get(self, document, label="Simulation definition", strict=False):
+        """Return the SimulationDefinition for a document (anything
+        parse_document accepts), parsing it only if it is not already
+        cached."""
+        with document_buffer(document) as buffer:
+            return self._get(buffer, label, strict)
+
+    def _get(self, document, label, strict):
+        key = (document_key(document), strict)
+
+        definition = self._entries.get(key)
+        if definition is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        else:
+            definition = self._load(key)
+            if definition is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                definition = gssa_xml_to_definition(parse_document(document), label, strict)
+                self._store(key, definition)
+
+            self._entries[key] = definition
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        # The label is only used in messages, so a shallow copy sharing
+        # everything else is enough to relabel
+        if definition.name != label:
+            definition = copy.copy(definition)
+            definition.name = label
+
+        return definition
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+    def clear(self):
+        """Empty the in-memory tier (the on-disk tier is left intact)."""
+        self._entries.clear()
+
+    def _path(self, key):
+        digest, strict = key
+        return os.path.join(self.directory, '%s%s.def' % (digest, '-strict' if strict else ''))
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+
+        try:
+            with open(self._path(key), 'rb') as f:
+                return load_definition(f.read())
+        except FileNotFoundError:
+            return None
+        except (RuntimeError, ValueError, IndexError, struct.error, zlib.error):
+            # A corrupt or stale entry is simply treated as a miss
+            return None
+
+    def _store(self, key, definition):
+        if self.directory is None:
+            return
+
+        # Write atomically, so a concurrent reader never sees a partial file
+        handle, temporary = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(dump_definition(definition))
+            os.replace(temporary, self._path(key))
+        except BaseException:
+            os.unlink(temporary)
+            raise
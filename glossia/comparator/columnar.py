@@ -0,0 +1,187 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy
+from .parameters import canonical_value
+
+# Needle parameters are stored in columns named with this prefix, so they do
+# not collide with global parameters of the same name
+NEEDLE_PREFIX = "needle:"
+
+_COMPARISONS = {
+    '<': numpy.less,
+    '<=': numpy.less_equal,
+    '>': numpy.greater,
+    '>=': numpy.greater_equal,
+}
+
+_AGGREGATES = {
+    'count': len,
+    'min': numpy.min,
+    'max': numpy.max,
+    'sum': numpy.sum,
+    'mean': numpy.mean,
+}
+
+
+# One parameter across every row, dictionary-encoded: each distinct value is
+# held once, and each row holds only a code (-1 where the parameter is absent)
+class _Column:
+    __slots__ = ('codes', 'values', 'numbers', 'index')
+
+    def __init__(self, rows):
+        self.codes = numpy.full(rows, -1, dtype=numpy.int32)
+        self.values = []
+        self.numbers = []
+        self.index = {}
+
+    def add(self, row, value):
+        canonical = canonical_value(value)
+        code = self.index.get(canonical)
+        if code is None:
+            code = self.index[canonical] = len(self.values)
+            self.values.append(value)
+            # Numeric values are also kept as floats, for vectorized
+            # comparison (anything else is NaN, so never compares true)
+            self.numbers.append(float(canonical) if isinstance(canonical, (int, float)) else numpy.nan)
+        self.codes[row] = code
+
+    def freeze(self):
+        self.numbers = numpy.array(self.numbers, dtype=numpy.float64)
+
+
+# This class answers corpus-wide questions about parameter values without
+# visiting each definition in turn
+class ParameterStore:
+    """Columnar store of the parameters of many SimulationDefinitions.
+
+    There is one column per global parameter name, with a row per
+    definition, and one per needle parameter name (prefixed by
+    NEEDLE_PREFIX), with a row per needle. Columns are dictionary-encoded,
+    so distinct values are stored once and rows cost four bytes each.
+    Conditions are (column, operator, value) triples, where the operator is
+    one of ==, !=, <, <=, > or >=; ordering comparisons only hold for numeric
+    values.
+
+    """
+
+    def __init__(self, definitions):
+        items = list(definitions.items() if hasattr(definitions, 'items') else enumerate(definitions))
+        self.keys = [key for key, _ in items]
+
+        needles = [
+            (row, needle)
+            for row, (_, definition) in enumerate(items) if definition.numerical_model
+            for needle in definition.numerical_model.needles.values()
+        ]
+        # The definition row that each needle row belongs to
+        self.needle_rows = numpy.array([row for row, _ in needles], dtype=numpy.int32)
+
+        self._columns = {}
+        for row, (_, definition) in enumerate(items):
+            for name, parameter in definition.parameters.items():
+                self._add(name, len(items), row, parameter.value)
+        for needle_row, (_, needle) in enumerate(needles):
+            for name, parameter in needle.parameters.items():
+                self._add(NEEDLE_PREFIX + name, len(needles), needle_row, parameter.value)
+
+        for column in self._columns.values():
+            column.freeze()
+
+    def _add(self, name, rows, row, value):
+        column = self._columns.get(name)
+        if column is None:
+            column = self._columns[name] = _Column(rows)
+        column.add(row, value)
+
+    def columns(self):
+        return sorted(self._columns)
+
+    def _column(self, name):
+        if name not in self._columns:
+            raise RuntimeError("No parameter column %s" % name)
+        return self._columns[name]
+
+    def mask(self, name, operator, value):
+        """Boolean array over the rows of a column (definitions, or needles
+        for a needle column) where the condition holds."""
+        column = self._column(name)
+        present = column.codes >= 0
+
+        if operator in ('==', '!='):
+            code = column.index.get(canonical_value(value), -2)
+            equal = column.codes == code
+            return equal if operator == '==' else present & ~equal
+
+        if operator not in _COMPARISONS:
+            raise RuntimeError("Unknown operator %s" % operator)
+
+        numbers = column.numbers[column.codes] if len(column.numbers) else numpy.zeros(len(column.codes))
+        with numpy.errstate(invalid='ignore'):
+            return present & _COMPARISONS[operator](numbers, value)
+
+    def _definition_mask(self, name, mask):
+        # A needle row matching means its definition matches
+        if not name.startswith(NEEDLE_PREFIX):
+            return mask
+        result = numpy.zeros(len(self.keys), dtype=bool)
+        result[self.needle_rows[mask]] = True
+        return result
+
+    def query(self, *conditions):
+        """Keys of the definitions meeting all of the conditions (for a
+        needle column, by at least one of their needles)."""
+        selected = numpy.ones(len(self.keys), dtype=bool)
+        for name, operator, value in conditions:
+            selected &= self._definition_mask(name, self.mask(name, operator, value))
+        return [self.keys[row] for row in numpy.flatnonzero(selected)]
+
+    def histogram(self, name):
+        """(value, count) pairs for a column, most common first."""
+        column = self._column(name)
+        counts = numpy.bincount(column.codes[column.codes >= 0], minlength=len(column.values))
+        order = numpy.argsort(-counts, kind='stable')
+        return [(column.values[code], int(counts[code])) for code in order if counts[code]]
+
+    def aggregate(self, name, function):
+        """Apply count, min, max, sum or mean to the numeric values of a
+        column (None if there are none)."""
+        if function not in _AGGREGATES:
+            raise RuntimeError("Unknown aggregate %s" % function)
+
+        column = self._column(name)
+        numbers = column.numbers[column.codes[column.codes >= 0]] if len(column.numbers) else numpy.zeros(0)
+        numbers = numbers[~numpy.isnan(numbers)]
+        if function == 'count':
+            return len(numbers)
+        if not len(numbers):
+            return None
+        return float(_AGGREGATES[function](numbers))
+
+    def unusual(self, name):
+        """Keys of the definitions setting this parameter (or, for a needle
+        column, with a needle setting it) to anything other than its most
+        common value."""
+        column = self._column(name)
+        present = column.codes >= 0
+        if not present.any():
+            return []
+
+        usual = numpy.bincount(column.codes[present]).argmax()
+        mask = self._definition_mask(name, present & (column.codes != usual))
+        return [self.keys[row] for row in numpy.flatnonzero(mask)]
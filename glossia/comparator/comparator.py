@@ -16,8 +16,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from lxml import etree as ET
-from .parse import gssa_xml_to_definition
+from .diff_record import format_records
+from .memo import document_digest, file_digest, pair_key
+from .parse import gssa_xml_to_definition, gssa_xml_stream_to_definition, parse_document
+from .stats import NO_STATS, collector
+from .threads import shared_executor
 
 
 # This class sets up two SimulationDefinitions and instructs one to compare
@@ -25,27 +28,199 @@ from .parse import gssa_xml_to_definition
 class Comparator:
     left_text = None
     right_text = None
+    tolerances = None
+    stats = NO_STATS
+    definition_diff = None
+    sections = None
+    parallel = False
+    memo = None
+    memo_key = None
+    _pending = None
+    _structures = None
 
-    def __init__(self, left_text, right_text):
-        # ElementTree can still only handle byte-strings
-        self.left = ET.fromstring(bytes(left_text, 'utf-8'))
-        self.right = ET.fromstring(bytes(right_text, 'utf-8'))
+    def __init__(self, left_text, right_text, cache=None, tolerances=None, stats=None, definition_diff=None, sections=None, parallel=False,
+                 memo=None):
+        # Tolerances map parameter names or types to (absolute, relative)
+        # tolerances for numeric values (see SimulationDefinition.diff)
+        self.tolerances = tolerances
+
+        # A DefinitionDiff bounds how differing numerical model definitions
+        # are described
+        self.definition_diff = definition_diff
+
+        # If sections are selected (see select_sections), only those are
+        # converted and compared (the whole of each document is still parsed,
+        # except by from_files, which passes over unselected sections)
+        self.sections = sections
+
+        # A ComparisonStats (or a callback) collects per-phase timings and
+        # entity counts
+        self.stats = collector(stats)
+
+        # If parallel, the two sides are parsed and built at the same time,
+        # and sections compared concurrently, on a shared thread pool
+        self.parallel = parallel
+
+        self.left = None
+        self.right = None
+
+        # With a ResultMemo, a pair compared before with the same options is
+        # neither parsed nor compared again, so nothing is loaded until the
+        # result turns out to be needed
+        if memo is not None:
+            self.memo = memo
+            self.memo_key = pair_key(document_digest(left_text), document_digest(right_text), tolerances, sections, definition_diff)
+            self._pending = lambda: self._load(left_text, right_text, cache)
+        else:
+            self._load(left_text, right_text, cache)
+
+    def _load(self, left_text, right_text, cache):
+        # With a DefinitionCache, documents seen before are not parsed again
+        if cache is not None:
+            with self.stats.phase("build"):
+                self._set_structures(cache.get(left_text, "Left"), cache.get(right_text, "Right"))
+            return
+
+        # Documents may be text, bytes (or any buffer), open binary files or
+        # paths (see parse_document); only text needs re-encoding
+        with self.stats.phase("parse"):
+            self.left, self.right = self._both(parse_document, (left_text,), (right_text,))
+
+    @classmethod
+    def from_files(cls, left_file, right_file, huge_tree=False, tolerances=None, stats=None, definition_diff=None, sections=None,
+                   parallel=False, memo=None):
+        """Compare two GSSA-XML files (paths or binary file objects).
+
+        The definitions are built incrementally as each document is read, so
+        neither XML tree is ever fully held in memory (and parsing is timed
+        as part of the "build" phase). With a ResultMemo, files are first
+        read through once to hash them, so file objects must be seekable.
+
+        """
+        comparator = cls.__new__(cls)
+        comparator.left = None
+        comparator.right = None
+        comparator.tolerances = tolerances
+        comparator.definition_diff = definition_diff
+        comparator.sections = sections
+        comparator.stats = collector(stats)
+        comparator.parallel = parallel
+
+        def build():
+            with comparator.stats.phase("build"):
+                comparator._set_structures(*comparator._both(
+                    gssa_xml_stream_to_definition,
+                    (left_file, "Left", False, huge_tree, sections),
+                    (right_file, "Right", False, huge_tree, sections)
+                ))
+
+        if memo is not None:
+            comparator.memo = memo
+            comparator.memo_key = pair_key(file_digest(left_file), file_digest(right_file), tolerances, sections, definition_diff)
+            comparator._pending = build
+        else:
+            build()
+        return comparator
+
+    def _both(self, function, left_arguments, right_arguments):
+        # Apply the function to the arguments for each side, returning the
+        # pair of results. If parallel, the right side runs on the shared
+        # pool while the left runs here; either way, a failure on the left is
+        # raised in preference to one on the right
+        if not self.parallel:
+            return function(*left_arguments), function(*right_arguments)
+
+        right = shared_executor().submit(function, *right_arguments)
+        try:
+            left = function(*left_arguments)
+        except BaseException:
+            right.cancel()
+            raise
+        return left, right.result()
 
     def diff(self):
-        # We must construct SimulationDefinitions for both sides
-        # As we have a clear Left and Right, based on the initializing
-        # arguments, we name them accordingly in the output
-        left_structure = self.__analyse(self.left, "Left")
-        right_structure = self.__analyse(self.right, "Right")
+        if self.memo is not None:
+            messages = self.memo.get(self.memo_key)
+            if messages is not None:
+                self.stats.count("memo hits")
+                return messages
 
+        messages = self._diff()
+        if self.memo is not None:
+            self.memo.put(self.memo_key, messages)
+        return messages
+
+    def _diff(self):
         # The left definition runs a comparison against the right
-        return left_structure.diff(right_structure)
+        with self.stats.phase("compare"):
+            records = list(self.diff_records())
+        self.stats.count("records", len(records))
+
+        # Numerical model definitions are only unified-diffed when formatted,
+        # which may dominate, so that is timed on its own
+        definitions, others = [], []
+        for record in records:
+            is_definition = record.section == "Numerical Model" and record.field == "definition"
+            (definitions if is_definition else others).append(record)
+
+        with self.stats.phase("definition diff"):
+            messages = format_records(definitions, sort=False, definition_diff=self.definition_diff)
+
+        # Messages are sorted for readability, as SimulationDefinition.diff
+        with self.stats.phase("format"):
+            messages += format_records(others, sort=False)
+            messages.sort()
+        self.stats.count("messages", len(messages))
+
+        return messages
+
+    def diff_records(self):
+        """As diff, but yielding structured DiffRecords, unsorted and
+        unformatted."""
+        left_structure, right_structure = self.structures()
+        executor = shared_executor() if self.parallel else None
+        return left_structure.diff_records(right_structure, self.tolerances, self.stats, self.sections, executor)
 
     def equal(self):
-        return self.diff() == []
+        # A memoized result answers this without loading anything
+        if self.memo is not None:
+            messages = self.memo.get(self.memo_key)
+            if messages is not None:
+                self.stats.count("memo hits")
+                return not messages
+
+        # This stops at the first difference found, without building any
+        # messages or (unless tolerances are set) solving the needle
+        # assignment
+        left_structure, right_structure = self.structures()
+        with self.stats.phase("compare"):
+            return left_structure.matches(right_structure, self.tolerances, self.sections)
+
+    def structures(self):
+        """Return the (left, right) pair of SimulationDefinitions, building
+        them on first use."""
+        if self._structures is None and self._pending is not None:
+            load, self._pending = self._pending, None
+            load()
+
+        if self._structures is None:
+            # We must construct SimulationDefinitions for both sides
+            # As we have a clear Left and Right, based on the initializing
+            # arguments, we name them accordingly in the output
+            with self.stats.phase("build"):
+                self._set_structures(*self._both(self.__analyse, (self.left, "Left"), (self.right, "Right")))
+
+        return self._structures
+
+    def _set_structures(self, left_structure, right_structure):
+        self._structures = (left_structure, right_structure)
+        for structure in self._structures:
+            self.stats.count("parameters", len(structure.parameters))
+            if structure.numerical_model:
+                self.stats.count("needles", len(structure.numerical_model.needles))
 
     def __analyse(self, root, label):
         # In theory, we might want to something extra here, based on additional
         # parameters or settings, but for now we just return the parsed XML as a
         # SimulationDefinition
-        return gssa_xml_to_definition(root, label)
+        return gssa_xml_to_definition(root, label, sections=self.sections)
@@ -0,0 +1,205 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+def _matching_lines(a, b, max_edits):
+    """Myers' O(ND) diff of two sequences of line codes, returning the
+    (i, j) pairs of matching lines, or None if more than max_edits insertions
+    and deletions would be needed."""
+    n, m = len(a), len(b)
+    limit = n + m if max_edits is None else min(n + m, max_edits)
+    offset = limit + 1
+    v = [0] * (2 * limit + 3)
+
+    # Each step keeps only the diagonals it can reach, so the trace is
+    # O(D^2) rather than O(D(N + M))
+    trace = []
+    for d in range(limit + 1):
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+
+    return None
+
+
+def _backtrack(trace, x, y):
+    matches = []
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1 + d + 1] < v[k + 1 + d + 1]):
+            previous_k = k + 1
+        else:
+            previous_k = k - 1
+        previous_x = v[previous_k + d + 1]
+        previous_y = previous_x - previous_k
+
+        while x > previous_x and y > previous_y:
+            x -= 1
+            y -= 1
+            matches.append((x, y))
+
+        x, y = previous_x, previous_y
+
+    matches.reverse()
+    return matches
+
+
+def changed_blocks(this_lines, that_lines, max_edits=None):
+    """Return the (i1, i2, j1, j2) line ranges that differ between two lists
+    of lines, in order.
+
+    Lines are interned to integer codes, so each is hashed once and compared
+    as an integer thereafter, and any common prefix and suffix is trimmed
+    before the Myers diff proper. If the middle needs more than max_edits
+    line insertions and deletions, it is reported as a single block rather
+    than resolved further.
+
+    """
+    codes = {}
+    a = [codes.setdefault(line, len(codes)) for line in this_lines]
+    b = [codes.setdefault(line, len(codes)) for line in that_lines]
+    n, m = len(a), len(b)
+
+    prefix = 0
+    while prefix < n and prefix < m and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < n - prefix and suffix < m - prefix and a[n - 1 - suffix] == b[m - 1 - suffix]:
+        suffix += 1
+
+    if prefix == n and prefix == m:
+        return []
+
+    matches = _matching_lines(a[prefix:n - suffix], b[prefix:m - suffix], max_edits)
+    if matches is None:
+        return [(prefix, n - suffix, prefix, m - suffix)]
+
+    # Changed blocks are the gaps between runs of matching lines
+    blocks = []
+    i, j = 0, 0
+    for x, y in matches + [(n - suffix - prefix, m - suffix - prefix)]:
+        if x > i or y > j:
+            blocks.append((prefix + i, prefix + x, prefix + j, prefix + y))
+        i, j = x + 1, y + 1
+
+    return blocks
+
+
+def _format_range(start, stop):
+    # As in unified diff headers (and difflib)
+    length = stop - start
+    if length == 1:
+        return '%d' % (start + 1)
+    return '%d,%d' % (start if length == 0 else start + 1, length)
+
+
+def unified_lines(this_lines, that_lines, blocks, context=3):
+    """Generate unified diff lines (without file headers) for the changed
+    blocks, with the given number of lines of context."""
+    hunks = []
+    for block in blocks:
+        if hunks and block[0] - hunks[-1][-1][1] <= 2 * context:
+            hunks[-1].append(block)
+        else:
+            hunks.append([block])
+
+    for hunk in hunks:
+        first, last = hunk[0], hunk[-1]
+        this_start = max(0, first[0] - context)
+        that_start = first[2] - (first[0] - this_start)
+        this_stop = min(len(this_lines), last[1] + context)
+        that_stop = last[3] + (this_stop - last[1])
+
+        yield '@@ -%s +%s @@' % (_format_range(this_start, this_stop), _format_range(that_start, that_stop))
+
+        i = this_start
+        for i1, i2, j1, j2 in hunk:
+            for line in this_lines[i:i1]:
+                yield ' ' + line
+            for line in this_lines[i1:i2]:
+                yield '-' + line
+            for line in that_lines[j1:j2]:
+                yield '+' + line
+            i = i2
+        for line in this_lines[i:this_stop]:
+            yield ' ' + line
+
+
+# Stands in for an option not given, as None means no limit
+_DEFAULT = object()
+
+
+# This class turns two differing numerical model definitions into a message,
+# keeping the cost and size bounded however large they are
+class DefinitionDiff:
+    """Options for describing a difference between numerical model
+    definitions.
+
+    At most max_lines lines of unified diff, with context lines around each
+    change, are included in the message. With ranges_only, only the changed
+    line ranges are listed. Beyond max_edits inserted and deleted lines, the
+    diff stops resolving the differing region and reports it whole.
+
+    By default, messages are bounded at 500 lines and 1000 edits (earlier,
+    they were never truncated); pass None or 0 for either to lift the limit.
+
+    """
+    context = 3
+    max_lines = 500
+    max_edits = 1000
+    ranges_only = False
+
+    def __init__(self, context=None, max_lines=_DEFAULT, max_edits=_DEFAULT, ranges_only=None):
+        if context is not None:
+            self.context = context
+        if max_lines is not _DEFAULT:
+            self.max_lines = max_lines or None
+        if max_edits is not _DEFAULT:
+            self.max_edits = max_edits or None
+        if ranges_only is not None:
+            self.ranges_only = ranges_only
+
+    def format(self, this, that):
+        this_lines = this.splitlines()
+        that_lines = that.splitlines()
+        blocks = changed_blocks(this_lines, that_lines, self.max_edits)
+
+        if self.ranges_only:
+            ranges = ["-%s +%s" % (_format_range(i1, i2), _format_range(j1, j2)) for i1, i2, j1, j2 in blocks]
+            return "Numerical Model: definitions differ at lines " + "; ".join(ranges)
+
+        lines = ['---', '+++']
+        for count, line in enumerate(unified_lines(this_lines, that_lines, blocks, self.context)):
+            if self.max_lines is not None and count >= self.max_lines:
+                lines.append("... (diff truncated at %d lines)" % self.max_lines)
+                break
+            lines.append(line.strip())
+
+        return "Numerical Model: definitions differ:\n | " + "\n | ".join(lines)
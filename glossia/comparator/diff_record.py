@@ -0,0 +1,176 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from .definition_diff import DefinitionDiff
+from .parameters import format_value
+
+
+class _Missing:
+    """Placeholder for the absent side of a record where something exists on
+    only one side."""
+    def __repr__(self):
+        return 'MISSING'
+
+    def __bool__(self):
+        return False
+
+    def __reduce__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+def _format_definitions(record, definition_diff):
+    if not record.left:
+        return "Numerical Model: this has no definition"
+    elif not record.right:
+        return "Numerical Model: that has no definition"
+
+    return (definition_diff or DefinitionDiff()).format(record.left, record.right)
+
+
+# Messages for a field whose value differs on each side, by (section, field),
+# falling back to (section, None)
+_CHANGED_TEMPLATES = {
+    ('Argument', 'name'): "Argument: names differ %(left)s // %(right)s",
+    ('Needle', None): "Needle: for index %(entity)s, %(field)s fields differ %(left)s // %(right)s",
+    ('Region', None): "Region: for ID %(entity)s, %(field)s fields differ %(left)s // %(right)s",
+    ('Algorithm', 'result'): "Algorithm: results differ %(left)s // %(right)s",
+    ('Algorithm', 'content'): "Algorithm: %(entity)s content differs",
+    ('Numerical Model', 'definition'): _format_definitions,
+    ('Numerical Model', 'needle count'): "Numerical Model: this has different needle count than that",
+    ('Parameter', 'name'): "Parameter: names differ - %(left)s // %(right)s",
+    ('Parameter', 'type'): "Parameter %(entity)s: types differ - %(left)s // %(right)s",
+    ('Parameter', 'value'): "Parameter %(entity)s: values differ - %(left)s // %(right)s",
+    ('Transferrer', 'url'): "Transferrer: URLs differ - %(left)s // %(right)s",
+    ('Transferrer', 'class'): "Transferrer: classes differ - %(left)s // %(right)s",
+}
+
+# Messages for something present on only one side, by (section, field), as a
+# pair for when it is missing from this (left) or that (right) side
+_MISSING_TEMPLATES = {
+    ('Needle', 'parameter'): (
+        "Needle: this (%(entity)s) has no parameter %(name)s",
+        "Needle: that (%(entity)s) has no parameter %(name)s"
+    ),
+    ('Region', 'group'): (
+        "Region: this (%(entity)s) has no group %(name)s",
+        "Region: that (%(entity)s) has no group %(name)s"
+    ),
+    ('Algorithm', 'argument'): (
+        "Algorithm: %(entity)s has no argument %(name)s",
+        "Algorithm: %(entity)s has no argument %(name)s"
+    ),
+    ('Numerical Model', 'region'): (
+        "Numerical Model: this has no region %(name)s",
+        "Numerical Model: that has no region %(name)s"
+    ),
+    ('Definition', 'transferrer'): (
+        "%(entity)s definition has no transferrer",
+        "%(entity)s other definition has no transferrer"
+    ),
+    ('Definition', 'algorithm'): (
+        "%(entity)s definition has no algorithm '%(name)s'",
+        "%(entity)s definition has no algorithm '%(name)s'"
+    ),
+    ('Definition', 'parameter'): (
+        "%(entity)s definition has no parameter '%(name)s'",
+        "%(entity)s definition has no parameter '%(name)s'"
+    ),
+}
+
+# Whole sections missing from a definition share a single form
+_MISSING_SECTION_TEMPLATE = "%(entity)s definition has no %(field)s"
+
+
+class DiffRecord:
+    """A single non-equivalence between two definitions.
+
+    The section is the kind of entity the difference was found in (e.g.
+    "Needle", "Parameter" or "Definition"), the entity its identifier (index,
+    name, ID, etc.) and the field what differs. Where something is present on
+    only one side, the field names the kind of thing that is missing, the
+    entity is the identifier of the side lacking it and the absent side is
+    MISSING. Human-readable messages are only formatted on request.
+
+    """
+    __slots__ = ('section', 'entity', 'field', 'left', 'right')
+
+    def __init__(self, section, entity, field, left, right):
+        self.section = section
+        self.entity = entity
+        self.field = field
+        self.left = left
+        self.right = right
+
+    def is_missing(self):
+        return self.left is MISSING or self.right is MISSING
+
+    def format(self, definition_diff=None):
+        """Produce the human-readable message for this record, describing
+        differing numerical model definitions as the DefinitionDiff options
+        (if given) say."""
+        if self.is_missing():
+            this_missing = self.left is MISSING
+            name = self.right if this_missing else self.left
+
+            if (self.section, self.field) in _MISSING_TEMPLATES:
+                template = _MISSING_TEMPLATES[(self.section, self.field)][0 if this_missing else 1]
+            else:
+                template = _MISSING_SECTION_TEMPLATE
+
+            return template % {'entity': self.entity, 'field': self.field, 'name': name}
+
+        template = _CHANGED_TEMPLATES.get((self.section, self.field))
+        if template is None:
+            template = _CHANGED_TEMPLATES[(self.section, None)]
+
+        if callable(template):
+            return template(self, definition_diff)
+
+        return template % {
+            'entity': self.entity,
+            'field': self.field,
+            'left': format_value(self.left),
+            'right': format_value(self.right)
+        }
+
+    def to_tuple(self):
+        return (self.section, self.entity, self.field, self.left, self.right)
+
+    def __str__(self):
+        return self.format()
+
+    def __repr__(self):
+        return 'DiffRecord(%r, %r, %r, %r, %r)' % self.to_tuple()
+
+    def __eq__(self, other):
+        return isinstance(other, DiffRecord) and self.to_tuple() == other.to_tuple()
+
+    def __hash__(self):
+        return hash((self.section, self.entity, self.field))
+
+
+def format_records(records, sort=True, definition_diff=None):
+    """Turn records into human-readable messages, sorted for readability
+    unless asked otherwise."""
+    messages = [record.format(definition_diff) for record in records]
+    if sort:
+        messages.sort()
+    return messages
@@ -0,0 +1,202 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy
+from .diff_record import DiffRecord, format_records
+
+# Kinds of entity that may be reported as changed to DiffState.update, with
+# the key identifying each (None where there is only one)
+CHANGE_KINDS = ("transferrer", "algorithm", "parameter", "definition", "region", "needle")
+
+
+class DiffState:
+    """The comparison of two SimulationDefinitions, held entity by entity.
+
+    After one or both definitions are edited, update() recomputes only the
+    entities reported as changed, reusing everything else. For needles, only
+    the rows and columns of the cost matrix belonging to changed needles are
+    recomputed (the assignment itself is solved again, as any change may
+    alter it) and records are reused for needle pairs that are still matched
+    and unchanged.
+
+    Changes are given as (kind, key) pairs, the kind being one of
+    CHANGE_KINDS: e.g. ("parameter", "BANANA"), ("needle", "12388"),
+    ("region", "organ-0"), ("transferrer", None) or ("definition", None) for
+    the numerical model definition. A needle change applies to a needle with
+    that index on either side. Anything changed but not reported will not be
+    noticed.
+
+    """
+
+    def __init__(self, this, that, tolerances=None):
+        self.this = this
+        self.that = that
+        self.tolerances = tolerances
+
+        self._records = {}
+        self._this_needles = []
+        self._that_needles = []
+        self._needle_costs = None
+        self._needle_records = {}
+
+        self._refresh(None)
+
+    def update(self, this=None, that=None, changed=()):
+        """Replace either definition (or pass neither, if they were modified
+        in place) and recompute the changed entities. The cached fingerprints
+        of both definitions are invalidated."""
+        if this is not None:
+            self.this = this
+        if that is not None:
+            self.that = that
+
+        # Either may have been edited in place, outdating its fingerprint
+        self.this.invalidate()
+        self.that.invalidate()
+
+        changed = set(changed)
+        for kind, key in changed:
+            if kind not in CHANGE_KINDS:
+                raise RuntimeError("Unknown kind of change: %s" % kind)
+
+        self._refresh(changed)
+        return self
+
+    def diff_records(self):
+        for records in self._records.values():
+            yield from records
+        for records in self._needle_records.values():
+            yield from records
+
+    def diff(self):
+        """Messages as SimulationDefinition.diff would give them."""
+        return format_records(self.diff_records())
+
+    def _refresh(self, changed):
+        this, that = self.this, self.that
+        previous = self._records
+        records = {}
+
+        def section(kind, key, compute):
+            # Reuse the previous records for an entity unless it has changed
+            if changed is None or (kind, key) in changed or (kind, key) not in previous:
+                records[(kind, key)] = list(compute())
+            else:
+                records[(kind, key)] = previous[(kind, key)]
+
+        needles_compared = False
+        for name, attribute in this.SECTIONS:
+            missing = this.missing_section_record(that, name)
+            if missing is not None:
+                records[("section", name)] = [missing]
+            elif not getattr(this, attribute):
+                continue
+            elif name == "transferrer":
+                section("transferrer", None, lambda: this.transferrer.diff_records(that.transferrer))
+            elif name == "numerical model":
+                this_model, that_model = this.numerical_model, that.numerical_model
+                section("definition", None, lambda: this_model.definition_records(that_model))
+                for id in set().union(this_model.regions.keys(), that_model.regions.keys()):
+                    section("region", id, lambda: this_model.region_records(that_model, id))
+                self._refresh_needles(changed)
+                needles_compared = True
+            else:
+                kind = name[:-1]
+                all_keys = set().union(getattr(this, attribute).keys(), getattr(that, attribute).keys())
+                for key in all_keys:
+                    section(kind, key, lambda: this.entity_records(that, kind, key, self.tolerances))
+
+        if not needles_compared:
+            self._this_needles = []
+            self._that_needles = []
+            self._needle_costs = None
+            self._needle_records = {}
+
+        self._records = records
+
+    def _refresh_needles(self, changed):
+        this_model = self.this.numerical_model
+        that_model = self.that.numerical_model
+        this_keys = list(this_model.needles.keys())
+        that_keys = list(that_model.needles.keys())
+
+        needle_records = {}
+        if len(this_keys) != len(that_keys):
+            needle_records["count"] = [
+                DiffRecord("Numerical Model", None, "needle count", len(this_keys), len(that_keys))
+            ]
+
+        if not this_keys or not that_keys:
+            costs = None
+        elif changed is None or self._needle_costs is None:
+            costs = this_model.needle_costs(that_model, this_keys, that_keys, self.tolerances)
+        else:
+            costs = self._update_costs(this_keys, that_keys, changed)
+
+        if costs is not None:
+            changed_needles = set() if changed is None else {key for kind, key in changed if kind == "needle"}
+            for row, column in this_model.assign_needles(costs):
+                pair = (this_keys[row], that_keys[column])
+                if changed is None or pair not in self._needle_records or changed_needles.intersection(pair):
+                    this_needle = this_model.needles[pair[0]]
+                    that_needle = that_model.needles[pair[1]]
+                    needle_records[pair] = list(this_needle.diff_records(that_needle, self.tolerances))
+                else:
+                    needle_records[pair] = self._needle_records[pair]
+
+        self._this_needles = this_keys
+        self._that_needles = that_keys
+        self._needle_costs = costs
+        self._needle_records = needle_records
+
+    def _update_costs(self, this_keys, that_keys, changed):
+        this_model = self.this.numerical_model
+        that_model = self.that.numerical_model
+        changed_needles = {key for kind, key in changed if kind == "needle"}
+        old_rows = {key: row for row, key in enumerate(self._this_needles)}
+        old_columns = {key: column for column, key in enumerate(self._that_needles)}
+
+        kept_rows = [row for row, key in enumerate(this_keys) if key in old_rows and key not in changed_needles]
+        kept_columns = [column for column, key in enumerate(that_keys) if key in old_columns and key not in changed_needles]
+        fresh_rows = sorted(set(range(len(this_keys))).difference(kept_rows))
+        fresh_columns = sorted(set(range(len(that_keys))).difference(kept_columns))
+
+        costs = numpy.empty((len(this_keys), len(that_keys)), dtype=self._needle_costs.dtype)
+
+        # Unchanged cells are carried over from the previous matrix
+        if kept_rows and kept_columns:
+            costs[numpy.ix_(kept_rows, kept_columns)] = self._needle_costs[numpy.ix_(
+                [old_rows[this_keys[row]] for row in kept_rows],
+                [old_columns[that_keys[column]] for column in kept_columns]
+            )]
+
+        # Changed (or new) rows are computed in full, and changed columns for
+        # the remaining rows
+        if fresh_rows:
+            costs[fresh_rows, :] = this_model.needle_costs(
+                that_model, [this_keys[row] for row in fresh_rows], that_keys, self.tolerances
+            )
+        if fresh_columns and kept_rows:
+            costs[numpy.ix_(kept_rows, fresh_columns)] = this_model.needle_costs(
+                that_model,
+                [this_keys[row] for row in kept_rows],
+                [that_keys[column] for column in fresh_columns],
+                self.tolerances
+            )
+
+        return costs
@@ -0,0 +1,166 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import os
+import sqlite3
+from .cache import document_key
+from .definition_diff import DefinitionDiff
+from .parse import document_buffer
+from .simulation_definition import select_sections
+
+# Part of every memo key: this must be bumped whenever a change to parsing,
+# comparison or formatting could alter the messages for some pair, so that
+# results stored by an earlier version are never reused
+COMPARATOR_VERSION = 1
+
+# Counters kept in the store, so that they accumulate across runs and across
+# the processes of a batch
+COUNTERS = ("hits", "misses", "stores", "evictions")
+
+
+def document_digest(document):
+    """document_key for anything parse_document accepts. An open file is
+    returned to its position afterwards, so that it can still be parsed, and
+    so must be seekable."""
+    if not hasattr(document, 'read'):
+        with document_buffer(document) as buffer:
+            return document_key(buffer)
+
+    if not (hasattr(document, 'seekable') and document.seekable()):
+        raise RuntimeError("Documents must be seekable to be memoized")
+
+    position = document.tell()
+    with document_buffer(document) as buffer:
+        digest = document_key(buffer)
+    document.seek(position)
+    return digest
+
+
+def file_digest(file):
+    """As document_digest, for a path or binary file as given to
+    Comparator.from_files (where a str is a path, not a document)."""
+    if isinstance(file, (str, bytes, os.PathLike)):
+        with open(file, 'rb') as f:
+            return document_digest(f)
+    return document_digest(file)
+
+
+def pair_key(left_digest, right_digest, tolerances=None, sections=None, definition_diff=None):
+    """Memo key for comparing two documents, by their digests, with the
+    given Comparator options."""
+    definition_diff = definition_diff or DefinitionDiff()
+    options = {
+        'version': COMPARATOR_VERSION,
+        'tolerances': sorted((name, list(tolerance)) for name, tolerance in (tolerances or {}).items()),
+        'sections': sorted(select_sections(sections)),
+        'definition_diff': [
+            definition_diff.context, definition_diff.max_lines,
+            definition_diff.max_edits, definition_diff.ranges_only
+        ],
+    }
+    key = json.dumps([left_digest, right_digest, options], sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+# This class lets repeated runs over the same pairs skip parsing and
+# comparing altogether
+class ResultMemo:
+    """Persistent store of diff messages for pairs of documents, in an
+    SQLite file.
+
+    Results are keyed by pair_key, so by the content of both documents, the
+    COMPARATOR_VERSION and the options affecting the messages. At most
+    max_entries results are kept, evicting the least recently used. The
+    file may be shared by several processes, and a memo may be pickled (to
+    be reopened by path) for use in a worker process.
+
+    """
+    max_entries = 100000
+
+    def __init__(self, path, max_entries=None):
+        if max_entries is not None:
+            self.max_entries = max_entries
+        self.path = path
+
+        self._connection = sqlite3.connect(path, timeout=60)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, messages TEXT NOT NULL, used INTEGER NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def __reduce__(self):
+        return (ResultMemo, (self.path, self.max_entries))
+
+    def get(self, key):
+        """Return the stored messages for a key, or None."""
+        with self._connection:
+            row = self._connection.execute("SELECT messages FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+
+            # Recency is a counter over the whole store, rather than a time,
+            # so it is unaffected by clocks
+            self._connection.execute(
+                "UPDATE results SET used = (SELECT MAX(used) FROM results) + 1 WHERE key = ?", (key,)
+            )
+            self._count("hits")
+
+        return json.loads(row[0])
+
+    def put(self, key, messages):
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results (key, messages, used) "
+                "VALUES (?, ?, (SELECT COALESCE(MAX(used), 0) + 1 FROM results))",
+                (key, json.dumps(list(messages)))
+            )
+            self._count("stores")
+
+            excess = self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._connection.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used LIMIT ?)", (excess,)
+                )
+                self._count("evictions", excess)
+
+    def _count(self, name, value=1):
+        self._connection.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+            (name, value)
+        )
+
+    def stats(self):
+        counters = dict.fromkeys(COUNTERS, 0)
+        counters.update(self._connection.execute("SELECT name, value FROM counters"))
+        counters['entries'] = self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return counters
+
+    def clear(self):
+        """Remove every stored result and reset the counters."""
+        with self._connection:
+            self._connection.execute("DELETE FROM results")
+            self._connection.execute("DELETE FROM counters")
+
+    def close(self):
+        self._connection.close()
@@ -15,13 +15,108 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import array
 import json
+import numpy
+
+# Declared types of array parameters and the typecodes used to store them
+ARRAY_TYPECODES = {
+    "array(float)": 'd',
+    "array(int)": 'q',
+    "array(integer)": 'q',
+}
+
+# Returned by a converter that could not handle its input
+_FAILED = object()
+
+# Characters that may begin a JSON document (Python's json also accepts
+# NaN and Infinity)
+_JSON_STARTS = frozenset('[{"-0123456789tfnNI')
+
+# Bounded memo of conversions of (string, type) pairs to immutable values
+_MEMO_SIZE = 65536
+_memo = {}
+
+
+def _to_float(parameter):
+    try:
+        return float(parameter)
+    except (ValueError, TypeError):
+        return _FAILED
+
+
+def _to_integer(parameter):
+    try:
+        return int(parameter)
+    except (ValueError, TypeError):
+        return _FAILED
+
+
+def _to_boolean(parameter):
+    if not isinstance(parameter, str):
+        return bool(parameter)
+    return parameter.lower() != "false" and bool(parameter)
+
+
+def _to_array(typecode, element):
+    def convert(parameter):
+        try:
+            if isinstance(parameter, str):
+                # A flat list of numbers is split directly, anything else
+                # (such as a nested list) is left to the JSON fallback
+                parameter = parameter.strip()
+                if parameter[:1] != '[' or parameter[-1:] != ']':
+                    return _FAILED
+                body = parameter[1:-1]
+                return array.array(typecode, map(element, body.split(',')) if body.strip() else ())
+            return array.array(typecode, parameter)
+        except (ValueError, TypeError, OverflowError):
+            return _FAILED
+    return convert
+
+
+# Converters by declared type string, each returning _FAILED rather than
+# raising when the value does not fit
+_CONVERTERS = {
+    "float": _to_float,
+    "integer": _to_integer,
+    "boolean": _to_boolean,
+    "string": str,
+}
+_CONVERTERS.update({
+    typ: _to_array(typecode, float if typecode == 'd' else int)
+    for typ, typecode in ARRAY_TYPECODES.items()
+})
+
+
+def _convert(parameter, typ, try_json):
+    converter = _CONVERTERS.get(typ)
+
+    # If we found one, pass the parameter
+    if converter is not None:
+        result = converter(parameter)
+        if result is not _FAILED:
+            return result
+
+    # If we have had no success yet and should try converting from JSON, do so
+    # (but only where the string could possibly be JSON)
+    if try_json and isinstance(parameter, str):
+        stripped = parameter.lstrip()
+        if stripped and stripped[0] in _JSON_STARTS:
+            try:
+                return json.loads(parameter)
+            except ValueError:
+                pass
+
+    return parameter
 
 
 def convert_parameter(parameter, typ=None, try_json=True):
     """Turn a parameter value into a Python object.
 
-    Normally a string, but casting is intended to be idempotent.
+    Normally a string, but casting is intended to be idempotent. Values of
+    array(float) and array(int) types become compact array.array objects.
+    Conversions of repeated strings are memoized.
 
     """
 
@@ -33,33 +128,156 @@ def convert_parameter(parameter, typ=None, try_json=True):
     if parameter == "null" or parameter is None:
         return None
 
-    # Some basic types will be done manually
-    if typ == "float":
-        cast = float
-    elif typ == "integer":
-        cast = int
-    elif typ == "boolean":
-        cast = lambda s: (s.lower() != "false" and bool(s))
-    elif typ == "string":
-        cast = str
-    else:
-        cast = None
+    if not isinstance(parameter, str):
+        return _convert(parameter, typ, try_json)
 
-    # If we found one, pass the parameter
-    if cast is not None:
-        try:
-            return cast(parameter)
-        except ValueError:
-            pass
+    key = (parameter, typ, try_json)
+    result = _memo.get(key, _FAILED)
+    if result is _FAILED:
+        result = _convert(parameter, typ, try_json)
 
-    # If we have had no success yet and should try converting from JSON, do so
-    if try_json:
-        try:
-            return json.loads(parameter)
-        except:
-            pass
+        # Only immutable results (and arrays, which are cheap to copy) may be
+        # shared
+        if isinstance(result, (str, int, float, array.array)) or result is None:
+            if len(_memo) >= _MEMO_SIZE:
+                _memo.clear()
+            _memo[key] = result
 
-    return parameter
+    if isinstance(result, array.array):
+        return array.array(result.typecode, result)
+
+    return result
+
+
+def export_value(value):
+    """Plain (JSON-compatible) form of a converted value."""
+    if isinstance(value, array.array):
+        return value.tolist()
+    return value
+
+
+def format_value(value):
+    """Human-readable form of a converted value, for messages."""
+    return str(export_value(value))
+
+
+def tolerance_for(name, typ, tolerances):
+    """Find the (absolute, relative) tolerance for a parameter in a mapping
+    keyed by parameter name or, failing that, declared type. Returns None
+    where values must match exactly."""
+    if not tolerances:
+        return None
+
+    tolerance = tolerances.get(name)
+    if tolerance is None:
+        tolerance = tolerances.get(typ)
+    return tolerance
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _numeric_array(value):
+    # Arrays are viewed without copying, flat lists of numbers converted
+    if isinstance(value, array.array):
+        return numpy.frombuffer(value, dtype=value.typecode) if len(value) else numpy.empty(0)
+    elif isinstance(value, list) and all(_is_number(v) for v in value):
+        return numpy.array(value, dtype=float)
+    return None
+
+
+def _close(this, that, tolerance):
+    # As math.isclose, the relative tolerance scales with the larger magnitude
+    # (but, as everywhere here, NaN is taken to equal NaN)
+    absolute, relative = tolerance
+    with numpy.errstate(invalid='ignore'):
+        close = numpy.abs(this - that) <= numpy.maximum(absolute, relative * numpy.maximum(numpy.abs(this), numpy.abs(that)))
+    return close | (this == that) | (numpy.isnan(this) & numpy.isnan(that))
+
+
+def values_equal(this, that, tolerance=None):
+    """Compare converted values, treating an array and a list holding the same
+    numbers as equal, and NaN as equal to NaN.
+
+    If an (absolute, relative) tolerance is given, numbers, and arrays of
+    numbers of the same length, need only be that close. Arrays are compared
+    in a single vectorized operation.
+
+    """
+    if tolerance is not None:
+        if _is_number(this) and _is_number(that):
+            return bool(_close(this, that, tolerance))
+
+        this_array = _numeric_array(this)
+        that_array = _numeric_array(that) if this_array is not None else None
+        if that_array is not None:
+            return this_array.shape == that_array.shape and bool(numpy.all(_close(this_array, that_array, tolerance)))
+
+    if isinstance(this, array.array) or isinstance(that, array.array):
+        this, that = export_value(this), export_value(that)
+
+    # NaN never equals itself, but an unchanged NaN is not a difference, so
+    # unequal values are checked again in canonical form
+    return this == that or canonical_value(this) == canonical_value(that)
+
+
+def values_equal_matrix(these, those, tolerance=None):
+    """Compare every value in one list against every value in another, giving
+    a boolean array of shape (len(these), len(those)).
+
+    Where all values are numbers, or all are numeric arrays of the same
+    length, this is done with one broadcast operation.
+
+    """
+    if tolerance is not None and these and those:
+        if all(_is_number(v) for v in these) and all(_is_number(v) for v in those):
+            this_array = numpy.array(these, dtype=float)
+            that_array = numpy.array(those, dtype=float)
+            return _close(this_array[:, None], that_array[None, :], tolerance)
+
+        this_arrays = [_numeric_array(v) for v in these]
+        that_arrays = [_numeric_array(v) for v in those]
+        arrays = this_arrays + that_arrays
+        if all(a is not None for a in arrays) and len(set(a.shape for a in arrays)) == 1:
+            this_array = numpy.stack(this_arrays).astype(float)
+            that_array = numpy.stack(that_arrays).astype(float)
+            return numpy.all(_close(this_array[:, None, :], that_array[None, :, :], tolerance), axis=2)
+
+    result = numpy.empty((len(these), len(those)), dtype=bool)
+    for row, this in enumerate(these):
+        for column, that in enumerate(those):
+            result[row, column] = values_equal(this, that, tolerance)
+    return result
+
+
+# Canonical form of NaN, which (unlike NaN) is equal to itself
+_NAN = ('nan',)
+
+
+def canonical_value(value):
+    """Reduce a converted parameter value to a hashable canonical form.
+
+    Two values are equal by values_equal exactly when their canonical forms
+    are, so the result may be used for hashing and interning. NaN is taken
+    to equal NaN, so that an unchanged NaN is never reported as a difference.
+
+    """
+
+    if isinstance(value, bool):
+        return int(value)
+    elif isinstance(value, float):
+        if value != value:
+            return _NAN
+        if value.is_integer():
+            return int(value)
+        return value
+    elif isinstance(value, (list, tuple, array.array)):
+        return ('l',) + tuple(canonical_value(v) for v in value)
+    elif isinstance(value, dict):
+        return ('d',) + tuple(sorted((k, canonical_value(v)) for k, v in value.items()))
+
+    return value
 
 
 def read_parameters(element):
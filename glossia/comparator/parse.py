@@ -16,154 +16,349 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .simulation_definition import SimulationDefinition
+from contextlib import contextmanager
+from lxml import etree as ET
+from .simulation_definition import SimulationDefinition, MODEL_PARTS, select_sections
+from .validate import validation_errors
 import json
+import mmap
+import os
+
+# The top-level sections of a simulationDefinition, each allowed at most once,
+# in the order they are checked
+SECTIONS = ("transferrer", "algorithms", "parameters", "numericalModel")
+
+# Files of at least this many bytes are memory-mapped, rather than read, for
+# parsing
+MMAP_THRESHOLD = 1 << 20
+
+
+def _map_file(f):
+    # A memory map of a whole binary file, if it is a large enough regular
+    # file read from the start, otherwise None
+    try:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_THRESHOLD or f.tell() != 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+@contextmanager
+def document_buffer(source):
+    """Give the raw content of a GSSA-XML document, copying as little as
+    possible.
+
+    Bytes and other buffers (bytearray, memoryview, mmap, etc.) and str are
+    given back as they are. Open files are memory-mapped if at least
+    MMAP_THRESHOLD bytes long, otherwise read; paths (any os.PathLike, as a
+    str is taken to be document text) are opened and treated likewise. Any
+    map is closed on leaving the context.
+
+    """
+    if isinstance(source, os.PathLike):
+        with open(source, 'rb') as f, document_buffer(f) as buffer:
+            yield buffer
+    elif hasattr(source, 'read'):
+        mapped = _map_file(source)
+        if mapped is None:
+            yield source.read()
+        else:
+            with mapped:
+                yield mapped
+    else:
+        yield source
+
+
+def parse_document(source, huge_tree=False):
+    """Parse a GSSA-XML document, given as anything document_buffer accepts,
+    to its root element.
+
+    Raw bytes are parsed in place, decoded as the XML declaration says (or
+    as UTF-8, by default). Text has already been decoded, so any declared
+    encoding is ignored. Set huge_tree to lift libxml2's limits on very
+    large documents.
+
+    """
+    with document_buffer(source) as document:
+        if isinstance(document, str):
+            parser = ET.XMLParser(encoding='utf-8', huge_tree=huge_tree)
+            return ET.fromstring(document.encode('utf-8'), parser)
+        return ET.fromstring(document, ET.XMLParser(huge_tree=huge_tree))
 
 
 # This turns GSSA-XML into a definition
 # TODO: use this implementation for the whole server
 # NB: it will need extended to include non-diff-relevant elements/fields
-def gssa_xml_to_definition(root, label="Simulation definition", strict=False):
+def gssa_xml_to_definition(root, label="Simulation definition", strict=False, validate=False, sections=None):
+    """Build a SimulationDefinition from a parsed GSSA-XML tree (or a raw
+    document, as accepted by parse_document).
+
+    If sections are given (see select_sections), the other sections, and
+    unselected parts of the numerical model, are skipped entirely, as though
+    absent from the document.
+
+    """
+    if root is not None and not ET.iselement(root):
+        root = parse_document(root)
+
     # We must have a simulationDefinition root
     if root is None:
         raise RuntimeError("%s: No root tag" % label)
 
+    # Optionally, check against the schema first, reporting every problem
+    # rather than only the first
+    if validate:
+        errors = validation_errors(root)
+        if errors:
+            raise RuntimeError("%s: Invalid GSSA-XML:\n  %s" % (label, "\n  ".join(errors)))
+
     if root.tag != "simulationDefinition":
         raise RuntimeError("%s: Incorrect top tag" % label)
 
     simulationDefinition = SimulationDefinition(label)
+    selected = select_sections(sections)
 
-    # If there is a transferrer, that is the basis of a comparison
-    transferrer = root.findall("transferrer")
+    sections = {}
+    for section in SECTIONS:
+        nodes = root.findall(section)
+        if len(nodes) > 1:
+            raise RuntimeError("%s: Too many %s nodes" % (label, section))
+        sections[section] = nodes[0] if nodes and section in selected else None
 
-    if len(transferrer) > 1:
-        raise RuntimeError("%s: Too many transferrer nodes")
-    elif len(transferrer) == 1:
-        url = transferrer[0].find('url')
-        cls = transferrer[0].get("class")
-        simulationDefinition.set_transferrer(cls, url.text if (url is not None) else None)
+    # If there is a transferrer, that is the basis of a comparison
+    if sections["transferrer"] is not None:
+        _read_transferrer(sections["transferrer"], simulationDefinition)
 
     # Start adding in algorithms
-    algorithms = root.findall("algorithms")
-
-    if len(algorithms) > 1:
-        raise RuntimeError("%s: Too many algorithms nodes")
-    elif len(algorithms) == 1:
-        for algorithm in algorithms[0]:
-            # Every algorithm has a result
-            result = algorithm.get('result')
-
-            if result is None:
-                raise RuntimeError("%s: An algorithm is missing a result")
-
-            arguments = []
-            content = None
-            # We should have a context, representing the algorihtm body, and an arguments node
-            for node in algorithm:
-                if node.tag == 'content':
-                    content = node.text
-                elif node.tag == 'arguments':
-                    for argument in node:
-                        name = argument.get('name')
-                        if argument.get('name') is None or argument.tag != 'argument':
-                            raise RuntimeError("%s: Algorithm %s has a malformed argument (tag %s)" % (result, argument.tag))
-                        arguments.append(name)
-                else:
-                    raise RuntimeError("%s: Algorithm %s has a rogue tag: %s" % (result, argument.tag))
-
-            if content is None:
-                content = ""
-
-            simulationDefinition.add_algorithm(result, arguments, content.strip())
+    if sections["algorithms"] is not None:
+        for algorithm in sections["algorithms"]:
+            _read_algorithm(algorithm, simulationDefinition, label)
 
     # The parameters, normally the largest number of elements, are parsed
     # (although not to their types)
-    parameters = root.findall("parameters")
-
-    if len(parameters) > 1:
-        raise RuntimeError("%s: Too many parameters nodes" % label)
-    elif len(parameters) == 1:
-        for parameter in parameters[0]:
-            simulationDefinition.add_parameter(parameter.get('name'), parameter.get('value'), parameter.get('type'))
+    if sections["parameters"] is not None:
+        for parameter in sections["parameters"]:
+            _read_parameter(parameter, simulationDefinition)
 
     # Define the numerical model - this incorporates more than the CDM numerical
     # model, strictly, as number/type of needles is specified, and so forth
-    numericalModel = root.findall("numericalModel")
+    if sections["numericalModel"] is not None:
+        numerical_model = _NumericalModelReader(label, strict)
 
-    if len(numericalModel) > 1:
-        raise RuntimeError("%s: Too many numericalModel nodes" % label)
-    elif len(numericalModel) == 1:
-        needles = []
-        regions = []
-        definition = None
-        family = ''
+        for node in sections["numericalModel"]:
+            if node.tag in MODEL_PARTS and node.tag not in selected:
+                continue
 
-        for node in numericalModel[0]:
             # The numerical model should contain the needles (in GSSA-XML, at
             # present)
             if node.tag == 'needles':
                 for needle in node:
-                    if needle.tag != 'needle':
-                        raise RuntimeError("%s: Numerical model needles should only have needle nodes, not %s" %
-                                           (label, needle.tag))
-                    index = needle.get('index')
-                    cls = needle.get('class')
-
-                    file = needle.get('file')
-                    if not file:
-                        file = needle.get('input')
-
-                    if None in (index, cls, file):
-                        raise RuntimeError("%s: Needle tag has not got all information: Index '%s', Class '%s', File '%s'" %
-                                           (label, index, cls, file))
-
-                    # Needles can each have their own parameters
-                    parameters = []
-                    if len(needle) > 1 or (len(needle) == 1 and needle[0].tag != 'parameters'):
-                        raise RuntimeError("%s: Needle tag must have no children or one parameters tag" % label)
-                    elif len(needle) == 1:
-                        for parameter in needle[0]:
-                            parameters.append((parameter.get('name'), parameter.get('value'), parameter.get('type')))
-
-                    needles.append((index, cls, file, parameters))
+                    numerical_model.read_needle(needle)
 
             # Region indicates the geometric subdomains and their definitions
             elif node.tag == 'regions':
                 for region in node:
-                    if region.tag != 'region':
-                        raise RuntimeError("%s: Regions node should only have region children, not %s" %
-                                           (label, region.tag))
-
-                    region_id = region.get('id')
-                    name = region.get('name')
-                    format = region.get('format')
-                    input = region.get('input')
-
-                    try:
-                        groups = json.loads(region.get('groups'))
-                    except TypeError:
-                        raise RuntimeError("%s: Could not read region groups" % label)
-
-                    region_tuple = (region_id, name, format, input, groups)
-                    if None in region_tuple:
-                        raise RuntimeError("%s: Region tag has not got all information: Id '%s', Name '%s', Format '%s', Input '%s', Groups '%s'" %
-                                           (label, region_id, name, format, input, groups))
-
-                    regions.append(region_tuple)
-
-            elif node.tag == 'definition':
-                if node.text is not None:
-                    definition = node.text.strip()
-                elif not strict:
-                    definition = ''
-                else:
-                    raise RuntimeError("%s: Numerical model 'definition' tag exists but is empty [TODO: add support for external definitions]" % label)
-                # TODO: implement family comparison, as well as definition
-                # content
-                family = node.get('family')
+                    numerical_model.read_region(region)
+
             else:
-                raise RuntimeError("%s: Unknown node in numerical model: %s" % (label, node.tag))
+                numerical_model.read_node(node)
 
-        simulationDefinition.set_numerical_model(definition, family, regions, needles)
+        numerical_model.apply(simulationDefinition)
 
     return simulationDefinition
+
+
+def gssa_xml_stream_to_definition(source, label="Simulation definition", strict=False, huge_tree=False, sections=None):
+    """Build a definition from a GSSA-XML file or binary stream incrementally.
+
+    Unlike gssa_xml_to_definition, the whole tree is never held in memory:
+    each parameter, algorithm, needle and region is read as soon as its end
+    tag is seen and the element is then discarded. The same validation errors
+    are raised (where a section is repeated, this happens on reaching the
+    second). Set huge_tree to lift libxml2's limits on very large documents.
+    Unselected sections are passed over without being read.
+
+    """
+    selected = select_sections(sections)
+    simulationDefinition = None
+    numerical_model = None
+    seen = set()
+    path = []
+
+    for event, element in ET.iterparse(source, events=('start', 'end'), huge_tree=huge_tree):
+        if event == 'start':
+            path.append(element.tag)
+
+            if len(path) == 1:
+                if element.tag != "simulationDefinition":
+                    raise RuntimeError("%s: Incorrect top tag" % label)
+                simulationDefinition = SimulationDefinition(label)
+            elif len(path) == 2 and element.tag in SECTIONS:
+                if element.tag in seen:
+                    raise RuntimeError("%s: Too many %s nodes" % (label, element.tag))
+                seen.add(element.tag)
+
+                if element.tag == "numericalModel" and "numericalModel" in selected:
+                    numerical_model = _NumericalModelReader(label, strict)
+            continue
+
+        depth = len(path)
+        section = path[1] if depth > 1 else None
+
+        # Unselected sections (and parts of the numerical model) are only
+        # cleared away below
+        if section not in selected or (depth > 2 and section == "numericalModel" and path[2] in MODEL_PARTS and path[2] not in selected):
+            pass
+        elif depth == 2:
+            if section == "transferrer":
+                _read_transferrer(element, simulationDefinition)
+            elif section == "numericalModel":
+                numerical_model.apply(simulationDefinition)
+        elif depth == 3:
+            if section == "algorithms":
+                _read_algorithm(element, simulationDefinition, label)
+            elif section == "parameters":
+                _read_parameter(element, simulationDefinition)
+            elif section == "numericalModel" and element.tag not in ('needles', 'regions'):
+                numerical_model.read_node(element)
+        elif depth == 4 and section == "numericalModel":
+            if path[2] == 'needles':
+                numerical_model.read_needle(element)
+            elif path[2] == 'regions':
+                numerical_model.read_region(element)
+
+        path.pop()
+
+        # Anything we have now read may be dropped, along with already-read
+        # siblings (but not, say, a transferrer's url before the transferrer)
+        if depth <= 2 or (depth == 3 and section != "transferrer") or (depth == 4 and section == "numericalModel"):
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+    if simulationDefinition is None:
+        raise RuntimeError("%s: No root tag" % label)
+
+    return simulationDefinition
+
+
+def _read_transferrer(transferrer, simulationDefinition):
+    url = transferrer.find('url')
+    cls = transferrer.get("class")
+    simulationDefinition.set_transferrer(cls, url.text if (url is not None) else None)
+
+
+def _read_algorithm(algorithm, simulationDefinition, label):
+    # Every algorithm has a result
+    result = algorithm.get('result')
+
+    if result is None:
+        raise RuntimeError("%s: An algorithm is missing a result" % label)
+
+    arguments = []
+    content = None
+    # We should have a context, representing the algorihtm body, and an arguments node
+    for node in algorithm:
+        if node.tag == 'content':
+            content = node.text
+        elif node.tag == 'arguments':
+            for argument in node:
+                name = argument.get('name')
+                if argument.get('name') is None or argument.tag != 'argument':
+                    raise RuntimeError("%s: Algorithm %s has a malformed argument (tag %s)" % (label, result, argument.tag))
+                arguments.append(name)
+        else:
+            raise RuntimeError("%s: Algorithm %s has a rogue tag: %s" % (label, result, node.tag))
+
+    if content is None:
+        content = ""
+
+    simulationDefinition.add_algorithm(result, arguments, content.strip())
+
+
+def _read_parameter(parameter, simulationDefinition):
+    simulationDefinition.add_parameter(parameter.get('name'), parameter.get('value'), parameter.get('type'))
+
+
+# This accumulates the parts of a numericalModel node, which may arrive in any
+# order, until they can be set on the definition
+class _NumericalModelReader:
+    def __init__(self, label, strict):
+        self.label = label
+        self.strict = strict
+        self.needles = []
+        self.regions = []
+        self.definition = None
+        self.family = ''
+
+    def read_needle(self, needle):
+        label = self.label
+
+        if needle.tag != 'needle':
+            raise RuntimeError("%s: Numerical model needles should only have needle nodes, not %s" %
+                               (label, needle.tag))
+        index = needle.get('index')
+        cls = needle.get('class')
+
+        file = needle.get('file')
+        if not file:
+            file = needle.get('input')
+
+        if None in (index, cls, file):
+            raise RuntimeError("%s: Needle tag has not got all information: Index '%s', Class '%s', File '%s'" %
+                               (label, index, cls, file))
+
+        # Needles can each have their own parameters
+        parameters = []
+        if len(needle) > 1 or (len(needle) == 1 and needle[0].tag != 'parameters'):
+            raise RuntimeError("%s: Needle tag must have no children or one parameters tag" % label)
+        elif len(needle) == 1:
+            for parameter in needle[0]:
+                parameters.append((parameter.get('name'), parameter.get('value'), parameter.get('type')))
+
+        self.needles.append((index, cls, file, parameters))
+
+    def read_region(self, region):
+        label = self.label
+
+        if region.tag != 'region':
+            raise RuntimeError("%s: Regions node should only have region children, not %s" %
+                               (label, region.tag))
+
+        region_id = region.get('id')
+        name = region.get('name')
+        format = region.get('format')
+        input = region.get('input')
+
+        try:
+            groups = json.loads(region.get('groups'))
+        except (TypeError, ValueError):
+            raise RuntimeError("%s: Could not read region groups" % label)
+
+        region_tuple = (region_id, name, format, input, groups)
+        if None in region_tuple:
+            raise RuntimeError("%s: Region tag has not got all information: Id '%s', Name '%s', Format '%s', Input '%s', Groups '%s'" %
+                               (label, region_id, name, format, input, groups))
+
+        self.regions.append(region_tuple)
+
+    def read_node(self, node):
+        label = self.label
+
+        if node.tag == 'definition':
+            if node.text is not None:
+                self.definition = node.text.strip()
+            elif not self.strict:
+                self.definition = ''
+            else:
+                raise RuntimeError("%s: Numerical model 'definition' tag exists but is empty [TODO: add support for external definitions]" % label)
+            # TODO: implement family comparison, as well as definition
+            # content
+            self.family = node.get('family')
+        else:
+            raise RuntimeError("%s: Unknown node in numerical model: %s" % (label, node.tag))
+
+    def apply(self, simulationDefinition):
+        simulationDefinition.set_numerical_model(self.definition, self.family, self.regions, self.needles)
@@ -0,0 +1,197 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import struct
+import zlib
+from .simulation_definition import SimulationDefinition
+
+# Binary layout (all integers little-endian):
+#
+#   magic 'GSSD' | version (u8) | flags (u8) | payload
+#
+# If flag bit 0 is set, the payload is zlib-compressed. The payload is a
+# string table (varint count, varint byte lengths, then the concatenated UTF-8)
+# followed by a single tagged value, the SimulationDefinition.to_dict() output.
+# Every distinct string is stored once, so repeated parameter names, types and
+# region groups cost a varint reference each.
+MAGIC = b'GSSD'
+VERSION = 1
+FLAG_COMPRESSED = 1
+
+_NONE, _TRUE, _FALSE, _INT, _BIGINT, _FLOAT, _STR, _LIST, _DICT, _FLOATS, _INTS = range(11)
+
+_INT_MIN = -(1 << 63)
+_INT_MAX = (1 << 63) - 1
+
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _encode(value, out, strings):
+    # bool must be checked before int, as it is a subclass
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, int):
+        if _INT_MIN <= value <= _INT_MAX:
+            out.append(_INT)
+            out += struct.pack('<q', value)
+        else:
+            out.append(_BIGINT)
+            _write_varint(out, strings.setdefault(str(value), len(strings)))
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += struct.pack('<d', value)
+    elif isinstance(value, str):
+        out.append(_STR)
+        _write_varint(out, strings.setdefault(value, len(strings)))
+    elif isinstance(value, (list, tuple)):
+        # Homogeneous numeric lists (coordinates, tabulated curves) are
+        # packed as raw arrays
+        if value and all(type(v) is float for v in value):
+            out.append(_FLOATS)
+            _write_varint(out, len(value))
+            out += struct.pack('<%dd' % len(value), *value)
+        elif value and all(type(v) is int and _INT_MIN <= v <= _INT_MAX for v in value):
+            out.append(_INTS)
+            _write_varint(out, len(value))
+            out += struct.pack('<%dq' % len(value), *value)
+        else:
+            out.append(_LIST)
+            _write_varint(out, len(value))
+            for v in value:
+                _encode(v, out, strings)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        _write_varint(out, len(value))
+        for k, v in value.items():
+            _encode(k, out, strings)
+            _encode(v, out, strings)
+    else:
+        raise RuntimeError("Cannot serialize value of type %s" % type(value).__name__)
+
+
+def dump_definition(definition, compress=True):
+    """Serialize a SimulationDefinition to the compact binary format."""
+    strings = {}
+    body = bytearray()
+    _encode(definition.to_dict(), body, strings)
+
+    payload = bytearray()
+    encoded = [s.encode('utf-8') for s in strings]
+    _write_varint(payload, len(encoded))
+    for s in encoded:
+        _write_varint(payload, len(s))
+    payload += b''.join(encoded)
+    payload += body
+
+    flags = 0
+    if compress:
+        payload = zlib.compress(bytes(payload))
+        flags |= FLAG_COMPRESSED
+
+    return MAGIC + struct.pack('<BB', VERSION, flags) + bytes(payload)
+
+
+def load_definition(data):
+    """Rebuild a SimulationDefinition from dump_definition output.
+
+    Parameter values are restored in their converted form, so neither lxml nor
+    convert_parameter is involved.
+
+    """
+    data = bytes(data)
+    if data[:4] != MAGIC:
+        raise RuntimeError("Not a serialized simulation definition")
+
+    version, flags = struct.unpack_from('<BB', data, 4)
+    if version != VERSION:
+        raise RuntimeError("Unsupported serialized definition version: %d" % version)
+
+    payload = data[6:]
+    if flags & FLAG_COMPRESSED:
+        payload = zlib.decompress(payload)
+
+    position = 0
+
+    def varint():
+        nonlocal position
+        result = 0
+        shift = 0
+        while True:
+            byte = payload[position]
+            position += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    count = varint()
+    lengths = [varint() for _ in range(count)]
+    strings = []
+    for length in lengths:
+        strings.append(payload[position:position + length].decode('utf-8'))
+        position += length
+
+    unpack_from = struct.unpack_from
+
+    def decode():
+        nonlocal position
+        tag = payload[position]
+        position += 1
+
+        if tag == _STR:
+            return strings[varint()]
+        elif tag == _DICT:
+            n = varint()
+            result = {}
+            for _ in range(n):
+                key = decode()
+                result[key] = decode()
+            return result
+        elif tag == _LIST:
+            return [decode() for _ in range(varint())]
+        elif tag == _NONE:
+            return None
+        elif tag == _TRUE:
+            return True
+        elif tag == _FALSE:
+            return False
+        elif tag == _INT:
+            position += 8
+            return unpack_from('<q', payload, position - 8)[0]
+        elif tag == _FLOAT:
+            position += 8
+            return unpack_from('<d', payload, position - 8)[0]
+        elif tag == _FLOATS or tag == _INTS:
+            n = varint()
+            position += 8 * n
+            return list(unpack_from('<%d%s' % (n, 'd' if tag == _FLOATS else 'q'), payload, position - 8 * n))
+        elif tag == _BIGINT:
+            return int(strings[varint()])
+
+        raise RuntimeError("Corrupt serialized definition (tag %d)" % tag)
+
+    return SimulationDefinition.from_dict(decode())
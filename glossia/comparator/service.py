@@ -0,0 +1,219 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from lxml import etree as ET
+import copy
+import json
+import os
+import socketserver
+import threading
+from .cache import DefinitionCache, document_key
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+COMPARISON_ERROR = -32000
+
+
+class _RequestError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+# This class keeps definitions parsed between requests, so that a long-running
+# process can answer comparisons without re-importing or re-parsing anything
+class ComparisonService:
+    """JSON-RPC 2.0 comparison service over newline-delimited JSON.
+
+    Reference definitions are registered once, under a chosen ID or (by
+    default) the hash of their content, and stay parsed for the life of the
+    service. Other documents go through a DefinitionCache, so a candidate
+    submitted repeatedly is only parsed once. Methods:
+
+        register(document, id=None) -> id
+        unregister(id) -> bool
+        definitions() -> [id, ...]
+        diff(left|left_document, right|right_document, tolerances=None) -> [message, ...]
+        equal(left|left_document, right|right_document, tolerances=None) -> bool
+        stats() -> {...}
+
+    where left and right are registered IDs and left_document and
+    right_document GSSA-XML text. Tolerances are as for Comparator, with
+    [absolute, relative] lists in place of tuples.
+
+    """
+    methods = ('register', 'unregister', 'definitions', 'diff', 'equal', 'stats')
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else DefinitionCache()
+        self.registered = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def register(self, document, id=None):
+        if id is None:
+            id = document_key(document)
+        self.registered[id] = self.cache.get(document, id)
+        return id
+
+    def unregister(self, id):
+        return self.registered.pop(id, None) is not None
+
+    def definitions(self):
+        return sorted(self.registered)
+
+    def diff(self, left=None, right=None, left_document=None, right_document=None, tolerances=None):
+        this, that = self._pair(left, right, left_document, right_document)
+        return this.diff(that, self._tolerances(tolerances))
+
+    def equal(self, left=None, right=None, left_document=None, right_document=None, tolerances=None):
+        this, that = self._pair(left, right, left_document, right_document)
+        tolerances = self._tolerances(tolerances)
+        if tolerances is None and this.fingerprint() == that.fingerprint():
+            return True
+        return this.matches(that, tolerances)
+
+    def stats(self):
+        stats = {'registered': len(self.registered), 'requests': self.requests}
+        stats.update(self.cache.stats())
+        return stats
+
+    def _definition(self, id, document, label):
+        if (id is None) == (document is None):
+            raise _RequestError(INVALID_PARAMS, "Exactly one of %s and %s_document is needed" % (label, label))
+        if document is not None:
+            return self.cache.get(document, label.capitalize())
+        if id not in self.registered:
+            raise _RequestError(INVALID_PARAMS, "No definition registered as %s" % id)
+
+        # Messages name the sides as Comparator does, whatever the ID
+        definition = copy.copy(self.registered[id])
+        definition.name = label.capitalize()
+        return definition
+
+    def _pair(self, left, right, left_document, right_document):
+        return self._definition(left, left_document, "left"), self._definition(right, right_document, "right")
+
+    @staticmethod
+    def _tolerances(tolerances):
+        if tolerances is None:
+            return None
+
+        def is_pair(value):
+            return (
+                isinstance(value, list) and len(value) == 2 and
+                all(isinstance(number, (int, float)) and not isinstance(number, bool) for number in value)
+            )
+
+        if not isinstance(tolerances, dict) or not all(is_pair(value) for value in tolerances.values()):
+            raise _RequestError(INVALID_PARAMS, "Tolerances must map names or types to [absolute, relative] pairs")
+        return {key: tuple(value) for key, value in tolerances.items()}
+
+    def handle(self, request):
+        """Answer a single decoded JSON-RPC request, returning the response
+        (or None for a notification)."""
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            return self._error(None, INVALID_REQUEST, "Invalid request")
+
+        request_id = request.get('id')
+        method = request['method']
+        params = request.get('params', {})
+
+        if method not in self.methods:
+            return self._error(request_id, METHOD_NOT_FOUND, "Unknown method: %s" % method)
+
+        try:
+            with self._lock:
+                self.requests += 1
+                if isinstance(params, list):
+                    result = getattr(self, method)(*params)
+                elif isinstance(params, dict):
+                    result = getattr(self, method)(**params)
+                else:
+                    raise _RequestError(INVALID_PARAMS, "Parameters must be a list or object")
+        except _RequestError as e:
+            return self._error(request_id, e.code, str(e))
+        except TypeError as e:
+            return self._error(request_id, INVALID_PARAMS, str(e))
+        except (RuntimeError, ValueError, ET.XMLSyntaxError) as e:
+            return self._error(request_id, COMPARISON_ERROR, str(e))
+        except Exception as e:
+            # Whatever a request does wrong, the service keeps running
+            return self._error(request_id, INTERNAL_ERROR, "%s: %s" % (type(e).__name__, e))
+
+        if 'id' not in request:
+            return None
+
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+    def handle_line(self, line):
+        """Answer one line of JSON, returning the line of response (or None)."""
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response = self._error(None, PARSE_ERROR, str(e))
+        else:
+            response = self.handle(request)
+
+        return None if response is None else json.dumps(response)
+
+    def serve_stream(self, input, output):
+        """Answer requests, one per line, until the input ends."""
+        for line in input:
+            if not line.strip():
+                continue
+            response = self.handle_line(line)
+            if response is not None:
+                output.write(response + "\n")
+                output.flush()
+
+    def serve_unix(self, path):
+        """Answer requests from any number of clients connecting to a Unix
+        socket at path, until interrupted."""
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        response = service.handle_line(line.decode('utf-8'))
+                    except UnicodeDecodeError as e:
+                        response = json.dumps(service._error(None, PARSE_ERROR, str(e)))
+                    if response is not None:
+                        self.wfile.write(response.encode('utf-8') + b"\n")
+                        self.wfile.flush()
+
+        if os.path.exists(path):
+            os.unlink(path)
+
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.unlink(path)
+
+    @staticmethod
+    def _error(request_id, code, message):
+        return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
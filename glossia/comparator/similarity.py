@@ -0,0 +1,184 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import Counter, defaultdict
+import zlib
+import numpy
+from .parameters import canonical_value
+
+# Hash functions for MinHash are (a * x + b) mod p, truncated to 32 bits, over
+# 32-bit feature hashes, so all arithmetic fits in unsigned 64-bit integers
+_MERSENNE_PRIME = numpy.uint64((1 << 61) - 1)
+_MAX_HASH = numpy.uint64((1 << 32) - 1)
+
+
+def definition_features(definition):
+    """Reduce a SimulationDefinition to a set of feature strings for
+    similarity estimation.
+
+    Features cover parameter names and values, algorithm results, the
+    transferrer, region IDs and groups, needle classes and files, and needle
+    parameters. Needles (and their parameters) are counted as a multiset,
+    so a definition with three identical needles is not the same as one with
+    a single needle.
+
+    """
+    features = set()
+
+    def value(parameter):
+        return repr(canonical_value(parameter.value))
+
+    if definition.transferrer:
+        features.add('transferrer:%s:%s' % (definition.transferrer.cls, definition.transferrer.url))
+
+    for name, parameter in definition.parameters.items():
+        features.add('parameter:%s' % name)
+        features.add('parameter:%s=%s' % (name, value(parameter)))
+
+    for result, algorithm in definition.algorithms.items():
+        features.add('algorithm:%s' % result)
+        features.add('algorithm:%s:%s' % (result, algorithm.fingerprint()))
+
+    model = definition.numerical_model
+    if model:
+        for id, region in model.regions.items():
+            features.add('region:%s' % id)
+            for group in region.groups:
+                features.add('region:%s:group:%s' % (id, group))
+
+        needle_features = Counter()
+        for needle in model.needles.values():
+            needle_features['needle:%s:%s' % (needle.cls, needle.file)] += 1
+            for name, parameter in needle.parameters.items():
+                needle_features['needle-parameter:%s=%s' % (name, value(parameter))] += 1
+
+        for feature, count in needle_features.items():
+            features.update('%s#%d' % (feature, n) for n in range(count))
+
+    return features
+
+
+# This class answers "which archived definitions are most like this one?"
+# without comparing against the whole archive
+class SimilarityIndex:
+    """MinHash/LSH index over a corpus of SimulationDefinitions.
+
+    Each definition is sketched as a MinHash signature of its features (see
+    definition_features), whose agreement estimates the Jaccard similarity of
+    two feature sets. The signature is split into bands, and only
+    definitions sharing at least one whole band with a query become
+    candidates, so a query touches a small fraction of the corpus. With the
+    defaults (32 bands of 4), pairs with similarity 0.5 are found with
+    probability ~0.87 and 0.7 with probability ~1.
+
+    """
+    num_perm = 128
+    bands = 32
+    seed = 1
+
+    def __init__(self, num_perm=None, bands=None, seed=None):
+        if num_perm is not None:
+            self.num_perm = num_perm
+        if bands is not None:
+            self.bands = bands
+        if seed is not None:
+            self.seed = seed
+
+        if self.num_perm % self.bands != 0:
+            raise RuntimeError("Number of permutations (%d) must be a multiple of the number of bands (%d)" % (self.num_perm, self.bands))
+        self.rows = self.num_perm // self.bands
+
+        rng = numpy.random.RandomState(self.seed)
+        self._a = rng.randint(1, 1 << 32, size=self.num_perm, dtype=numpy.uint64)
+        self._b = rng.randint(0, 1 << 32, size=self.num_perm, dtype=numpy.uint64)
+
+        self._signatures = {}
+        self._definitions = {}
+        self._buckets = [defaultdict(list) for _ in range(self.bands)]
+
+    def signature(self, definition):
+        """MinHash signature of a definition, as an array of num_perm
+        hashes."""
+        features = definition_features(definition)
+        if not features:
+            return numpy.full(self.num_perm, _MAX_HASH, dtype=numpy.uint64)
+
+        hashes = numpy.array([zlib.crc32(f.encode('utf-8')) for f in features], dtype=numpy.uint64)
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=1)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def add(self, key, definition):
+        if key in self._signatures:
+            raise RuntimeError("Definition already indexed under key %s" % key)
+
+        signature = self.signature(definition)
+        self._signatures[key] = signature
+        self._definitions[key] = definition
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            buckets[band_key].append(key)
+
+    def update(self, definitions):
+        """Add a mapping (or sequence, keyed by position) of definitions."""
+        items = definitions.items() if hasattr(definitions, 'items') else enumerate(definitions)
+        for key, definition in items:
+            self.add(key, definition)
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def __contains__(self, key):
+        return key in self._signatures
+
+    def candidates(self, definition, signature=None):
+        """Keys of indexed definitions sharing at least one band with this
+        one."""
+        if signature is None:
+            signature = self.signature(definition)
+
+        found = set()
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            found.update(buckets.get(band_key, ()))
+        return found
+
+    def query(self, definition, k=10):
+        """Return up to k (key, estimated similarity) pairs for the indexed
+        definitions most like this one, most similar first."""
+        signature = self.signature(definition)
+        scored = [
+            (key, float((self._signatures[key] == signature).mean()))
+            for key in self.candidates(definition, signature)
+        ]
+        scored.sort(key=lambda pair: -pair[1])
+        return scored[:k]
+
+    def closest(self, definition, k=10, tolerances=None):
+        """Return up to k (key, diff messages) pairs for the nearest indexed
+        definitions, fewest differences first.
+
+        The exact diff is only run against the candidates found by query.
+
+        """
+        results = [
+            (key, definition.diff(self._definitions[key], tolerances))
+            for key, _ in self.query(definition, k)
+        ]
+        results.sort(key=lambda pair: len(pair[1]))
+        return results
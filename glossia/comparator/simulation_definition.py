@@ -16,14 +16,66 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import Counter
 from munkres import Munkres
-import difflib
+import hashlib
 import json
+import numpy
+import sys
 from . import parameters
+from .diff_record import DiffRecord, MISSING, format_records
+from .incremental import DiffState
+from .stats import NO_STATS
+from .three_way import ThreeWayDiff
 
 # CDM: Clinical Domain Model (see documentation)
 
 
+def _intern(value):
+    # Names, types and IDs repeat across every needle and definition, so one
+    # copy of each string is shared
+    return sys.intern(value) if type(value) is str else value
+
+
+# Sections of GSSA-XML that may be selected for parsing and comparison, the
+# last three being the parts of the numerical model
+SECTION_NAMES = ("transferrer", "algorithms", "parameters", "numericalModel", "needles", "regions", "definition")
+MODEL_PARTS = ("needles", "regions", "definition")
+
+
+def select_sections(sections):
+    """Normalize a selection of sections (names from SECTION_NAMES) to a
+    frozenset. None selects everything, numericalModel selects all of its
+    parts and any part also selects numericalModel itself."""
+    if sections is None:
+        return frozenset(SECTION_NAMES)
+    if isinstance(sections, str):
+        sections = [sections]
+
+    selected = set(sections)
+    unknown = selected.difference(SECTION_NAMES)
+    if unknown:
+        raise RuntimeError("Unknown sections: %s" % ", ".join(sorted(unknown)))
+
+    if "numericalModel" in selected:
+        selected.update(MODEL_PARTS)
+    elif selected.intersection(MODEL_PARTS):
+        selected.add("numericalModel")
+
+    return frozenset(selected)
+
+
+def _keyed(entities, attribute):
+    # Entities by their (interned) identifying attribute, so that dictionary
+    # keys share the entity's string rather than holding another copy
+    return {getattr(entity, attribute): entity for entity in entities}
+
+
+def _digest(*parts):
+    """Stable hash of a tuple of canonical parts (strings, numbers, tuples)."""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
 class SimulationDefinition:
     """Abstract definition of a GSSA simulation.
 
@@ -36,22 +88,30 @@ class SimulationDefinition:
 
     """
     class Argument:
-        name = ""
+        __slots__ = ('name',)
 
         def __init__(self, name):
-            self.name = name
+            self.name = _intern(name)
 
         # An argument is defined up to equivalence by its name
+        def diff_records(self, other):
+            if self.name != other.name:
+                yield DiffRecord("Argument", self.name, "name", self.name, other.name)
+
         def diff(self, other):
-            messages = []
+            return format_records(self.diff_records(other), sort=False)
 
-            if self.name != other.name:
-                messages += ["Argument: names differ %s // %s" % (self.name, other.name)]
+        def fingerprint(self):
+            return _digest('argument', self.name)
 
-            return messages
+        def matches(self, other):
+            return self.name == other.name
 
         def __eq__(self, other):
-            return self.diff(other)
+            return self.matches(other)
+
+        def __hash__(self):
+            return hash(self.fingerprint())
 
     class Needle:
         """A percutaneous needle.
@@ -60,16 +120,13 @@ class SimulationDefinition:
         implements used in a procedure, possibly with repetition) [see CDM]
 
         """
-        index = ""
-        cls = ""
-        file = ""
-        parameters = None
+        __slots__ = ('index', 'cls', 'file', 'parameters')
 
         def __init__(self, index, cls, file, parameters):
-            self.index = index
-            self.cls = cls
-            self.file = file
-            self.parameters = dict((p[0], SimulationDefinition.Parameter(*p)) for p in parameters)
+            self.index = _intern(index)
+            self.cls = _intern(cls)
+            self.file = _intern(file)
+            self.parameters = _keyed((SimulationDefinition.Parameter(*p) for p in parameters), 'name')
 
         def to_dict(self):
             return {
@@ -79,50 +136,91 @@ class SimulationDefinition:
                 'parameters': self.get_parameters_dict()
             }
 
+        @classmethod
+        def from_dict(cls, needle_dict):
+            """Inverse of to_dict, taking already-converted parameter values."""
+            needle = cls(needle_dict['index'], needle_dict['class'], needle_dict['file'], [])
+            needle.parameters = _keyed((
+                SimulationDefinition.Parameter.from_tuple(name, param)
+                for name, param in needle_dict['parameters'].items()
+            ), 'name')
+            return needle
+
         def get_parameters_dict(self):
             return {name: param.to_tuple() for name, param in self.parameters.items()}
 
-        def diff(self, other):
+        def diff_records(self, other, tolerances=None):
             """Needles are defined by their class, ID/file and their parameters (inc.
             location) [see CDM]"""
-            messages = []
-
             string_comparisons = {
                 "cls": (self.cls, other.cls),
                 "file": (self.file, other.file),
             }
             for field, pair in string_comparisons.items():
                 if pair[0] != pair[1]:
-                    messages += ["Needle: for index %s, %s fields differ %s // %s" % (self.index, field, pair[0], pair[1])]
+                    yield DiffRecord("Needle", self.index, field, pair[0], pair[1])
 
             all_parameters = set().union(self.parameters.keys(), other.parameters.keys())
             for name in all_parameters:
                 if name not in self.parameters:
-                    messages += ["Needle: this (%s) has no parameter %s" % (self.index, name)]
+                    yield DiffRecord("Needle", self.index, "parameter", MISSING, name)
                 elif name not in other.parameters:
-                    messages += ["Needle: that (%s) has no parameter %s" % (other.index, name)]
+                    yield DiffRecord("Needle", other.index, "parameter", name, MISSING)
+                else:
+                    yield from self.parameters[name].diff_records(other.parameters[name], tolerances)
+
+        def diff(self, other, tolerances=None):
+            return format_records(self.diff_records(other, tolerances), sort=False)
+
+        def cost(self, other, tolerances=None):
+            """Number of differences diff would report, without formatting any
+            messages. This is used to match up needles between definitions."""
+            cost = (self.cls != other.cls) + (self.file != other.file)
+
+            for name, parameter in self.parameters.items():
+                if name in other.parameters:
+                    that = other.parameters[name]
+                    tolerance = parameters.tolerance_for(name, parameter.typ, tolerances)
+                    cost += (parameter.typ != that.typ) + (not parameters.values_equal(parameter.value, that.value, tolerance))
                 else:
-                    messages += self.parameters[name].diff(other.parameters[name])
+                    cost += 1
+            cost += sum(1 for name in other.parameters if name not in self.parameters)
+
+            return cost
 
-            return messages
+        def fingerprint(self):
+            """As for diff, the index is not part of a needle's identity, only
+            its class, file and parameters."""
+            return _digest('needle', self.cls, self.file,
+                           tuple(sorted(p.fingerprint() for p in self.parameters.values())))
+
+        def matches(self, other, tolerances=None):
+            """Short-circuiting equivalent of diff(other) == [], trying the
+            cheapest discriminators first."""
+            if self.cls != other.cls or self.file != other.file:
+                return False
+
+            if len(self.parameters) != len(other.parameters) or self.parameters.keys() != other.parameters.keys():
+                return False
+
+            return all(parameter.matches(other.parameters[name], tolerances) for name, parameter in self.parameters.items())
 
         def __eq__(self, other):
-            return self.diff(other) == []
+            return self.matches(other)
+
+        def __hash__(self):
+            return hash(self.fingerprint())
 
     class Region:
         """Regions are geometric subdomains (2D/3D) [see CDM]."""
-        id = ""
-        name = ""
-        format = ""
-        input = ""
-        groups = None
+        __slots__ = ('id', 'name', 'format', 'input', 'groups')
 
         def __init__(self, id, name, format, input, groups):
-            self.id = id
-            self.name = name
-            self.format = format
-            self.input = input
-            self.groups = groups
+            self.id = _intern(id)
+            self.name = _intern(name)
+            self.format = _intern(format)
+            self.input = _intern(input)
+            self.groups = [_intern(group) for group in groups] if isinstance(groups, list) else groups
 
         def to_dict(self):
             return {
@@ -132,12 +230,15 @@ class SimulationDefinition:
                 'meaning': self.name
             }
 
-        def diff(self, other):
+        @classmethod
+        def from_dict(cls, id, region_dict):
+            """Inverse of to_dict (which leaves the ID to the caller)."""
+            return cls(id, region_dict['meaning'], region_dict['format'], region_dict['input'], region_dict['groups'])
+
+        def diff_records(self, other):
             """A region's definition is, strictly, in the separate geometry file
             describing it (usually), but the GSSA-XML should be able to provide
             enough information to tie it down."""
-            messages = []
-
             string_comparisons = {
                 "id": (self.id, other.id),
                 "name": (self.name, other.name),
@@ -146,57 +247,94 @@ class SimulationDefinition:
             }
             for field, pair in string_comparisons.items():
                 if pair[0] != pair[1]:
-                    messages += ["Region: for ID %s, %s fields differ %s // %s" % (self.id, field, pair[0], pair[1])]
+                    yield DiffRecord("Region", self.id, field, pair[0], pair[1])
 
             all_groups = set().union(self.groups, other.groups)
             for name in all_groups:
                 if name not in self.groups:
-                    messages += ["Region: this (%s) has no group %s" % (self.id, name)]
+                    yield DiffRecord("Region", self.id, "group", MISSING, name)
                 elif name not in other.groups:
-                    messages += ["Region: that (%s) has no group %s" % (other.id, name)]
+                    yield DiffRecord("Region", other.id, "group", name, MISSING)
 
-            return messages
+        def diff(self, other):
+            return format_records(self.diff_records(other), sort=False)
+
+        def fingerprint(self):
+            return _digest('region', self.id, self.name, self.format, self.input,
+                           tuple(sorted(set(self.groups))))
+
+        def matches(self, other):
+            return (
+                self.id == other.id and
+                self.name == other.name and
+                self.format == other.format and
+                self.input == other.input and
+                set(self.groups) == set(other.groups)
+            )
 
         def __eq__(self, other):
-            return self.diff(other) == []
+            return self.matches(other)
+
+        def __hash__(self):
+            return hash(self.fingerprint())
 
     class Algorithm:
         """An algorithm is a DB-defined lambda function that takes simulation-time
         arguments, such as Time or CurrentNeedleLength, and returns a
         Parameter-like value. In the GSSF case, these are generally MATC functions
         [see CDM]."""
-        result = ""
-        arguments = None
-        content = ""
+        __slots__ = ('result', 'arguments', 'content')
 
         def __init__(self, result, arguments, content):
-            self.result = result
-            self.arguments = dict((a, SimulationDefinition.Argument(a)) for a in arguments)
+            self.result = _intern(result)
+            self.arguments = _keyed((SimulationDefinition.Argument(a) for a in arguments), 'name')
             self.content = content
 
-        def diff(self, other):
-            """An Algorithm is defined by its result (parameter), arguments (above) and content (textual)."""
-            messages = []
+        def to_dict(self):
+            return {
+                'arguments': list(self.arguments.keys()),
+                'content': self.content
+            }
 
+        @classmethod
+        def from_dict(cls, result, algorithm_dict):
+            return cls(result, algorithm_dict['arguments'], algorithm_dict['content'])
+
+        def diff_records(self, other):
+            """An Algorithm is defined by its result (parameter), arguments (above) and content (textual)."""
             if self.result != other.result:
-                messages += ["Algorithm: results differ %s // %s" % (self.result, other.result)]
+                yield DiffRecord("Algorithm", self.result, "result", self.result, other.result)
 
             all_arguments = set().union(self.arguments.keys(), other.arguments.keys())
             for name in all_arguments:
                 if name not in self.arguments:
-                    messages += ["Algorithm: %s has no argument %s" % (self.result, name)]
+                    yield DiffRecord("Algorithm", self.result, "argument", MISSING, name)
                 elif name not in other.arguments:
-                    messages += ["Algorithm: %s has no argument %s" % (other.result, name)]
+                    yield DiffRecord("Algorithm", other.result, "argument", name, MISSING)
                 else:
-                    messages += self.arguments[name].diff(other.arguments[name])
+                    yield from self.arguments[name].diff_records(other.arguments[name])
 
             if self.content != other.content:
-                messages += ["Algorithm: %s content differs" % (self.result,)]
+                yield DiffRecord("Algorithm", self.result, "content", self.content, other.content)
+
+        def diff(self, other):
+            return format_records(self.diff_records(other), sort=False)
+
+        def fingerprint(self):
+            return _digest('algorithm', self.result, tuple(sorted(self.arguments.keys())), self.content)
 
-            return messages
+        def matches(self, other):
+            return (
+                self.result == other.result and
+                self.arguments.keys() == other.arguments.keys() and
+                self.content == other.content
+            )
 
         def __eq__(self, other):
-            return self.diff(other) == []
+            return self.matches(other)
+
+        def __hash__(self):
+            return hash(self.fingerprint())
 
     class NumericalModel:
         """The Numerical Model is a template or, say, a Python code using the
@@ -211,8 +349,8 @@ class SimulationDefinition:
         def __init__(self, definition, family, regions, needles):
             self.definition = definition
             self.family = family
-            self.regions = dict((r[0], SimulationDefinition.Region(*r)) for r in regions)
-            self.needles = dict((n[0], SimulationDefinition.Needle(*n)) for n in needles)
+            self.regions = _keyed((SimulationDefinition.Region(*r) for r in regions), 'id')
+            self.needles = _keyed((SimulationDefinition.Needle(*n) for n in needles), 'index')
 
         def get_regions_dict(self):
             return {name: region.to_dict() for name, region in self.regions.items()}
@@ -220,116 +358,360 @@ class SimulationDefinition:
         def get_needle_dicts(self):
             return [needle.to_dict() for needle in self.needles.values()]
 
-        def diff(self, other):
-            messages = []
+        def to_dict(self):
+            return {
+                'definition': self.definition,
+                'family': self.family,
+                'regions': self.get_regions_dict(),
+                'needles': self.get_needle_dicts()
+            }
 
-            # Note that this can only effectively compare embedded definitions
-            if self.definition != other.definition:
-                if not self.definition:
-                    messages += ["Numerical Model: this has no definition"]
-                elif not other.definition:
-                    messages += ["Numerical Model: that has no definition"]
-                else:
-                    d = difflib.unified_diff(self.definition.splitlines(), other.definition.splitlines())
-                    messages += ["Numerical Model: definitions differ:\n | " + "\n | ".join(line.strip() for line in d)]
-
-            all_regions = set().union(self.regions.keys(), other.regions.keys())
-            for id in all_regions:
-                if id not in self.regions:
-                    messages += ["Numerical Model: this has no region %s" % id]
-                elif id not in other.regions:
-                    messages += ["Numerical Model: that has no region %s" % id]
-                else:
-                    messages += self.regions[id].diff(other.regions[id])
+        @classmethod
+        def from_dict(cls, model_dict):
+            model = cls(model_dict['definition'], model_dict['family'], [], [])
+            model.regions = _keyed((
+                SimulationDefinition.Region.from_dict(id, region)
+                for id, region in model_dict['regions'].items()
+            ), 'id')
+            needles = (SimulationDefinition.Needle.from_dict(needle) for needle in model_dict['needles'])
+            model.needles = {needle.index: needle for needle in needles}
+            return model
+
+        def diff_records(self, other, tolerances=None, stats=NO_STATS, sections=None):
+            sections = select_sections(sections)
+
+            if "definition" in sections:
+                yield from self.definition_records(other)
+
+            if "regions" in sections:
+                all_regions = set().union(self.regions.keys(), other.regions.keys())
+                for id in all_regions:
+                    yield from self.region_records(other, id)
+
+            if "needles" not in sections:
+                return
 
-            diff_matrix = []
             this_keys = list(self.needles.keys())
             that_keys = list(other.needles.keys())
 
             if len(this_keys) != len(that_keys):
-                messages += ["Numerical Model: this has different needle count than that"]
+                yield DiffRecord("Numerical Model", None, "needle count", len(this_keys), len(that_keys))
 
             if len(this_keys) > 0 and len(that_keys) > 0:
-                for this_key in this_keys:
-                    diff_row = []
-                    for that_key in that_keys:
-                        needle_messages = self.needles[this_key].diff(other.needles[that_key])
-                        diff_row.append(len(needle_messages))
-                    diff_matrix.append(diff_row)
+                # Needles are matched on cost alone, so records are only
+                # produced for the final assignment
+                with stats.phase("needle costs"):
+                    diff_matrix = self.needle_costs(other, this_keys, that_keys, tolerances)
+                stats.count("matrix cells", diff_matrix.size)
+
+                with stats.phase("assignment"):
+                    assignment = self.assign_needles(diff_matrix)
 
-                m = Munkres()
-                indexes = m.compute(diff_matrix)
-                for row, column in indexes:
-                    messages += self.needles[this_keys[row]].diff(other.needles[that_keys[column]])
+                for row, column in assignment:
+                    yield from self.needles[this_keys[row]].diff_records(other.needles[that_keys[column]], tolerances)
 
-            return messages
+        def definition_records(self, other):
+            # Note that this can only effectively compare embedded definitions
+            # (the unified diff of the two is only produced when formatted)
+            if self.definition != other.definition:
+                yield DiffRecord("Numerical Model", None, "definition", self.definition, other.definition)
+
+        def region_records(self, other, id):
+            if id not in self.regions:
+                yield DiffRecord("Numerical Model", None, "region", MISSING, id)
+            elif id not in other.regions:
+                yield DiffRecord("Numerical Model", None, "region", id, MISSING)
+            else:
+                yield from self.regions[id].diff_records(other.regions[id])
+
+        @staticmethod
+        def assign_needles(costs):
+            """Solve the assignment problem for a needle cost matrix, giving
+            (row, column) pairs of matched needles."""
+            return Munkres().compute(costs.tolist())
+
+        def diff(self, other, tolerances=None):
+            return format_records(self.diff_records(other, tolerances), sort=False)
+
+        def needle_costs(self, other, this_keys=None, that_keys=None, tolerances=None):
+            """Build the matrix of needle-to-needle costs (the number of
+            messages Needle.diff would give for each pair) in one pass.
+
+            Classes, files, parameter types and parameter values are interned
+            to integer codes, laid out as (needle, parameter name) arrays, and
+            compared across all pairs at once by broadcasting. Values of
+            parameters with a tolerance are instead compared column by column,
+            each with a single vectorized comparison.
+
+            """
+            if this_keys is None:
+                this_keys = list(self.needles.keys())
+            if that_keys is None:
+                that_keys = list(other.needles.keys())
+
+            this_needles = [self.needles[key] for key in this_keys]
+            that_needles = [other.needles[key] for key in that_keys]
+
+            names = sorted(set().union(*(n.parameters.keys() for n in this_needles + that_needles)))
+            columns = {name: column for column, name in enumerate(names)}
+            codes = {}
+
+            def intern(value):
+                return codes.setdefault(value, len(codes))
+
+            def encode(needles):
+                shape = (len(needles), len(names))
+                present = numpy.zeros(shape, dtype=bool)
+                types = numpy.full(shape, -1, dtype=numpy.intp)
+                values = numpy.full(shape, -1, dtype=numpy.intp)
+                clss = numpy.empty(len(needles), dtype=numpy.intp)
+                files = numpy.empty(len(needles), dtype=numpy.intp)
+
+                for row, needle in enumerate(needles):
+                    clss[row] = intern(('cls', needle.cls))
+                    files[row] = intern(('file', needle.file))
+                    for name, parameter in needle.parameters.items():
+                        column = columns[name]
+                        present[row, column] = True
+                        types[row, column] = intern(('type', parameter.typ))
+                        values[row, column] = intern(('value', parameters.canonical_value(parameter.value)))
+
+                return clss, files, present, types, values
+
+            this_cls, this_file, this_present, this_types, this_values = encode(this_needles)
+            that_cls, that_file, that_present, that_types, that_values = encode(that_needles)
+
+            costs = (this_cls[:, None] != that_cls[None, :]).astype(numpy.intp)
+            costs += this_file[:, None] != that_file[None, :]
+
+            if names:
+                this_present = this_present[:, None, :]
+                that_present = that_present[None, :, :]
+                both = this_present & that_present
+
+                value_mismatches = this_values[:, None, :] != that_values[None, :, :]
+
+                if tolerances:
+                    for column, name in enumerate(names):
+                        self._tolerant_mismatches(name, column, this_needles, that_needles, value_mismatches, tolerances)
+
+                # A parameter on only one side is one message, otherwise the
+                # type and value may each give one
+                costs += (this_present ^ that_present).sum(axis=2)
+                costs += (both & (this_types[:, None, :] != that_types[None, :, :])).sum(axis=2)
+                costs += (both & value_mismatches).sum(axis=2)
+
+            return costs
+
+        @staticmethod
+        def _tolerant_mismatches(name, column, this_needles, that_needles, value_mismatches, tolerances):
+            # Replace one column of exact value mismatches with tolerant ones,
+            # where this parameter has a tolerance (by name or by the types
+            # on the left)
+            this_rows = [row for row, n in enumerate(this_needles) if name in n.parameters]
+            that_rows = [row for row, n in enumerate(that_needles) if name in n.parameters]
+            if not this_rows or not that_rows:
+                return
+
+            typs = set(this_needles[row].parameters[name].typ for row in this_rows)
+            tolerance = tolerances.get(name)
+            if tolerance is None:
+                if len(typs) > 1:
+                    # Mixed types cannot share a tolerance, so compare pairwise
+                    for row in this_rows:
+                        this = this_needles[row].parameters[name]
+                        tolerance = parameters.tolerance_for(name, this.typ, tolerances)
+                        for that_row in that_rows:
+                            that = that_needles[that_row].parameters[name]
+                            value_mismatches[row, that_row, column] = not parameters.values_equal(this.value, that.value, tolerance)
+                    return
+                tolerance = tolerances.get(typs.pop())
+                if tolerance is None:
+                    return
+
+            these = [this_needles[row].parameters[name].value for row in this_rows]
+            those = [that_needles[row].parameters[name].value for row in that_rows]
+            equal = parameters.values_equal_matrix(these, those, tolerance)
+            value_mismatches[numpy.ix_(this_rows, that_rows, [column])] = ~equal[:, :, None]
+
+        def fingerprint(self):
+            """Regions and needles are unordered, and needles are matched
+            regardless of index, so each contributes as a sorted multiset. The
+            family is not (yet) compared by diff, so is not included."""
+            return _digest(
+                'numerical model',
+                self.definition,
+                tuple(sorted(r.fingerprint() for r in self.regions.values())),
+                tuple(sorted(n.fingerprint() for n in self.needles.values()))
+            )
+
+        def matches(self, other, tolerances=None, sections=None):
+            """Short-circuiting equivalent of diff(other) == [].
+
+            Counts and key sets are checked before any content. Equal needle
+            sets admit a zero-cost assignment exactly when their multisets of
+            fingerprints agree, so no assignment need be solved. Only where
+            tolerances are given, and the needles are not exactly equal, is
+            the assignment solved to check for a zero-cost matching.
+
+            """
+            sections = select_sections(sections)
+
+            if "regions" in sections:
+                if len(self.regions) != len(other.regions) or self.regions.keys() != other.regions.keys():
+                    return False
+
+            if "definition" in sections and self.definition != other.definition:
+                return False
+
+            if "regions" in sections:
+                if not all(region.matches(other.regions[id]) for id, region in self.regions.items()):
+                    return False
+
+            if "needles" not in sections:
+                return True
+
+            if len(self.needles) != len(other.needles):
+                return False
+
+            if Counter(n.fingerprint() for n in self.needles.values()) == \
+                    Counter(n.fingerprint() for n in other.needles.values()):
+                return True
+
+            if not tolerances or not self.needles:
+                return False
+
+            costs = self.needle_costs(other, tolerances=tolerances)
+            return all(costs[row, column] == 0 for row, column in self.assign_needles(costs))
 
         def __eq__(self, other):
-            return self.diff(other) == []
+            return self.matches(other)
+
+        def __hash__(self):
+            return hash(self.fingerprint())
 
     class Parameter:
         """This is the fundamental class representing an arbitrary-type attribute of
         a simulation [see CDM]."""
-        value = None
-        typ = ""
-        name = ""
+        __slots__ = ('name', 'typ', 'value')
 
         def __init__(self, name, value, typ):
-            self.name = name
-            self.typ = typ
+            self.name = _intern(name)
+            self.typ = _intern(typ)
             self.value = parameters.convert_parameter(value, typ)
 
         def to_tuple(self):
             return [
                 self.typ,
-                self.value
+                parameters.export_value(self.value)
             ]
 
-        def diff(self, other):
-            messages = []
-
+        @classmethod
+        def from_tuple(cls, name, param):
+            """Inverse of to_tuple. The value is taken as already converted, so
+            is not passed through convert_parameter again (other than to turn
+            an exported list back into an array)."""
+            parameter = cls.__new__(cls)
+            parameter.name = _intern(name)
+            parameter.typ = _intern(param[0])
+            parameter.value = param[1]
+            if parameter.typ in parameters.ARRAY_TYPECODES and isinstance(parameter.value, list):
+                parameter.value = parameters.convert_parameter(parameter.value, parameter.typ)
+            return parameter
+
+        def diff_records(self, other, tolerances=None):
+            """Tolerances, if given, map parameter names or types to an
+            (absolute, relative) tolerance for numeric values."""
             if self.name != other.name:
-                messages += ["Parameter: names differ - %s // %s" % (self.name, other.name)]
+                yield DiffRecord("Parameter", self.name, "name", self.name, other.name)
             else:
                 if self.typ != other.typ:
-                    messages += ["Parameter %s: types differ - %s // %s" % (self.name, self.typ, other.typ)]
-                if self.value != other.value:
-                    messages += ["Parameter %s: values differ - %s // %s" % (self.name, str(self.value), str(other.value))]
+                    yield DiffRecord("Parameter", self.name, "type", self.typ, other.typ)
+                tolerance = parameters.tolerance_for(self.name, self.typ, tolerances)
+                if not parameters.values_equal(self.value, other.value, tolerance):
+                    yield DiffRecord("Parameter", self.name, "value", self.value, other.value)
+
+        def diff(self, other, tolerances=None):
+            return format_records(self.diff_records(other, tolerances))
+
+        def fingerprint(self):
+            return _digest('parameter', self.name, self.typ, parameters.canonical_value(self.value))
 
-            return sorted(messages)
+        def matches(self, other, tolerances=None):
+            if self.name != other.name or self.typ != other.typ:
+                return False
+            tolerance = parameters.tolerance_for(self.name, self.typ, tolerances)
+            return parameters.values_equal(self.value, other.value, tolerance)
 
         def __eq__(self, other):
-            return self.diff(other) == []
+            return self.matches(other)
+
+        def __hash__(self):
+            return hash(self.fingerprint())
 
     class Transferrer:
         """This is not part of the CDM, being a setting indicating how the simulation
         server should receive or send separate files, however it is a key
         component of GSSA-XML."""
-        url = ""
-        cls = ""
+        __slots__ = ('url', 'cls')
 
         def __init__(self, cls, url):
             self.url = url
-            self.cls = cls
+            self.cls = _intern(cls)
+
+        def to_dict(self):
+            return {
+                'class': self.cls,
+                'url': self.url
+            }
+
+        @classmethod
+        def from_dict(cls, transferrer_dict):
+            return cls(transferrer_dict['class'], transferrer_dict['url'])
+
+        def matches(self, other):
+            return self.url == other.url and self.cls == other.cls
 
         def __eq__(self, other):
-            return self.diff(other) == []
+            return self.matches(other)
 
-        def diff(self, other):
-            messages = []
+        def __hash__(self):
+            return hash(self.fingerprint())
+
+        def fingerprint(self):
+            return _digest('transferrer', self.url, self.cls)
 
+        def diff_records(self, other):
             if self.url != other.url:
-                messages += ["Transferrer: URLs differ - %s // %s" % (str(self.url), str(other.url))]
+                yield DiffRecord("Transferrer", None, "url", self.url, other.url)
             if self.cls != other.cls:
-                messages += ["Transferrer: classes differ - %s // %s" % (self.cls, other.cls)]
+                yield DiffRecord("Transferrer", None, "class", self.cls, other.cls)
 
-            return sorted(messages)
+        def diff(self, other):
+            return format_records(self.diff_records(other))
+
+    # Top-level sections, as named in records, and their attributes
+    SECTIONS = (
+        ("transferrer", "transferrer"),
+        ("algorithms", "algorithms"),
+        ("parameters", "parameters"),
+        ("numerical model", "numerical_model"),
+    )
+
+    # GSSA-XML tags of the top-level sections, by their names in records
+    SECTION_TAGS = {
+        "transferrer": "transferrer",
+        "algorithms": "algorithms",
+        "parameters": "parameters",
+        "numerical model": "numericalModel",
+    }
 
     transferrer = None
     parameters = None
     algorithms = None
     numerical_model = None
     name = "This"
+    _fingerprint = None
 
     def __init__(self, name):
         self.parameters = {}
@@ -337,13 +719,18 @@ class SimulationDefinition:
         self.name = name
 
     def add_parameter(self, name, value, typ):
-        self.parameters[name] = self.Parameter(name, value, typ)
+        parameter = self.Parameter(name, value, typ)
+        self.parameters[parameter.name] = parameter
+        self._fingerprint = None
 
     def add_algorithm(self, result, arguments, content):
-        self.algorithms[result] = self.Algorithm(result, arguments, content)
+        algorithm = self.Algorithm(result, arguments, content)
+        self.algorithms[algorithm.result] = algorithm
+        self._fingerprint = None
 
     def set_transferrer(self, cls, url):
         self.transferrer = self.Transferrer(cls, url)
+        self._fingerprint = None
 
     def get_needle_dicts(self):
         return self.numerical_model.get_needle_dicts()
@@ -357,8 +744,40 @@ class SimulationDefinition:
     def get_family(self):
         return self.numerical_model.family
 
+    def to_dict(self):
+        """Export the whole definition as plain Python data (with parameter
+        values in their converted form), such that from_dict will rebuild an
+        equivalent definition."""
+        return {
+            'name': self.name,
+            'transferrer': self.transferrer.to_dict() if self.transferrer else None,
+            'algorithms': {result: algorithm.to_dict() for result, algorithm in self.algorithms.items()},
+            'parameters': self.get_parameters_dict(),
+            'numerical_model': self.numerical_model.to_dict() if self.numerical_model else None
+        }
+
+    @classmethod
+    def from_dict(cls, definition_dict):
+        definition = cls(definition_dict['name'])
+
+        if definition_dict['transferrer'] is not None:
+            definition.transferrer = cls.Transferrer.from_dict(definition_dict['transferrer'])
+
+        definition.algorithms = _keyed((
+            cls.Algorithm.from_dict(result, algorithm) for result, algorithm in definition_dict['algorithms'].items()
+        ), 'result')
+        definition.parameters = _keyed((
+            cls.Parameter.from_tuple(name, param) for name, param in definition_dict['parameters'].items()
+        ), 'name')
+
+        if definition_dict['numerical_model'] is not None:
+            definition.numerical_model = cls.NumericalModel.from_dict(definition_dict['numerical_model'])
+
+        return definition
+
     def set_numerical_model(self, definition, family, regions, needles):
         self.numerical_model = self.NumericalModel(definition, family, regions, needles)
+        self._fingerprint = None
 
     def get_parameter_value(self, key, try_json=True):
         if key not in self.parameters:
@@ -373,64 +792,187 @@ class SimulationDefinition:
     def get_regions(self):
         return self.numerical_model.get_regions()
 
-    def diff(self, other):
+    def diff_records(self, other, tolerances=None, stats=NO_STATS, sections=None, executor=None):
+        """Produce a series of DiffRecords describing the non-equivalences
+        between this and another ("that") definition, in no particular order.
+
+        Tolerances, if given, map parameter names (including needle
+        parameters) or types, such as "float" or "array(float)", to an
+        (absolute, relative) pair; numeric values within tolerance are not
+        reported. A ComparisonStats, if given, collects the time spent on
+        the needle cost matrix and assignment. If sections are given (see
+        select_sections), only those are compared. With an executor (such
+        as threads.shared_executor()), the sections are compared
+        concurrently, giving the same records in the same order.
+
+        """
+        sections = select_sections(sections)
+        selected = [
+            (section, attribute) for section, attribute in self.SECTIONS
+            if self.SECTION_TAGS[section] in sections
+        ]
+
+        if executor is None:
+            for section, attribute in selected:
+                yield from self.section_records(other, section, attribute, tolerances, stats, sections)
+            return
+
+        # Sections are independent, so each is compared as a separate task,
+        # but their records are still given in section order
+        futures = [
+            executor.submit(list, self.section_records(other, section, attribute, tolerances, stats, sections))
+            for section, attribute in selected
+        ]
+        for future in futures:
+            yield from future.result()
+
+    def section_records(self, other, section, attribute, tolerances=None, stats=NO_STATS, sections=None):
+        """Records for one of the SECTIONS, by name and attribute."""
+        # We check whether the relevant component is present in one or both
+        # definitions, then request a diff for it
+        missing = self.missing_section_record(other, section)
+        if missing is not None:
+            yield missing
+        elif not getattr(self, attribute):
+            return
+        elif section == "transferrer":
+            yield from self.transferrer.diff_records(other.transferrer)
+        elif section == "numerical model":
+            yield from self.numerical_model.diff_records(other.numerical_model, tolerances, stats, sections)
+        else:
+            # For comparing algorithms and parameters, we first check the
+            # keys match, then compare them entity-wise
+            kind = section[:-1]
+            all_keys = set().union(getattr(self, attribute).keys(), getattr(other, attribute).keys())
+            for key in all_keys:
+                yield from self.entity_records(other, kind, key, tolerances)
+
+    def missing_section_record(self, other, section):
+        """Return a record if a section (as named in SECTIONS) is present in
+        only one of the definitions, otherwise None. A missing section is
+        recorded against the name of the definition lacking it."""
+        attribute = dict(self.SECTIONS)[section]
+        this = getattr(self, attribute)
+        that = getattr(other, attribute)
+
+        if this and not that:
+            return DiffRecord("Definition", other.name, section, this, MISSING)
+        elif that and not this:
+            return DiffRecord("Definition", self.name, section, MISSING, that)
+
+        return None
+
+    def entity_records(self, other, kind, key, tolerances=None):
+        """Records for a single "algorithm" or "parameter", by key, where both
+        definitions have that section."""
+        these = self.algorithms if kind == "algorithm" else self.parameters
+        those = other.algorithms if kind == "algorithm" else other.parameters
+
+        if key not in these:
+            yield DiffRecord("Definition", self.name, kind, MISSING, key)
+        elif key not in those:
+            yield DiffRecord("Definition", other.name, kind, key, MISSING)
+        elif kind == "algorithm":
+            yield from these[key].diff_records(those[key])
+        else:
+            yield from these[key].diff_records(those[key], tolerances)
+
+    def diff(self, other, tolerances=None, sections=None, executor=None):
         """Produce a series of human-readable messages describing the
         non-equivalences between this and another ("that") definition."""
-        messages = []
+        # Messages are sorted for readability
+        return format_records(self.diff_records(other, tolerances, sections=sections, executor=executor))
 
-        # At each step we check whether the relevant component is present in one
-        # or both definitions, then request a diff for it
+    def diff_state(self, other, tolerances=None):
+        """Compare with another definition, keeping the result as a DiffState
+        that can be updated when only some entities change."""
+        return DiffState(self, other, tolerances)
 
-        if self.transferrer or other.transferrer:
-            if not self.transferrer:
-                messages += ["%s definition has no transferrer" % self.name]
-            elif not other.transferrer:
-                messages += ["%s other definition has no transferrer" % other.name]
-            else:
-                messages += self.transferrer.diff(other.transferrer)
+    def three_way(self, left, right, tolerances=None):
+        """Compare two edited copies (left and right) of this definition
+        against it at once, classifying each change as made on the left, the
+        right, both or in conflict (see ThreeWayDiff)."""
+        return ThreeWayDiff(self, left, right, tolerances)
 
-        if self.algorithms or other.algorithms:
-            if not self.algorithms:
-                messages += ["%s definition has no algorithms" % other.name]
-            elif not other.algorithms:
-                messages += ["%s definition has no algorithms" % other.name]
-            else:
-                all_algorithms = set().union(self.algorithms.keys(), other.algorithms.keys())
-                for name in all_algorithms:
-                    if name not in self.algorithms:
-                        messages += ["%s definition has no algorithm '%s'" % (self.name, name)]
-                    elif name not in other.algorithms:
-                        messages += ["%s definition has no algorithm '%s'" % (other.name, name)]
-                    else:
-                        messages += self.algorithms[name].diff(other.algorithms[name])
-
-        if self.parameters or other.parameters:
-            if not self.parameters:
-                messages += ["%s definition has no parameters" % self.name]
-            elif not other.parameters:
-                messages += ["%s definition has no parameters" % other.name]
-            else:
-                # For comparing parameters, we first check the keys match, then
-                # compare type/value-wise
-                all_parameters = set().union(self.parameters.keys(), other.parameters.keys())
-                for name in all_parameters:
-                    if name not in self.parameters:
-                        messages += ["%s definition has no parameter '%s'" % (self.name, name)]
-                    elif name not in other.parameters:
-                        messages += ["%s definition has no parameter '%s'" % (other.name, name)]
-                    else:
-                        messages += self.parameters[name].diff(other.parameters[name])
-
-        if self.numerical_model or other.numerical_model:
-            if not self.numerical_model:
-                messages += ["%s definition has no numerical model" % self.name]
-            elif not other.numerical_model:
-                messages += ["%s definition has no numerical model" % other.name]
-            else:
-                messages += self.numerical_model.diff(other.numerical_model)
+    def fingerprint(self):
+        """Canonical hash of this definition.
 
-        # Messages are sorted for readability
-        return sorted(messages)
+        Two definitions have the same fingerprint exactly when diff finds no
+        differences between them, so fingerprints may be compared (or used as
+        dictionary keys) instead of running a full diff. The definition's own
+        name is a label and does not contribute. The fingerprint is cached, so
+        after editing entities in place, call invalidate().
+
+        """
+        if self._fingerprint is None:
+            def section(entities):
+                return tuple(sorted(e.fingerprint() for e in entities.values())) if entities else None
+
+            self._fingerprint = _digest(
+                'simulation definition',
+                self.transferrer.fingerprint() if self.transferrer else None,
+                section(self.algorithms),
+                section(self.parameters),
+                self.numerical_model.fingerprint() if self.numerical_model else None
+            )
+
+        return self._fingerprint
+
+    def invalidate(self):
+        """Drop the cached fingerprint, after entities were edited in place."""
+        self._fingerprint = None
+
+    def matches(self, other, tolerances=None, sections=None):
+        """Short-circuiting equivalent of diff(other, tolerances, sections) == [].
+
+        Returns as soon as any difference is found, checking the cheapest
+        discriminators (section presence, counts, key sets, raw strings)
+        before any per-entity comparison. The needle assignment solver is
+        never run without tolerances.
+
+        """
+        sections = select_sections(sections)
+        with_transferrer = "transferrer" in sections
+        with_algorithms = "algorithms" in sections
+        with_parameters = "parameters" in sections
+        with_model = "numericalModel" in sections
+
+        # Sections present on one side only (empty is treated as absent, as
+        # in diff)
+        if with_transferrer and (self.transferrer is None) != (other.transferrer is None):
+            return False
+        if with_algorithms and bool(self.algorithms) != bool(other.algorithms):
+            return False
+        if with_parameters and bool(self.parameters) != bool(other.parameters):
+            return False
+        if with_model and (self.numerical_model is None) != (other.numerical_model is None):
+            return False
+
+        if with_parameters and (len(self.parameters) != len(other.parameters) or self.parameters.keys() != other.parameters.keys()):
+            return False
+        if with_algorithms and (len(self.algorithms) != len(other.algorithms) or self.algorithms.keys() != other.algorithms.keys()):
+            return False
+
+        if with_transferrer and self.transferrer is not None and not self.transferrer.matches(other.transferrer):
+            return False
+
+        if with_parameters:
+            for name, parameter in self.parameters.items():
+                if not parameter.matches(other.parameters[name], tolerances):
+                    return False
+
+        if with_algorithms:
+            for name, algorithm in self.algorithms.items():
+                if not algorithm.matches(other.algorithms[name]):
+                    return False
+
+        if with_model and self.numerical_model is not None:
+            return self.numerical_model.matches(other.numerical_model, tolerances, sections)
+
+        return True
 
     def __eq__(self, other):
-        return self.diff(other) == []
+        return self.matches(other)
+
+    def __hash__(self):
+        return hash(self.fingerprint())
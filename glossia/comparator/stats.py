@@ -0,0 +1,94 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import threading
+import time
+
+
+# This class collects where the time goes in a comparison, for profiling
+class ComparisonStats:
+    """Wall time per phase and counts of entities, accumulated over one or
+    more comparisons.
+
+    Phases are named stages such as "parse", "build", "needle costs",
+    "assignment", "compare", "definition diff" and "format"; counts include
+    "parameters", "needles", "matrix cells", "records", "messages" and "memo
+    hits". If a callback is given, it is called as callback(kind, name,
+    value) whenever a phase ends (kind "phase", value in seconds) or a count
+    is added (kind "count"). Phases and counts may be recorded from several
+    threads at once.
+
+    """
+    callback = None
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.timings = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            if self.callback is not None:
+                self.callback("phase", name, elapsed)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+        if self.callback is not None:
+            self.callback("count", name, value)
+
+    def as_dict(self):
+        return {'timings': dict(self.timings), 'counts': dict(self.counts)}
+
+    def report(self):
+        """Human-readable breakdown, one line per phase or count."""
+        lines = ["%-20s %10.3f ms" % (name, seconds * 1000) for name, seconds in self.timings.items()]
+        lines += ["%-20s %10d" % (name, value) for name, value in self.counts.items()]
+        return lines
+
+
+# Stand-in used when no statistics are being collected, so that instrumented
+# code need not check
+class _NoStats:
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+    def count(self, name, value=1):
+        pass
+
+
+NO_STATS = _NoStats()
+
+
+def collector(stats):
+    """Accept a ComparisonStats, a bare callback (wrapped in a new
+    ComparisonStats) or None (collect nothing)."""
+    if stats is None:
+        return NO_STATS
+    elif callable(stats):
+        return ComparisonStats(stats)
+    return stats
@@ -0,0 +1,204 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from lxml import etree as ET
+import copy
+import json
+import random
+
+# Parameter types are cycled through in this order
+_TYPES = ("float", "integer", "array(float)", "string")
+
+
+def _random_value(rng, typ):
+    if typ == "float":
+        return repr(round(rng.uniform(0, 100), 3))
+    elif typ == "integer":
+        return str(rng.randrange(1000))
+    elif typ == "array(float)":
+        return json.dumps([round(rng.uniform(-10, 10), 3) for _ in range(3)])
+    return "value-%d" % rng.randrange(1000)
+
+
+def _changed_value(value, typ):
+    # Always different from the original, whatever it was
+    if typ == "float":
+        return repr(float(value) + 1.5)
+    elif typ == "integer":
+        return str(int(value) + 1)
+    elif typ == "array(float)":
+        array = json.loads(value)
+        array[0] += 1.5
+        return json.dumps(array)
+    return value + "-changed"
+
+
+# This class produces GSSA-XML documents of a chosen size, and pairs of them
+# differing in a controlled way, for tests and benchmarks
+class DocumentGenerator:
+    """Generator of synthetic GSSA-XML.
+
+    Each knob sets the size of one part of the document: the number of
+    (global) parameters, needles, parameters per needle, regions, groups per
+    region, algorithms and lines of numerical model definition. The same seed
+    always gives the same document.
+
+    pair() gives a second document derived from the first by a known number
+    of changes, each of which produces exactly one diff message (reordering
+    needles produces none), so the expected size of the diff is known.
+
+    """
+    parameters = 10
+    needles = 2
+    needle_parameters = 3
+    regions = 2
+    region_groups = 1
+    algorithms = 1
+    definition_lines = 5
+    seed = 0
+
+    def __init__(self, **knobs):
+        for knob, value in knobs.items():
+            if knob.startswith('_') or not hasattr(DocumentGenerator, knob) or callable(getattr(DocumentGenerator, knob)):
+                raise RuntimeError("Unknown generator knob: %s" % knob)
+            setattr(self, knob, value)
+
+    def model(self):
+        """Plain description of the document, as nested lists, which
+        render() turns into GSSA-XML."""
+        rng = random.Random(self.seed)
+
+        parameters = []
+        for i in range(self.parameters):
+            typ = _TYPES[i % len(_TYPES)]
+            parameters.append(["PARAMETER_%d" % i, _random_value(rng, typ), typ])
+
+        needles = []
+        for i in range(self.needles):
+            # Tip locations are unique, so needles are always told apart
+            needle_parameters = [["NEEDLE_TIP_LOCATION", json.dumps([float(i), 0.5, 1.25]), "array(float)"]]
+            for j in range(1, self.needle_parameters):
+                typ = _TYPES[j % len(_TYPES)]
+                needle_parameters.append(["NEEDLE_PARAMETER_%d" % j, _random_value(rng, typ), typ])
+            needles.append([str(i), rng.choice(["solid-boundary", "boundary"]), "library:cryo", needle_parameters])
+
+        regions = [
+            ["region-%d" % i, "organ", "surface", "region-%d.vtp" % i, ["group-%d" % j for j in range(self.region_groups)]]
+            for i in range(self.regions)
+        ]
+
+        algorithms = [
+            ["ALGORITHM_%d" % i, ["Time"], "Time * %d" % (i + 1)]
+            for i in range(self.algorithms)
+        ]
+
+        definition = "\n".join("Line %d of the definition" % i for i in range(self.definition_lines))
+
+        return {
+            'transferrer': ["http", "http://example.com"],
+            'algorithms': algorithms,
+            'parameters': parameters,
+            'needles': needles,
+            'regions': regions,
+            'definition': definition,
+            'family': "elmer-libnuma"
+        }
+
+    def document(self):
+        return self.render(self.model())
+
+    def pair(self, changed_parameters=0, removed_parameters=0, added_parameters=0,
+             changed_needle_parameters=0, changed_groups=0, changed_definition=False,
+             reordered_needles=False):
+        """Return (left, right) documents, the right having the given number
+        of changes applied."""
+        left = self.model()
+        right = copy.deepcopy(left)
+        rng = random.Random(self.seed + 1)
+
+        parameters = right['parameters']
+        if changed_parameters + removed_parameters > len(parameters):
+            raise RuntimeError("Not enough parameters to change or remove")
+
+        chosen = rng.sample(range(len(parameters)), changed_parameters + removed_parameters)
+        for i in chosen[:changed_parameters]:
+            parameters[i][1] = _changed_value(parameters[i][1], parameters[i][2])
+        for i in sorted(chosen[changed_parameters:], reverse=True):
+            del parameters[i]
+        for i in range(added_parameters):
+            parameters.append(["ADDED_PARAMETER_%d" % i, "1.0", "float"])
+
+        slots = [(n, p) for n in range(len(right['needles'])) for p in range(len(right['needles'][n][3]))]
+        if changed_needle_parameters > len(slots):
+            raise RuntimeError("Not enough needle parameters to change")
+        for n, p in rng.sample(slots, changed_needle_parameters):
+            parameter = right['needles'][n][3][p]
+            parameter[1] = _changed_value(parameter[1], parameter[2])
+
+        for i in range(changed_groups):
+            right['regions'][i % len(right['regions'])][4].append("added-group-%d" % i)
+
+        if changed_definition:
+            right['definition'] += "\nAn added line"
+
+        if reordered_needles:
+            rng.shuffle(right['needles'])
+            for i, needle in enumerate(right['needles']):
+                needle[0] = str(1000 + i)
+
+        return self.render(left), self.render(right)
+
+    @staticmethod
+    def render(model):
+        root = ET.Element("simulationDefinition")
+
+        cls, url = model['transferrer']
+        transferrer = ET.SubElement(root, "transferrer", {"class": cls})
+        ET.SubElement(transferrer, "url").text = url
+
+        if model['algorithms']:
+            algorithms = ET.SubElement(root, "algorithms")
+            for result, arguments, content in model['algorithms']:
+                algorithm = ET.SubElement(algorithms, "algorithm", {"result": result})
+                argument_nodes = ET.SubElement(algorithm, "arguments")
+                for argument in arguments:
+                    ET.SubElement(argument_nodes, "argument", {"name": argument})
+                ET.SubElement(algorithm, "content").text = content
+
+        if model['parameters']:
+            parameters = ET.SubElement(root, "parameters")
+            for name, value, typ in model['parameters']:
+                ET.SubElement(parameters, "parameter", {"name": name, "value": value, "type": typ})
+
+        numerical_model = ET.SubElement(root, "numericalModel")
+        needles = ET.SubElement(numerical_model, "needles")
+        for index, cls, file, needle_parameters in model['needles']:
+            needle = ET.SubElement(needles, "needle", {"index": index, "class": cls, "file": file})
+            parameters = ET.SubElement(needle, "parameters")
+            for name, value, typ in needle_parameters:
+                ET.SubElement(parameters, "parameter", {"name": name, "value": value, "type": typ})
+
+        regions = ET.SubElement(numerical_model, "regions")
+        for id, name, format, input, groups in model['regions']:
+            ET.SubElement(regions, "region", {
+                "id": id, "name": name, "format": format, "input": input, "groups": json.dumps(groups)
+            })
+
+        ET.SubElement(numerical_model, "definition", {"family": model['family']}).text = model['definition']
+
+        return ET.tostring(root, xml_declaration=True, encoding="UTF-8", pretty_print=True)
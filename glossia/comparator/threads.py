@@ -0,0 +1,42 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+# Threads in the pool shared by parallel comparisons. There are only two
+# sides and a handful of sections to work on at once, so few are needed
+POOL_SIZE = 4
+
+_executor = None
+_lock = threading.Lock()
+
+
+def shared_executor():
+    """Return the thread pool shared by all parallel comparisons, starting
+    it on first use.
+
+    Work run on the pool must not itself wait on work submitted to it, or the
+    pool may deadlock once its threads are all waiting.
+
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(POOL_SIZE, thread_name_prefix="glossia-comparator")
+    return _executor
@@ -0,0 +1,289 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from .diff_record import DiffRecord, MISSING
+from .parameters import values_equal
+
+# How a change from the base is classified: made on one side only, made
+# identically on both, or made differently on each
+LEFT = "left"
+RIGHT = "right"
+BOTH = "both"
+CONFLICT = "conflict"
+
+
+def _whole_entity(record):
+    # Adding or removing a whole section, parameter, algorithm or region
+    # conflicts with any other change to it
+    return record.section in ("Definition", "Numerical Model") and record.is_missing()
+
+
+def _subject(record):
+    """What a record is about within its entity, so that the same change can
+    be recognised in both comparisons (whose records may name entities from
+    different definitions)."""
+    if record.section == "Parameter":
+        return ("parameter", record.entity)
+    if record.is_missing():
+        return (record.field, record.right if record.left is MISSING else record.left)
+    return (record.section, record.field)
+
+
+def _same(these, those):
+    # Whether both sides made the same change, i.e. their records from the
+    # base agree on everything except the (side-specific) entity names
+    if len(these) != len(those):
+        return False
+
+    remaining = list(those)
+    for record in these:
+        for position, other in enumerate(remaining):
+            if (
+                record.section == other.section and
+                record.field == other.field and
+                values_equal(record.left, other.left) and
+                values_equal(record.right, other.right)
+            ):
+                del remaining[position]
+                break
+        else:
+            return False
+
+    return True
+
+
+# A single change from the base, made on either or both sides
+class ThreeWayChange:
+    """A change from the base definition, at one location.
+
+    The location is a (kind, key) pair, as for DiffState changes (e.g.
+    ("parameter", "BANANA") or ("needle", "12388"), needles being keyed by
+    their index in the base), or ("section", name) for a whole section added
+    or removed on either side. The left and right lists hold the DiffRecords
+    comparing the base with that side.
+
+    """
+    __slots__ = ('kind', 'location', 'left', 'right')
+
+    def __init__(self, kind, location, left, right):
+        self.kind = kind
+        self.location = location
+        self.left = left
+        self.right = right
+
+    def format(self, definition_diff=None):
+        left = "; ".join(record.format(definition_diff) for record in self.left)
+        right = "; ".join(record.format(definition_diff) for record in self.right)
+
+        if self.kind == CONFLICT:
+            return "conflict: %s // %s" % (left, right)
+        return "%s: %s" % (self.kind, right if self.kind == RIGHT else left)
+
+    def __str__(self):
+        return self.format()
+
+    def __repr__(self):
+        return 'ThreeWayChange(%r, %r, %r, %r)' % (self.kind, self.location, self.left, self.right)
+
+
+# This class compares both edited definitions against their common base at
+# once, rather than running and reconciling two separate diffs
+class ThreeWayDiff:
+    """The changes made to a base SimulationDefinition on each of two sides.
+
+    All three definitions are walked together, section by section and entity
+    by entity, and each change is classified as LEFT, RIGHT, BOTH (made
+    identically on each side) or CONFLICT. Within a needle, region or
+    algorithm, changes to different fields (or needle parameters) are
+    classified separately, so edits to different parts of one entity do not
+    conflict; adding or removing a whole entity conflicts with any change to
+    it on the other side, and entities (or needles) added on both sides
+    conflict unless the additions are the same. Needles are matched to the
+    base through a single cost matrix against both sides' needles, so the
+    base needles are only encoded once.
+
+    """
+
+    def __init__(self, base, left, right, tolerances=None):
+        self.base = base
+        self.left = left
+        self.right = right
+        self.tolerances = tolerances
+
+        self.changes = []
+        for location, these, those, diverged in self._walk():
+            self.changes.extend(self._classify(location, these, those, diverged))
+
+    def conflicts(self):
+        return [change for change in self.changes if change.kind == CONFLICT]
+
+    def of_kind(self, kind):
+        return [change for change in self.changes if change.kind == kind]
+
+    def format(self, definition_diff=None):
+        return [change.format(definition_diff) for change in self.changes]
+
+    def _walk(self):
+        """Generate (location, left records, right records, diverged) for
+        every location where either side differs from the base, diverged
+        being whether both sides added something there, but not the same."""
+        base, left, right = self.base, self.left, self.right
+
+        for name, attribute in base.SECTIONS:
+            left_missing = base.missing_section_record(left, name)
+            right_missing = base.missing_section_record(right, name)
+
+            if left_missing or right_missing:
+                # A section added or removed on either side is a single
+                # change, so conflicts with any change within it
+                sections = [base.SECTION_TAGS[name]]
+                these = [left_missing] if left_missing else list(base.diff_records(left, self.tolerances, sections=sections))
+                those = [right_missing] if right_missing else list(base.diff_records(right, self.tolerances, sections=sections))
+                if these or those:
+                    yield ("section", name), these, those, False
+            elif not getattr(base, attribute):
+                continue
+            elif name == "transferrer":
+                yield self._location(("transferrer", None), lambda this, other: this.transferrer.diff_records(other.transferrer))
+            elif name == "numerical model":
+                yield from self._walk_model()
+            else:
+                kind = name[:-1]
+                keys = set().union(getattr(base, attribute), getattr(left, attribute), getattr(right, attribute))
+                for key in sorted(keys, key=str):
+                    yield self._location(
+                        (kind, key),
+                        lambda this, other: this.entity_records(other, kind, key, self.tolerances),
+                        lambda definition: key in getattr(definition, attribute)
+                    )
+
+    def _location(self, location, compare, present=None):
+        # Where a key is given, a side only has records for it if the key is
+        # in the base or on that side (it may be added on the other alone);
+        # if added on both, the additions themselves are compared
+        base, left, right = self.base, self.left, self.right
+        added = present is not None and not present(base)
+
+        def side(other):
+            if added and not present(other):
+                return []
+            return list(compare(base, other))
+
+        diverged = added and present(left) and present(right) and any(True for _ in compare(left, right))
+        return location, side(left), side(right), diverged
+
+    def _walk_model(self):
+        base = self.base.numerical_model
+        left = self.left.numerical_model
+        right = self.right.numerical_model
+
+        yield self._location(
+            ("definition", None),
+            lambda this, other: this.numerical_model.definition_records(other.numerical_model)
+        )
+
+        ids = set().union(base.regions, left.regions, right.regions)
+        for id in sorted(ids, key=str):
+            yield self._location(
+                ("region", id),
+                lambda this, other: this.numerical_model.region_records(other.numerical_model, id),
+                lambda definition: id in definition.numerical_model.regions
+            )
+
+        left_pairs, right_pairs = self._assign_needles(base, left, right)
+
+        # Needles matched to none in the base were added, and those added on
+        # both sides must be the same needles for the count change to agree
+        location, these, those, _ = self._location(
+            ("needle count", None),
+            lambda this, other: self._needle_count_records(this.numerical_model, other.numerical_model)
+        )
+        left_added = self._unmatched(base, left, left_pairs)
+        right_added = self._unmatched(base, right, right_pairs)
+        diverged = bool(
+            left_added.needles and right_added.needles and
+            not left_added.matches(right_added, self.tolerances, sections=["needles"])
+        )
+        yield location, these, those, diverged
+
+        for index in base.needles:
+            these = list(base.needles[index].diff_records(left.needles[left_pairs[index]], self.tolerances)) if index in left_pairs else []
+            those = list(base.needles[index].diff_records(right.needles[right_pairs[index]], self.tolerances)) if index in right_pairs else []
+            yield ("needle", index), these, those, False
+
+    @staticmethod
+    def _unmatched(base, side, pairs):
+        # A model holding only the needles of one side not matched to the base
+        unmatched = type(base)(None, '', [], [])
+        matched = set(pairs.values())
+        unmatched.needles = {key: needle for key, needle in side.needles.items() if key not in matched}
+        return unmatched
+
+    @staticmethod
+    def _needle_count_records(base, other):
+        if len(base.needles) != len(other.needles):
+            yield DiffRecord("Numerical Model", None, "needle count", len(base.needles), len(other.needles))
+
+    def _assign_needles(self, base, left, right):
+        """Match base needles to each side's, giving dictionaries of base
+        index to the matched index on the left and on the right."""
+        base_keys = list(base.needles.keys())
+        left_keys = list(left.needles.keys())
+        right_keys = list(right.needles.keys())
+        if not base_keys or not (left_keys or right_keys):
+            return {}, {}
+
+        # Both sides' needles are costed against the base in one matrix
+        both = type(base)(None, '', [], [])
+        both.needles = {}
+        both.needles.update(((LEFT, key), left.needles[key]) for key in left_keys)
+        both.needles.update(((RIGHT, key), right.needles[key]) for key in right_keys)
+        costs = base.needle_costs(both, base_keys, list(both.needles.keys()), self.tolerances)
+
+        pairs = []
+        for keys, columns in ((left_keys, costs[:, :len(left_keys)]), (right_keys, costs[:, len(left_keys):])):
+            if keys:
+                pairs.append({base_keys[row]: keys[column] for row, column in base.assign_needles(columns)})
+            else:
+                pairs.append({})
+
+        return pairs
+
+    @staticmethod
+    def _classify(location, these, those, diverged=False):
+        if not these and not those:
+            return
+
+        if diverged or any(_whole_entity(record) for record in these + those):
+            groups = {None: (these, those)}
+        else:
+            groups = {}
+            for side, records in enumerate((these, those)):
+                for record in records:
+                    groups.setdefault(_subject(record), ([], []))[side].append(record)
+
+        for left, right in groups.values():
+            if not right:
+                kind = LEFT
+            elif not left:
+                kind = RIGHT
+            elif not diverged and _same(left, right):
+                kind = BOTH
+            else:
+                kind = CONFLICT
+            yield ThreeWayChange(kind, location, left, right)
@@ -0,0 +1,105 @@
+# This file is part of the Go-Smart Simulation Architecture (GSSA).
+# Go-Smart is an EU-FP7 project, funded by the European Commission.
+#
+# Copyright (C) 2013-  NUMA Engineering Ltd. (see AUTHORS file)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from lxml import etree as ET
+import multiprocessing
+import os
+import sys
+
+# Where gssa.xsd is looked for, if no path is given: the source tree, then the
+# installed data files
+SCHEMA_PATHS = (
+    os.path.join(os.path.dirname(__file__), '..', '..', 'schema', 'gssa.xsd'),
+    os.path.join(sys.prefix, 'share', 'glossia', 'schema', 'gssa.xsd'),
+)
+
+# Compiled schemas, by path, so that each is compiled once per process
+_schemas = {}
+
+
+def schema(path=None):
+    """Return the compiled GSSA-XML schema (from path, or the default
+    location), compiling it only on first use."""
+    if path is None:
+        for candidate in SCHEMA_PATHS:
+            if os.path.exists(candidate):
+                path = candidate
+                break
+        else:
+            raise RuntimeError("Could not find gssa.xsd (looked in %s)" % ", ".join(SCHEMA_PATHS))
+
+    path = os.path.abspath(path)
+    if path not in _schemas:
+        _schemas[path] = ET.XMLSchema(ET.parse(path))
+    return _schemas[path]
+
+
+def validation_errors(root, schema_path=None):
+    """List every schema violation in a parsed GSSA-XML tree (or element),
+    as "line N: message" strings. An empty list means the tree is valid."""
+    compiled = schema(schema_path)
+    if compiled.validate(root):
+        return []
+    return ["line %d: %s" % (error.line, error.message) for error in compiled.error_log]
+
+
+def validate_document(document, schema_path=None):
+    """As validation_errors, for a GSSA-XML document as text or bytes. A
+    document that is not well-formed gives a single error."""
+    if isinstance(document, str):
+        document = document.encode('utf-8')
+
+    try:
+        root = ET.fromstring(document)
+    except ET.XMLSyntaxError as e:
+        return ["line %d: %s" % (e.lineno or 0, e.msg)]
+
+    return validation_errors(root, schema_path)
+
+
+def validate_file(path, schema_path=None):
+    """As validate_document, for a GSSA-XML file."""
+    try:
+        root = ET.parse(path).getroot()
+    except ET.XMLSyntaxError as e:
+        return ["line %d: %s" % (e.lineno or 0, e.msg)]
+    except OSError as e:
+        return [str(e)]
+
+    return validation_errors(root, schema_path)
+
+
+def validate_files(paths, processes=None, schema_path=None, chunk_size=8):
+    """Validate many GSSA-XML files, in parallel across a pool of worker
+    processes (each compiling the schema once), returning a dictionary of
+    path to the list of errors found (empty for valid files)."""
+    # The schema is found (and checked) before any workers start
+    schema(schema_path)
+
+    paths = list(paths)
+    jobs = [(path, schema_path) for path in paths]
+    if processes == 1 or len(paths) <= 1:
+        return dict(zip(paths, map(_validate_job, jobs)))
+
+    with multiprocessing.Pool(processes) as pool:
+        return dict(zip(paths, pool.map(_validate_job, jobs, chunk_size)))
+
+
+def _validate_job(job):
+    path, schema_path = job
+    return validate_file(path, schema_path)
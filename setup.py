@@ -11,7 +11,12 @@ setup(name='glossia.comparator',
 
       install_requires=[
         'lxml',
-        'munkres'
+        'munkres',
+        'numpy'
+      ],
+
+      data_files=[
+          ('share/glossia/schema', ['schema/gssa.xsd']),
       ],
 
       scripts=[
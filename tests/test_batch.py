@@ -0,0 +1,94 @@
+from glossia.comparator import BatchComparator, compare_one_to_many, compare_many_to_many
+from glossia.comparator.batch import compare_files, directory_pairs, manifest_pairs
+from glossia.comparator.definition_diff import DefinitionDiff
+from glossia.comparator.synthetic import DocumentGenerator
+import os
+
+
+def _document(banana):
+    return """
+      <simulationDefinition>
+        <parameters>
+          <parameter name="BANANA" value="%s" type="float"/>
+        </parameters>
+      </simulationDefinition>
+    """ % banana
+
+
+def test_batch_one_to_many():
+    results = compare_one_to_many(_document("5.0"), {'same': _document("5.00"), 'other': _document("6")}, processes=1)
+    assert results == {
+        'same': [],
+        'other': ["Parameter BANANA: values differ - 5.0 // 6.0"]
+    }
+
+
+def test_batch_many_to_many_pool():
+    left = [_document(str(v)) for v in range(4)]
+    right = [_document(str(v)) for v in range(3)]
+    comparator = BatchComparator(left, right, processes=2, chunk_size=2)
+    results = comparator.diff()
+    assert set(results) == set((i, j) for i in range(4) for j in range(3))
+    for (i, j), messages in results.items():
+        assert (messages == []) == (i == j)
+    assert comparator.equal() == {pair: (pair[0] == pair[1]) for pair in results}
+    assert compare_many_to_many(left, right, processes=1) == results
+
+
+def _write_pairs(directory, perturbations):
+    for name, perturbation in perturbations.items():
+        left, right = DocumentGenerator(seed=len(name)).pair(**perturbation)
+        (directory / "left" / name).write_bytes(left)
+        (directory / "right" / name).write_bytes(right)
+
+
+def test_batch_directories_and_manifest(tmp_path):
+    (tmp_path / "left").mkdir()
+    (tmp_path / "right").mkdir()
+    _write_pairs(tmp_path, {"same.xml": {}, "other.xml": {"changed_parameters": 2}})
+    (tmp_path / "left" / "lonely.xml").write_bytes(b"<simulationDefinition/>")
+
+    pairs = directory_pairs(str(tmp_path / "left"), str(tmp_path / "right"))
+    assert [os.path.basename(left or right) for left, right in pairs] == ["lonely.xml", "other.xml", "same.xml"]
+
+    for processes in (1, 2):
+        results = list(compare_files(pairs, processes=processes, chunk_size=1))
+        assert "error" in results[0]
+        assert not results[1]["equal"] and len(results[1]["messages"]) == 2
+        assert results[2]["equal"] and results[2]["messages"] == []
+
+    manifest = tmp_path / "pairs.tsv"
+    manifest.write_text("# left\tright\n\nleft/same.xml\tright/same.xml\n")
+    assert manifest_pairs(str(manifest)) == [(str(tmp_path / "left" / "same.xml"), str(tmp_path / "right" / "same.xml"))]
+
+
+def test_batch_bad_pair_does_not_stop_sweep(tmp_path):
+    (tmp_path / "left").mkdir()
+    (tmp_path / "right").mkdir()
+    _write_pairs(tmp_path, {"bad.xml": {}, "good.xml": {}})
+    bad = tmp_path / "left" / "bad.xml"
+    bad.write_bytes(bad.read_bytes().replace(b'groups="', b'groups="not json', 1))
+
+    pairs = directory_pairs(str(tmp_path / "left"), str(tmp_path / "right"))
+    for processes in (1, 2):
+        results = list(compare_files(pairs, processes=processes, chunk_size=1))
+        assert "Could not read region groups" in results[0]["error"]
+        assert results[1]["equal"]
+
+
+def test_batch_definition_diff(tmp_path):
+    (tmp_path / "left").mkdir()
+    (tmp_path / "right").mkdir()
+    _write_pairs(tmp_path, {"model.xml": {"changed_definition": True}})
+    pairs = directory_pairs(str(tmp_path / "left"), str(tmp_path / "right"))
+    ranges_only = DefinitionDiff(ranges_only=True)
+
+    for processes in (1, 2):
+        results = list(compare_files(pairs * 2, processes=processes, definition_diff=ranges_only, parallel=True))
+        for result in results:
+            assert result["messages"][0].startswith("Numerical Model: definitions differ at lines")
+
+    left = (tmp_path / "left" / "model.xml").read_bytes()
+    right = (tmp_path / "right" / "model.xml").read_bytes()
+    messages = compare_one_to_many(left, [right], processes=1, definition_diff=ranges_only)[0]
+    assert messages[0].startswith("Numerical Model: definitions differ at lines")
@@ -0,0 +1,40 @@
+from glossia.comparator import Comparator, DefinitionCache
+
+
+def _document(banana):
+    return """
+      <simulationDefinition>
+        <parameters>
+          <parameter name="BANANA" value="%s" type="float"/>
+        </parameters>
+      </simulationDefinition>
+    """ % banana
+
+
+def test_cache_hits_misses_evictions():
+    cache = DefinitionCache(max_entries=2)
+    assert Comparator(_document("5.0"), _document("5.0"), cache=cache).equal()
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'disk_hits': 0, 'misses': 1, 'evictions': 0}
+
+    comparator = Comparator(_document("5.0"), _document("6.0"), cache=cache)
+    assert comparator.diff() == ["Parameter BANANA: values differ - 5.0 // 6.0"]
+    Comparator(_document("5.0"), _document("7.0"), cache=cache)
+    assert cache.stats() == {'entries': 2, 'hits': 3, 'disk_hits': 0, 'misses': 3, 'evictions': 1}
+
+
+def test_cache_relabels_shared_definitions():
+    cache = DefinitionCache()
+    left = cache.get(_document("5.0"), "Left")
+    right = cache.get(_document("5.0"), "Right")
+    assert (left.name, right.name) == ("Left", "Right")
+    assert left.parameters is right.parameters
+
+
+def test_cache_disk_tier_survives_restart(tmp_path):
+    DefinitionCache(directory=str(tmp_path)).get(_document("5.0"))
+
+    cache = DefinitionCache(directory=str(tmp_path))
+    definition = cache.get(_document("5.0"), "Left")
+    assert cache.stats()['disk_hits'] == 1
+    assert cache.stats()['misses'] == 0
+    assert definition.get_parameter_value("BANANA") == 5.0
@@ -0,0 +1,56 @@
+from glossia.comparator.columnar import ParameterStore, NEEDLE_PREFIX
+from glossia.comparator.simulation_definition import SimulationDefinition
+import pytest
+
+
+def _definition(temperatures, banana, tip="[0, 0, 0]"):
+    definition = SimulationDefinition("Definition")
+    definition.add_parameter("BANANA", banana, "float")
+    definition.set_numerical_model("", "", [], [
+        (str(index), "boundary", "a", [
+            ("NEEDLE_TEMPERATURE", str(temperature), "float"),
+            ("NEEDLE_TIP_LOCATION", tip, "array(float)")
+        ])
+        for index, temperature in enumerate(temperatures)
+    ])
+    return definition
+
+
+@pytest.fixture
+def store():
+    return ParameterStore({
+        'cold': _definition([150, 300], "5.0"),
+        'warm': _definition([250], "5"),
+        'odd': _definition([300, 310], "6.5", "[1, 0, 0]"),
+        'empty': SimulationDefinition("Empty"),
+    })
+
+
+def test_queries(store):
+    temperature = NEEDLE_PREFIX + "NEEDLE_TEMPERATURE"
+    assert store.columns() == ["BANANA", temperature, NEEDLE_PREFIX + "NEEDLE_TIP_LOCATION"]
+
+    assert store.query((temperature, "<", 200)) == ['cold']
+    assert store.query((temperature, ">=", 250), ("BANANA", "==", 5)) == ['cold', 'warm']
+    assert store.query(("BANANA", "!=", 5.0)) == ['odd']
+    assert store.query((NEEDLE_PREFIX + "NEEDLE_TIP_LOCATION", ">", 0)) == []
+    assert store.query((NEEDLE_PREFIX + "NEEDLE_TIP_LOCATION", "==", [1, 0, 0])) == ['odd']
+
+    assert store.unusual("BANANA") == ['odd']
+    assert store.unusual(NEEDLE_PREFIX + "NEEDLE_TIP_LOCATION") == ['odd']
+
+
+def test_aggregates_and_histograms(store):
+    temperature = NEEDLE_PREFIX + "NEEDLE_TEMPERATURE"
+    assert store.histogram(temperature)[0] == (300.0, 2)
+    assert sum(count for _, count in store.histogram(temperature)) == 5
+    assert store.aggregate(temperature, "min") == 150
+    assert store.aggregate(temperature, "mean") == 262.0
+    assert store.aggregate("BANANA", "count") == 3
+    assert store.aggregate(NEEDLE_PREFIX + "NEEDLE_TIP_LOCATION", "max") is None
+
+    # Distinct values are stored once, however many rows hold them
+    assert len(store.histogram("BANANA")) == 2
+
+    with pytest.raises(RuntimeError):
+        store.histogram("PEAR")
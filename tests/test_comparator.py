@@ -1,6 +1,8 @@
-from glossia.comparator import Comparator
+from glossia.comparator import Comparator, ComparisonStats, MISSING
+from glossia.comparator.synthetic import DocumentGenerator
 from collections import Counter
 from lxml.etree import XMLSyntaxError
+import io
 import pytest
 
 
@@ -393,3 +395,227 @@ def test_comparator_algorithms_only_fails():
         "Right definition has no algorithm 'CONSTANT_KIWI'"
     ]
     assert Counter(messages) == Counter(comparator.diff())
+
+
+def test_comparator_fingerprint_ignores_order_and_labels():
+    left = """
+      <simulationDefinition>
+        <parameters>
+          <parameter name="BANANA" value="5.0" type="float"/>
+          <parameter name="PEAR" value="3" type="int"/>
+        </parameters>
+        <numericalModel>
+          <needles>
+            <needle index='1' class='solid-boundary' file='library:cryo'>
+              <parameters>
+                <parameter name="NEEDLE_TIP_LOCATION" value="[-1,0.3, 1.2]" type="array(float)"/>
+              </parameters>
+            </needle>
+            <needle index='2' class='boundary' file='library:cryo'/>
+          </needles>
+          <regions>
+            <region id='organ-0' name='organ' format="surface" input="kidney.vtp" groups='[&quot;a&quot;, &quot;b&quot;]'/>
+          </regions>
+        </numericalModel>
+      </simulationDefinition>
+    """
+    right = """
+      <simulationDefinition>
+        <parameters>
+          <parameter name="PEAR" value="3" type="int"/>
+          <parameter name="BANANA" value="5.00" type="float"/>
+        </parameters>
+        <numericalModel>
+          <regions>
+            <region id='organ-0' name='organ' format="surface" input="kidney.vtp" groups='[&quot;b&quot;, &quot;a&quot;]'/>
+          </regions>
+          <needles>
+            <needle index='7' class='boundary' file='library:cryo'/>
+            <needle index='8' class='solid-boundary' file='library:cryo'>
+              <parameters>
+                <parameter name="NEEDLE_TIP_LOCATION" value="[-1, 0.3, 1.2]" type="array(float)"/>
+              </parameters>
+            </needle>
+          </needles>
+        </numericalModel>
+      </simulationDefinition>
+    """
+    comparator = Comparator(left, right)
+    left_structure, right_structure = comparator.structures()
+    assert comparator.diff() == []
+    assert comparator.equal()
+    assert left_structure.fingerprint() == right_structure.fingerprint()
+    assert len({left_structure, right_structure}) == 1
+
+
+def test_comparator_fingerprint_differs():
+    left = """
+      <simulationDefinition>
+        <parameters>
+          <parameter name="BANANA" value="5.0" type="float"/>
+        </parameters>
+      </simulationDefinition>
+    """
+    right = """
+      <simulationDefinition>
+        <parameters>
+          <parameter name="BANANA" value="5.01" type="float"/>
+        </parameters>
+      </simulationDefinition>
+    """
+    comparator = Comparator(left, right)
+    left_structure, right_structure = comparator.structures()
+    assert not comparator.equal()
+    assert left_structure.fingerprint() != right_structure.fingerprint()
+
+
+def test_comparator_diff_records():
+    left = """
+      <simulationDefinition>
+        <parameters>
+          <parameter name="BANANA" value="5.0" type="float"/>
+          <parameter name="PEAR" value="3" type="float"/>
+        </parameters>
+      </simulationDefinition>
+    """
+    right = """
+      <simulationDefinition>
+        <parameters>
+          <parameter name="BANANA" value="5.01" type="float"/>
+          <parameter name="APPLE" value="3" type="float"/>
+        </parameters>
+      </simulationDefinition>
+    """
+    comparator = Comparator(left, right)
+    records = list(comparator.diff_records())
+    assert Counter(record.to_tuple() for record in records) == Counter([
+        ("Parameter", "BANANA", "value", 5.0, 5.01),
+        ("Definition", "Left", "parameter", MISSING, "APPLE"),
+        ("Definition", "Right", "parameter", "PEAR", MISSING),
+    ])
+    assert sorted(str(record) for record in records) == comparator.diff()
+    assert comparator.diff() == [
+        "Left definition has no parameter 'APPLE'",
+        "Parameter BANANA: values differ - 5.0 // 5.01",
+        "Right definition has no parameter 'PEAR'"
+    ]
+
+
+def test_comparator_tolerances():
+    left = """
+      <simulationDefinition>
+        <parameters>
+          <parameter name="BANANA" value="5.0" type="float"/>
+          <parameter name="CURVE" value="[1.0, 2.0, 3.0]" type="array(float)"/>
+        </parameters>
+        <numericalModel>
+          <needles>
+            <needle index='1' class='solid-boundary' file='library:cryo'>
+              <parameters>
+                <parameter name="NEEDLE_TIP_LOCATION" value="[-1, 0.3, 1.2]" type="array(float)"/>
+              </parameters>
+            </needle>
+            <needle index='2' class='solid-boundary' file='library:cryo'>
+              <parameters>
+                <parameter name="NEEDLE_TIP_LOCATION" value="[5, 0.3, 1.2]" type="array(float)"/>
+              </parameters>
+            </needle>
+          </needles>
+        </numericalModel>
+      </simulationDefinition>
+    """
+    right = """
+      <simulationDefinition>
+        <parameters>
+          <parameter name="BANANA" value="5.0000000001" type="float"/>
+          <parameter name="CURVE" value="[1.0, 2.0000000001, 3.0]" type="array(float)"/>
+        </parameters>
+        <numericalModel>
+          <needles>
+            <needle index='2' class='solid-boundary' file='library:cryo'>
+              <parameters>
+                <parameter name="NEEDLE_TIP_LOCATION" value="[5.0000001, 0.3, 1.2]" type="array(float)"/>
+              </parameters>
+            </needle>
+            <needle index='1' class='solid-boundary' file='library:cryo'>
+              <parameters>
+                <parameter name="NEEDLE_TIP_LOCATION" value="[-1.0000001, 0.3, 1.2]" type="array(float)"/>
+              </parameters>
+            </needle>
+          </needles>
+        </numericalModel>
+      </simulationDefinition>
+    """
+    assert len(Comparator(left, right).diff()) == 4
+    assert not Comparator(left, right).equal()
+
+    tolerances = {"float": (0, 1e-9), "array(float)": (1e-9, 1e-9), "NEEDLE_TIP_LOCATION": (1e-6, 0)}
+    comparator = Comparator(left, right, tolerances=tolerances)
+    assert comparator.diff() == []
+    assert comparator.equal()
+
+    comparator = Comparator(left, right, tolerances={"NEEDLE_TIP_LOCATION": (1e-6, 0)})
+    assert comparator.diff() == [
+        "Parameter BANANA: values differ - 5.0 // 5.0000000001",
+        "Parameter CURVE: values differ - [1.0, 2.0, 3.0] // [1.0, 2.0000000001, 3.0]"
+    ]
+    assert not comparator.equal()
+
+
+def test_comparator_stats():
+    left, right = DocumentGenerator(needles=5, definition_lines=20).pair(changed_parameters=2, changed_definition=True)
+    stats = ComparisonStats()
+    comparator = Comparator(left.decode('utf-8'), right.decode('utf-8'), stats=stats)
+    messages = comparator.diff()
+
+    assert messages == comparator.structures()[0].diff(comparator.structures()[1])
+    assert set(stats.timings) == {"parse", "build", "compare", "needle costs", "assignment", "definition diff", "format"}
+    assert stats.counts == {"parameters": 20, "needles": 10, "matrix cells": 25, "records": 3, "messages": 3}
+
+    events = []
+    Comparator(left.decode('utf-8'), right.decode('utf-8'), stats=lambda *event: events.append(event)).equal()
+    assert [name for kind, name, value in events if kind == "phase"] == ["parse", "build", "compare"]
+
+
+def test_comparator_sections():
+    left, right = DocumentGenerator(needles=4).pair(changed_parameters=2, changed_needle_parameters=1, changed_definition=True)
+    left, right = left.decode('utf-8'), right.decode('utf-8')
+
+    assert len(Comparator(left, right).diff()) == 4
+    assert len(Comparator(left, right, sections=["parameters"]).diff()) == 2
+    assert len(Comparator(left, right, sections=["needles"]).diff()) == 1
+    assert Comparator(left, right, sections=["transferrer", "regions"]).equal()
+    assert not Comparator(left, right, sections=["definition"]).equal()
+
+    # Unselected sections are parsed but never converted, so not compared
+    structure, _ = Comparator(left, right, sections=["needles"]).structures()
+    assert not structure.parameters and not structure.numerical_model.regions
+    assert not structure.numerical_model.definition
+
+    # Streamed from files, they are passed over without being read
+    streamed = Comparator.from_files(io.BytesIO(left.encode('utf-8')), io.BytesIO(right.encode('utf-8')), sections=["needles"])
+    structure, _ = streamed.structures()
+    assert not structure.parameters and not structure.numerical_model.regions
+    assert len(streamed.diff()) == 1
+
+    with pytest.raises(RuntimeError):
+        Comparator(left, right, sections=["planets"]).diff()
+
+
+def test_comparator_parallel(tmp_path):
+    left, right = DocumentGenerator(needles=6, algorithms=3).pair(
+        changed_parameters=3, removed_parameters=1, changed_needle_parameters=2, changed_groups=1, changed_definition=True
+    )
+
+    sequential = Comparator(left, right)
+    parallel = Comparator(left, right, parallel=True, stats=ComparisonStats())
+    assert parallel.diff() == sequential.diff()
+    assert list(parallel.diff_records()) == list(sequential.diff_records())
+
+    (tmp_path / "left.xml").write_bytes(left)
+    (tmp_path / "right.xml").write_bytes(right)
+    assert Comparator.from_files(tmp_path / "left.xml", tmp_path / "right.xml", parallel=True).diff() == sequential.diff()
+
+    # As sequentially, a failure on the left is the one reported
+    with pytest.raises(XMLSyntaxError):
+        Comparator(b"<simulationDefinition>", b"<simulationDefinition", parallel=True)
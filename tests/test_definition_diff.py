@@ -0,0 +1,65 @@
+from glossia.comparator.definition_diff import DefinitionDiff, changed_blocks, unified_lines
+import difflib
+import random
+
+
+def _lcs(a, b):
+    lengths = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a)):
+        for j in range(len(b)):
+            lengths[i + 1][j + 1] = lengths[i][j] + 1 if a[i] == b[j] else max(lengths[i][j + 1], lengths[i + 1][j])
+    return lengths[-1][-1]
+
+
+def test_changed_blocks_are_minimal():
+    rng = random.Random(17)
+    for _ in range(200):
+        a = [rng.choice("abcd") for _ in range(rng.randrange(12))]
+        b = [rng.choice("abcd") for _ in range(rng.randrange(12))]
+        blocks = changed_blocks(a, b)
+
+        # Replacing each block reconstructs the right-hand side, and the
+        # lines left untouched are a longest common subsequence
+        rebuilt, i = [], 0
+        for i1, i2, j1, j2 in blocks:
+            rebuilt += a[i:i1] + b[j1:j2]
+            i = i2
+        assert rebuilt + a[i:] == b
+        assert len(a) - sum(i2 - i1 for i1, i2, _, _ in blocks) == _lcs(a, b)
+
+
+def test_unified_lines_agree_with_difflib():
+    a = ["line %d" % i for i in range(40)]
+    b = list(a)
+    b[5] = "changed"
+    del b[20:22]
+    b.insert(35, "inserted")
+
+    expected = [line for line in difflib.unified_diff(a, b, lineterm='')][2:]
+    assert list(unified_lines(a, b, changed_blocks(a, b))) == expected
+
+
+def test_bounded_output():
+    a = "\n".join("line %d" % i for i in range(5000))
+    b = "\n".join("line %d" % (i * 7) for i in range(5000))
+
+    message = DefinitionDiff(max_lines=10).format(a, b)
+    assert len(message.splitlines()) == 1 + 2 + 10 + 1
+
+    assert DefinitionDiff(max_edits=10, ranges_only=True).format(a, b) == \
+        "Numerical Model: definitions differ at lines -2,4999 +2,4999"
+    assert DefinitionDiff(ranges_only=True).format("a\nb\nc", "a\nB\nc\nd") == \
+        "Numerical Model: definitions differ at lines -2 +2; -3,0 +4"
+
+
+def test_limits_can_be_lifted():
+    a = "\n".join("line %d" % i for i in range(1000))
+    b = "\n".join("line %d" % (i * 7) for i in range(1000))
+
+    assert DefinitionDiff().max_lines == 500
+    for unlimited in (None, 0):
+        options = DefinitionDiff(max_lines=unlimited, max_edits=unlimited)
+        assert options.max_lines is None and options.max_edits is None
+        message = options.format(a, b)
+        assert "truncated" not in message
+        assert len(message.splitlines()) > 500
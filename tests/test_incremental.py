@@ -0,0 +1,92 @@
+from glossia.comparator.simulation_definition import SimulationDefinition
+import random
+
+
+def _definition(name, needles):
+    definition = SimulationDefinition(name)
+    definition.set_transferrer("http", "http://example.com")
+    definition.add_parameter("BANANA", "1", "float")
+    definition.add_parameter("PEAR", "2", "integer")
+    definition.set_numerical_model("", "", [("organ-0", "organ", "surface", "kidney.vtp", ["a"])], needles)
+    return definition
+
+
+def _needles(rng, count, offset=0):
+    return [
+        (str(offset + index), "boundary", rng.choice(["a", "b"]), [
+            ("NEEDLE_TIP_LOCATION", str(rng.choice([1, 2, 3])), "float"),
+            ("NEEDLE_ACTIVE_LENGTH", str(rng.choice([1, 2])), "float")
+        ])
+        for index in range(count)
+    ]
+
+
+def test_update_agrees_with_full_diff():
+    rng = random.Random(11)
+    this = _definition("Left", _needles(rng, 6))
+    that = _definition("Right", _needles(rng, 6, 100))
+    state = this.diff_state(that)
+    assert state.diff() == this.diff(that)
+
+    that.add_parameter("PEAR", "3", "integer")
+    that.add_parameter("KIWI", "3", "integer")
+    state.update(changed=[("parameter", "PEAR"), ("parameter", "KIWI")])
+    assert state.diff() == this.diff(that)
+
+    this.numerical_model.needles["2"] = SimulationDefinition.Needle("2", "boundary", "c", [
+        ("NEEDLE_TIP_LOCATION", "7", "float")
+    ])
+    state.update(changed=[("needle", "2")])
+    assert state.diff() == this.diff(that)
+
+    del that.numerical_model.needles["103"]
+    state.update(changed=[("needle", "103")])
+    assert state.diff() == this.diff(that)
+
+
+def test_update_recomputes_only_changed_needles(monkeypatch):
+    rng = random.Random(12)
+    this = _definition("Left", _needles(rng, 5))
+    that = _definition("Right", _needles(rng, 5, 100))
+    state = this.diff_state(that)
+
+    calls = []
+    needle_costs = SimulationDefinition.NumericalModel.needle_costs
+
+    def counting(self, other, this_keys=None, that_keys=None, tolerances=None):
+        calls.append((list(this_keys), list(that_keys)))
+        return needle_costs(self, other, this_keys, that_keys, tolerances)
+    monkeypatch.setattr(SimulationDefinition.NumericalModel, "needle_costs", counting)
+
+    that.numerical_model.needles["104"] = SimulationDefinition.Needle("104", "boundary", "a", [])
+    state.update(changed=[("needle", "104")])
+
+    assert calls == [(["0", "1", "2", "3", "4"], ["104"])]
+    assert state.diff() == this.diff(that)
+
+    calls.clear()
+    state.update(changed=[("parameter", "BANANA")])
+    assert calls == []
+
+
+def test_update_invalidates_fingerprints():
+    rng = random.Random(13)
+    this = _definition("Left", _needles(rng, 2))
+    that = _definition("Right", _needles(random.Random(13), 2))
+    state = this.diff_state(that)
+    assert this.fingerprint() == that.fingerprint()
+
+    that.parameters["BANANA"] = SimulationDefinition.Parameter("BANANA", "5", "float")
+    state.update(changed=[("parameter", "BANANA")])
+    assert state.diff() == this.diff(that)
+    assert this.fingerprint() != that.fingerprint()
+
+
+def test_unchanged_nan_is_not_a_difference():
+    this = _definition("Left", [("0", "boundary", "a", [("NEEDLE_TIP_LOCATION", "nan", "float")])])
+    that = _definition("Right", [("0", "boundary", "a", [("NEEDLE_TIP_LOCATION", "nan", "float")])])
+    this.add_parameter("APPLE", "nan", "float")
+    that.add_parameter("APPLE", "nan", "float")
+    assert this.diff(that) == []
+    assert this.matches(that)
+    assert this.fingerprint() == that.fingerprint()
@@ -0,0 +1,93 @@
+from glossia.comparator import Comparator
+from glossia.comparator import comparator as comparator_module
+from glossia.comparator.batch import compare_files
+from glossia.comparator.memo import ResultMemo, document_digest
+from glossia.comparator.synthetic import DocumentGenerator
+import os
+import pickle
+import pytest
+
+
+@pytest.fixture
+def memo(tmp_path):
+    memo = ResultMemo(str(tmp_path / "memo.sqlite"))
+    yield memo
+    memo.close()
+
+
+def test_hits_skip_parsing(memo, monkeypatch):
+    left, right = DocumentGenerator().pair(changed_parameters=2)
+    messages = Comparator(left, right).diff()
+
+    assert Comparator(left, right, memo=memo).diff() == messages
+    assert memo.stats() == {'hits': 0, 'misses': 1, 'stores': 1, 'evictions': 0, 'entries': 1}
+
+    def fail(*args):
+        raise AssertionError("parsed")
+    monkeypatch.setattr(comparator_module, "parse_document", fail)
+
+    # Documents are matched by content, whatever form they take
+    assert Comparator(left.decode('utf-8'), bytearray(right), memo=memo).diff() == messages
+    assert not Comparator(left, right, memo=memo).equal()
+    assert memo.stats()['hits'] == 2
+
+    # Other options give other results
+    with pytest.raises(AssertionError):
+        Comparator(left, right, memo=memo, sections=["transferrer"]).diff()
+    with pytest.raises(AssertionError):
+        Comparator(left, right, memo=memo, tolerances={"float": (1, 0)}).diff()
+
+
+def test_eviction(tmp_path):
+    memo = ResultMemo(str(tmp_path / "memo.sqlite"), max_entries=2)
+    memo.put("a", ["A"])
+    memo.put("b", [])
+    assert memo.get("a") == ["A"]
+    memo.put("c", ["C"])
+
+    # The least recently used is evicted
+    assert memo.get("b") is None
+    assert memo.get("a") == ["A"] and memo.get("c") == ["C"]
+    assert memo.stats() == {'hits': 3, 'misses': 1, 'stores': 3, 'evictions': 1, 'entries': 2}
+
+    # The store, counters included, survives reopening, as it does pickling
+    memo.close()
+    memo = pickle.loads(pickle.dumps(ResultMemo(str(tmp_path / "memo.sqlite"), max_entries=2)))
+    assert memo.max_entries == 2 and memo.stats()['entries'] == 2
+
+    memo.clear()
+    assert memo.stats() == {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'entries': 0}
+    memo.close()
+
+
+def test_files(memo, tmp_path):
+    left, right = DocumentGenerator().pair(changed_needle_parameters=1)
+    (tmp_path / "left.xml").write_bytes(left)
+    (tmp_path / "right.xml").write_bytes(right)
+    pairs = [(str(tmp_path / "left.xml"), str(tmp_path / "right.xml"))] * 3
+
+    first = [result['messages'] for result in compare_files(pairs, processes=2, memo=memo)]
+    second = [result['messages'] for result in compare_files(pairs, processes=1, memo=memo)]
+    assert first == second == [Comparator(left, right).diff()] * 3
+    assert memo.stats()['entries'] == 1
+    assert memo.stats()['hits'] >= 3
+
+    with open(tmp_path / "left.xml", 'rb') as f:
+        assert Comparator.from_files(f, str(tmp_path / "right.xml"), memo=memo).diff() == first[0]
+
+
+def test_digest_keeps_file_position(memo, tmp_path):
+    left, right = DocumentGenerator().pair(changed_parameters=1)
+    (tmp_path / "left.xml").write_bytes(b"HEADER" + left)
+    (tmp_path / "right.xml").write_bytes(right)
+
+    with open(tmp_path / "left.xml", 'rb') as f:
+        f.seek(len(b"HEADER"))
+        assert document_digest(f) == document_digest(left)
+        assert f.tell() == len(b"HEADER")
+        assert Comparator.from_files(f, str(tmp_path / "right.xml"), memo=memo).diff() == Comparator(left, right).diff()
+
+    reader, writer = os.pipe()
+    with open(reader, 'rb') as f, open(writer, 'wb'):
+        with pytest.raises(RuntimeError):
+            document_digest(f)
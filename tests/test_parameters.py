@@ -0,0 +1,70 @@
+from glossia.comparator.parameters import convert_parameter, values_equal, values_equal_matrix, canonical_value
+import array
+
+
+def test_convert_parameter_basic_types():
+    assert convert_parameter("5.0", "float") == 5.0
+    assert convert_parameter("3", "integer") == 3
+    assert convert_parameter("False", "boolean") is False
+    assert convert_parameter("yes", "boolean") is True
+    assert convert_parameter("3", "string") == "3"
+    assert convert_parameter("null", "float") is None
+    assert convert_parameter("not a number", "float") == "not a number"
+    assert convert_parameter("3", "int") == 3
+    assert convert_parameter('{"a": [1, 2]}') == {"a": [1, 2]}
+    assert convert_parameter("plain") == "plain"
+    assert convert_parameter("plain", try_json=False) == "plain"
+
+
+def test_convert_parameter_arrays():
+    value = convert_parameter("[-1,0.3, 1.2]", "array(float)")
+    assert value == array.array('d', [-1, 0.3, 1.2])
+    assert convert_parameter("[1, 2, 3]", "array(int)") == array.array('q', [1, 2, 3])
+    assert convert_parameter("[]", "array(float)") == array.array('d')
+    assert convert_parameter([1.0, 2.0], "array(float)") == array.array('d', [1, 2])
+
+    # Nested arrays fall back to JSON
+    assert convert_parameter("[[1, 2], [3, 4]]", "array(float)") == [[1, 2], [3, 4]]
+
+
+def test_convert_parameter_memoized_arrays_are_not_shared():
+    first = convert_parameter("[1, 2]", "array(float)")
+    first[0] = 7
+    assert convert_parameter("[1, 2]", "array(float)") == array.array('d', [1, 2])
+
+
+def test_values_equal_arrays_and_lists():
+    assert values_equal(array.array('d', [1, 2]), [1, 2])
+    assert not values_equal(array.array('d', [1, 2]), [1, 3])
+    assert canonical_value(array.array('d', [1, 2])) == canonical_value([1.0, 2])
+
+
+def test_values_equal_with_tolerance():
+    assert values_equal(1.0, 1.0 + 1e-12, (1e-9, 0))
+    assert not values_equal(1.0, 1.1, (1e-9, 0))
+    assert values_equal(1000.0, 1000.001, (0, 1e-5))
+    assert values_equal(array.array('d', [1, 2]), [1, 2 + 1e-12], (1e-9, 0))
+    assert not values_equal(array.array('d', [1, 2]), array.array('d', [1, 2, 3]), (1e-9, 0))
+    assert not values_equal("a", "b", (1e-9, 0))
+
+
+def test_values_equal_matrix():
+    these = [array.array('d', [0, 0]), array.array('d', [1, 1])]
+    those = [[1, 1 + 1e-12], [0, 0], [0, 5]]
+    assert values_equal_matrix(these, those, (1e-9, 0)).tolist() == [
+        [False, True, False],
+        [True, False, False]
+    ]
+    assert values_equal_matrix([1.0, 2.0], [2.0 + 1e-12], (1e-9, 0)).tolist() == [[False], [True]]
+    assert values_equal_matrix(["a"], ["a", "b"]).tolist() == [[True, False]]
+
+
+def test_nan_equals_nan():
+    nan = float("nan")
+    assert values_equal(nan, nan)
+    assert values_equal([1.0, nan], array.array('d', [1, nan]))
+    assert not values_equal(nan, 1.0)
+    assert values_equal(nan, nan, (1e-9, 0))
+    assert values_equal(float("inf"), float("inf"), (1e-9, 0))
+    assert canonical_value(nan) == canonical_value(float("nan"))
+    assert values_equal_matrix([nan, 1.0], [nan], (1e-9, 0)).tolist() == [[True], [False]]
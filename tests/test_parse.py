@@ -0,0 +1,125 @@
+from glossia.comparator.parse import gssa_xml_to_definition, gssa_xml_stream_to_definition, parse_document
+from glossia.comparator import parse
+from glossia.comparator import Comparator
+from lxml import etree as ET
+import io
+import pytest
+
+DOCUMENT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<simulationDefinition>
+  <transferrer class="http">
+    <url>http://example.com</url>
+  </transferrer>
+  <algorithms>
+    <algorithm result="CONSTANT_KIWI">
+      <arguments>
+        <argument name="Time"/>
+      </arguments>
+      <content>
+        Time * 2
+      </content>
+    </algorithm>
+  </algorithms>
+  <parameters>
+    <parameter name="BANANA" value="5.0" type="float"/>
+    <parameter name="PEAR" value="3" type="integer"/>
+  </parameters>
+  <numericalModel>
+    <needles>
+      <needle index='1' class='solid-boundary' file='library:cryo'>
+        <parameters>
+          <parameter name="NEEDLE_TIP_LOCATION" value="[-1, 0.3, 1.2]" type="array(float)"/>
+        </parameters>
+      </needle>
+      <needle index='2' class='boundary' file='library:cryo'/>
+    </needles>
+    <regions>
+      <region id='organ-0' name='organ' format="surface" input="kidney.vtp" groups='[&quot;boundary&quot;]'/>
+    </regions>
+    <definition family="elmer-libnuma">
+      A Definition
+    </definition>
+  </numericalModel>
+</simulationDefinition>
+"""
+
+
+def test_stream_matches_tree():
+    tree_definition = gssa_xml_to_definition(ET.fromstring(DOCUMENT), "Left")
+    stream_definition = gssa_xml_stream_to_definition(io.BytesIO(DOCUMENT), "Right", huge_tree=True)
+
+    assert tree_definition.diff(stream_definition) == []
+    assert tree_definition.fingerprint() == stream_definition.fingerprint()
+    assert stream_definition.get_family() == "elmer-libnuma"
+    assert stream_definition.get_parameters_dict() == tree_definition.get_parameters_dict()
+
+
+@pytest.mark.parametrize("document,message", [
+    (b"<simulationDefinitio/>", "Incorrect top tag"),
+    (b"<simulationDefinition><parameters/><parameters/></simulationDefinition>", "Too many parameters nodes"),
+    (b"<simulationDefinition><numericalModel><rogue/></numericalModel></simulationDefinition>",
+     "Unknown node in numerical model: rogue"),
+    (b"<simulationDefinition><numericalModel><needles><needle index='1'/></needles></numericalModel></simulationDefinition>",
+     "Needle tag has not got all information"),
+    (b"<simulationDefinition><algorithms><algorithm result='A'><rogue/></algorithm></algorithms></simulationDefinition>",
+     "Algorithm A has a rogue tag: rogue"),
+])
+def test_stream_errors_match_tree(document, message):
+    with pytest.raises(RuntimeError) as tree_error:
+        gssa_xml_to_definition(ET.fromstring(document), "Left")
+    with pytest.raises(RuntimeError) as stream_error:
+        gssa_xml_stream_to_definition(io.BytesIO(document), "Left")
+
+    assert message in str(tree_error.value)
+    assert str(tree_error.value) == str(stream_error.value)
+
+
+def test_comparator_from_files(tmp_path):
+    left = tmp_path / "left.xml"
+    right = tmp_path / "right.xml"
+    left.write_bytes(DOCUMENT)
+    right.write_bytes(DOCUMENT.replace(b'value="5.0"', b'value="6.0"'))
+
+    comparator = Comparator.from_files(str(left), str(right))
+    assert comparator.diff() == ["Parameter BANANA: values differ - 5.0 // 6.0"]
+
+
+def test_stream_sections_match_tree():
+    for sections in (["parameters"], ["needles", "transferrer"], ["numericalModel"], ["definition", "algorithms"]):
+        tree_definition = gssa_xml_to_definition(ET.fromstring(DOCUMENT), "Left", sections=sections)
+        stream_definition = gssa_xml_stream_to_definition(io.BytesIO(DOCUMENT), "Left", sections=sections)
+        assert tree_definition.to_dict() == stream_definition.to_dict()
+
+
+def test_document_sources(tmp_path, monkeypatch):
+    path = tmp_path / "document.xml"
+    path.write_bytes(DOCUMENT)
+    expected = gssa_xml_to_definition(ET.fromstring(DOCUMENT), "Left").to_dict()
+
+    # Every file is memory-mapped, however small
+    monkeypatch.setattr(parse, "MMAP_THRESHOLD", 0)
+    with open(path, 'rb') as f:
+        sources = [DOCUMENT, bytearray(DOCUMENT), memoryview(DOCUMENT), DOCUMENT.decode('utf-8'), path, f]
+        for source in sources:
+            assert gssa_xml_to_definition(source, "Left").to_dict() == expected
+
+
+def test_declared_encoding_is_honoured():
+    document = DOCUMENT.replace(b"UTF-8", b"ISO-8859-1").replace(b'value="5.0"', "value='\xe9'".encode('latin-1'))
+    assert parse_document(document).find("parameters/parameter").get("value") == "\xe9"
+
+    # Text is already decoded, whatever the declaration says
+    assert parse_document(document.decode('latin-1')).find("parameters/parameter").get("value") == "\xe9"
+
+    assert Comparator(document, document.decode('latin-1')).diff() == []
+
+
+def test_region_groups_need_not_be_a_list():
+    # Groups are compared as given, so any JSON is accepted as it was
+    left = (b"<simulationDefinition><numericalModel><regions>"
+            b"<region id='r' name='organ' format='surface' input='r.vtp' groups='5'/>"
+            b"</regions></numericalModel></simulationDefinition>")
+    right = b"<simulationDefinition><parameters/></simulationDefinition>"
+
+    assert gssa_xml_to_definition(ET.fromstring(left), "Left").numerical_model.regions["r"].groups == 5
+    assert Comparator(left, right).diff() == ["Right definition has no numerical model"]
@@ -0,0 +1,60 @@
+from glossia.comparator.parse import gssa_xml_to_definition
+from glossia.comparator.serialize import dump_definition, load_definition
+from lxml import etree as ET
+import pytest
+
+DOCUMENT = b"""
+<simulationDefinition>
+  <transferrer class="http">
+    <url>http://example.com</url>
+  </transferrer>
+  <algorithms>
+    <algorithm result="CONSTANT_KIWI">
+      <arguments>
+        <argument name="Time"/>
+      </arguments>
+      <content>Time * 2</content>
+    </algorithm>
+  </algorithms>
+  <parameters>
+    <parameter name="BANANA" value="5.0" type="float"/>
+    <parameter name="PEAR" value="3" type="integer"/>
+    <parameter name="LARGE" value="123456789012345678901234567890"/>
+    <parameter name="NOTHING" value="null"/>
+    <parameter name="FLAG" value="true" type="boolean"/>
+    <parameter name="TABLE" value="{&quot;a&quot;: [1, 2.5, &quot;x&quot;]}"/>
+  </parameters>
+  <numericalModel>
+    <needles>
+      <needle index='1' class='solid-boundary' file='library:cryo'>
+        <parameters>
+          <parameter name="NEEDLE_TIP_LOCATION" value="[-1.0, 0.3, 1.2]" type="array(float)"/>
+          <parameter name="NEEDLE_INDEXES" value="[1, 2, 3]" type="array(int)"/>
+        </parameters>
+      </needle>
+    </needles>
+    <regions>
+      <region id='organ-0' name='organ' format="surface" input="kidney.vtp" groups='[&quot;boundary&quot;]'/>
+    </regions>
+    <definition family="elmer-libnuma">A Definition</definition>
+  </numericalModel>
+</simulationDefinition>
+"""
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_serialize_round_trip(compress):
+    definition = gssa_xml_to_definition(ET.fromstring(DOCUMENT), "Left")
+    data = dump_definition(definition, compress=compress)
+    loaded = load_definition(data)
+
+    assert loaded.to_dict() == definition.to_dict()
+    assert loaded.diff(definition) == []
+    assert loaded.fingerprint() == definition.fingerprint()
+    assert loaded.name == "Left"
+    assert loaded.get_family() == "elmer-libnuma"
+
+
+def test_serialize_rejects_other_data():
+    with pytest.raises(RuntimeError):
+        load_definition(b"<simulationDefinition/>")
@@ -0,0 +1,87 @@
+from glossia.comparator.service import (
+    ComparisonService, COMPARISON_ERROR, INTERNAL_ERROR, INVALID_PARAMS, METHOD_NOT_FOUND, PARSE_ERROR
+)
+from glossia.comparator.synthetic import DocumentGenerator
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+
+def _requests(*requests):
+    return io.StringIO("".join(json.dumps(request) + "\n" for request in requests))
+
+
+def test_service_stream():
+    left, right = [d.decode('utf-8') for d in DocumentGenerator().pair(changed_parameters=1)]
+    service = ComparisonService()
+
+    output = io.StringIO()
+    service.serve_stream(_requests(
+        {"jsonrpc": "2.0", "id": 1, "method": "register", "params": {"document": left, "id": "reference"}},
+        {"jsonrpc": "2.0", "id": 2, "method": "diff", "params": {"left": "reference", "right_document": right}},
+        {"jsonrpc": "2.0", "id": 3, "method": "equal", "params": {"left": "reference", "right_document": left}},
+        {"jsonrpc": "2.0", "method": "diff", "params": {"left": "reference", "right_document": right}},
+        {"jsonrpc": "2.0", "id": 4, "method": "diff", "params": {"left": "missing", "right_document": right}},
+        {"jsonrpc": "2.0", "id": 5, "method": "shutdown"},
+        {"jsonrpc": "2.0", "id": 6, "method": "stats"},
+    ), output)
+    responses = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    assert [response["id"] for response in responses] == [1, 2, 3, 4, 5, 6]
+    assert responses[0]["result"] == "reference"
+    assert len(responses[1]["result"]) == 1
+    assert responses[2]["result"] is True
+    assert responses[3]["error"]["code"] == INVALID_PARAMS
+    assert responses[4]["error"]["code"] == METHOD_NOT_FOUND
+
+    # The candidate was submitted twice but only parsed once
+    assert responses[5]["result"]["registered"] == 1
+    assert responses[5]["result"]["hits"] >= 1
+
+    assert json.loads(service.handle_line("{"))["error"]["code"] == PARSE_ERROR
+
+
+def test_service_unix_socket():
+    service = ComparisonService()
+    service.register(DocumentGenerator().document(), "reference")
+    path = os.path.join(tempfile.mkdtemp(), "comparator.sock")
+    threading.Thread(target=service.serve_unix, args=(path,), daemon=True).start()
+
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.01)
+
+    with socket.socket(socket.AF_UNIX) as client:
+        client.connect(path)
+        client.sendall(b'\xff\xfe\n{"jsonrpc": "2.0", "id": 1, "method": "definitions"}\n')
+        responses = client.makefile()
+        error = json.loads(responses.readline())
+        response = json.loads(responses.readline())
+
+    # Undecodable input is answered, not fatal to the connection
+    assert error["error"]["code"] == PARSE_ERROR
+    assert response == {"jsonrpc": "2.0", "id": 1, "result": ["reference"]}
+
+
+def test_service_survives_bad_requests(monkeypatch):
+    document = DocumentGenerator().document().decode('utf-8')
+    bad_groups = document.replace("groups='", "groups='not json", 1).replace('groups="', 'groups="not json', 1)
+    service = ComparisonService()
+
+    def code(params, method="diff"):
+        response = service.handle({"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+        return response["error"]["code"]
+
+    assert code({"left_document": document, "right_document": document, "tolerances": [1, 2]}) == INVALID_PARAMS
+    assert code({"left_document": document, "right_document": document, "tolerances": {"float": [1]}}) == INVALID_PARAMS
+    assert code({"left_document": bad_groups, "right_document": document}) == COMPARISON_ERROR
+
+    def broken():
+        raise KeyError("oops")
+    monkeypatch.setattr(service, "definitions", broken)
+    assert code({}, "definitions") == INTERNAL_ERROR
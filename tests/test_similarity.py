@@ -0,0 +1,53 @@
+from glossia.comparator.simulation_definition import SimulationDefinition
+from glossia.comparator.similarity import SimilarityIndex, definition_features
+import pytest
+import random
+
+
+def _definition(rng, name):
+    definition = SimulationDefinition(name)
+    definition.set_transferrer("http", "http://example.com")
+    for parameter in range(20):
+        definition.add_parameter("P%d" % rng.randrange(60), str(rng.randrange(5)), "integer")
+    needles = [
+        (str(index), rng.choice(["boundary", "solid-boundary"]), rng.choice(["a", "b", "c"]), [
+            ("NEEDLE_TIP_LOCATION", str([rng.randrange(10), 0, 0]), "array(float)")
+        ])
+        for index in range(rng.randrange(1, 4))
+    ]
+    definition.set_numerical_model("", "", [("organ-0", "organ", "surface", "kidney.vtp", ["a"])], needles)
+    return definition
+
+
+def test_features_count_repeated_needles():
+    one = SimulationDefinition("Left")
+    one.set_numerical_model("", "", [], [("1", "boundary", "a", [])])
+    two = SimulationDefinition("Right")
+    two.set_numerical_model("", "", [], [("1", "boundary", "a", []), ("2", "boundary", "a", [])])
+    assert definition_features(one) < definition_features(two)
+
+
+def test_query_finds_near_duplicate():
+    rng = random.Random(12)
+    corpus = {key: _definition(rng, "Archive") for key in range(300)}
+    index = SimilarityIndex()
+    index.update(corpus)
+    assert len(index) == 300
+
+    target = corpus[123]
+    near = SimulationDefinition.from_dict(target.to_dict())
+    near.name = "Query"
+    near.add_parameter("P0", "99", "integer")
+
+    results = index.query(near, k=5)
+    assert results[0][0] == 123
+    assert len(index.candidates(near)) < len(corpus)
+
+    closest = index.closest(near, k=5)
+    assert closest[0] == (123, near.diff(target))
+    assert index.query(target, k=1) == [(123, 1.0)]
+
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(RuntimeError):
+        SimilarityIndex(num_perm=100, bands=32)
@@ -0,0 +1,83 @@
+from glossia.comparator.simulation_definition import SimulationDefinition
+import pickle
+import random
+
+
+def _random_needles(rng, count):
+    names = ["NEEDLE_TIP_LOCATION", "NEEDLE_ENTRY_LOCATION", "NEEDLE_TEMPERATURE", "NEEDLE_ACTIVE_LENGTH"]
+    needles = []
+    for index in range(count):
+        parameters = [
+            (name, str(rng.choice([1, 2, 2.0, "[1, 2]", "[1,2 ]"])), rng.choice(["float", "array(float)", None]))
+            for name in names if rng.random() < 0.7
+        ]
+        needles.append((str(index), rng.choice(["boundary", "solid-boundary"]), rng.choice(["a", "b"]), parameters))
+    return needles
+
+
+def test_needle_costs_match_diff_lengths():
+    rng = random.Random(4)
+    this = SimulationDefinition.NumericalModel("", "", [], _random_needles(rng, 9))
+    that = SimulationDefinition.NumericalModel("", "", [], _random_needles(rng, 7))
+
+    for tolerances in (None, {"float": (0.5, 0), "NEEDLE_TIP_LOCATION": (1.5, 0)}):
+        costs = this.needle_costs(that, tolerances=tolerances)
+        assert costs.shape == (9, 7)
+        for row, this_needle in enumerate(this.needles.values()):
+            for column, that_needle in enumerate(that.needles.values()):
+                expected = len(this_needle.diff(that_needle, tolerances))
+                assert costs[row, column] == expected
+                assert this_needle.cost(that_needle, tolerances) == expected
+
+
+def _random_definition(rng, name):
+    definition = SimulationDefinition(name)
+    if rng.random() < 0.5:
+        definition.set_transferrer(rng.choice(["http", "ftp"]), "http://example.com")
+    for parameter in ["BANANA", "PEAR", "KIWI"]:
+        if rng.random() < 0.8:
+            definition.add_parameter(parameter, rng.choice(["1", "1.0", "2"]), rng.choice(["float", "integer"]))
+    definition.set_numerical_model(
+        rng.choice(["", "A Definition"]),
+        "",
+        [("organ-0", "organ", "surface", "kidney.vtp", rng.choice([["a"], ["a", "b"]]))],
+        _random_needles(rng, rng.choice([1, 2]))
+    )
+    return definition
+
+
+def test_matches_agrees_with_diff():
+    rng = random.Random(5)
+    for _ in range(200):
+        this = _random_definition(rng, "Left")
+        that = _random_definition(rng, "Right")
+        assert this.matches(that) == (this.diff(that) == [])
+        assert this.matches(this)
+
+
+def test_matches_does_not_solve_assignment(monkeypatch):
+    def compute(self, matrix):
+        raise AssertionError("Assignment should not be solved")
+    monkeypatch.setattr("munkres.Munkres.compute", compute)
+
+    rng = random.Random(6)
+    needles = _random_needles(rng, 5)
+    this = SimulationDefinition.NumericalModel("", "", [], needles)
+    that = SimulationDefinition.NumericalModel("", "", [], list(reversed(needles)))
+    fewer = SimulationDefinition.NumericalModel("", "", [], needles[:4])
+    assert this.matches(that)
+    assert not this.matches(fewer)
+
+
+def test_compact_entities_pickle():
+    rng = random.Random(18)
+    definition = _random_definition(rng, "Left")
+    definition.add_algorithm("RESULT", ["Time"], "Time * 2")
+
+    needle = next(iter(definition.numerical_model.needles.values()))
+    assert not hasattr(needle, '__dict__')
+    assert not hasattr(definition.algorithms["RESULT"], '__dict__')
+
+    copy = pickle.loads(pickle.dumps(definition))
+    assert copy.diff(definition) == []
+    assert copy.fingerprint() == definition.fingerprint()
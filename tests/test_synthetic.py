@@ -0,0 +1,39 @@
+from glossia.comparator.parse import gssa_xml_to_definition
+from glossia.comparator.synthetic import DocumentGenerator
+from lxml import etree as ET
+import pytest
+
+
+def _definitions(left, right):
+    return gssa_xml_to_definition(ET.fromstring(left), "Left"), gssa_xml_to_definition(ET.fromstring(right), "Right")
+
+
+def test_document_has_requested_size():
+    generator = DocumentGenerator(parameters=7, needles=4, needle_parameters=5, regions=3, region_groups=2, algorithms=2)
+    definition = gssa_xml_to_definition(ET.fromstring(generator.document()))
+
+    assert len(definition.parameters) == 7
+    assert len(definition.algorithms) == 2
+    assert len(definition.numerical_model.needles) == 4
+    assert all(len(needle.parameters) == 5 for needle in definition.numerical_model.needles.values())
+    assert all(len(region.groups) == 2 for region in definition.numerical_model.regions.values())
+    assert generator.document() == DocumentGenerator(parameters=7, needles=4, needle_parameters=5, regions=3, region_groups=2, algorithms=2).document()
+
+
+def test_pair_has_expected_number_of_differences():
+    generator = DocumentGenerator(parameters=40, needles=6, needle_parameters=4, regions=3)
+
+    left, right = _definitions(*generator.pair(reordered_needles=True))
+    assert left.diff(right) == []
+
+    left, right = _definitions(*generator.pair(
+        changed_parameters=5, removed_parameters=3, added_parameters=2,
+        changed_needle_parameters=4, changed_groups=2, changed_definition=True,
+        reordered_needles=True
+    ))
+    assert len(left.diff(right)) == 5 + 3 + 2 + 4 + 2 + 1
+
+
+def test_unknown_knob():
+    with pytest.raises(RuntimeError):
+        DocumentGenerator(planets=3)
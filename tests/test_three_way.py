@@ -0,0 +1,128 @@
+from glossia.comparator.simulation_definition import SimulationDefinition
+from glossia.comparator.three_way import LEFT, RIGHT, BOTH, CONFLICT
+
+
+def _definition(name, offset=0):
+    definition = SimulationDefinition(name)
+    definition.set_transferrer("http", "http://example.com")
+    definition.add_parameter("BANANA", "1", "float")
+    definition.add_parameter("PEAR", "2", "integer")
+    definition.add_parameter("PLUM", "3", "integer")
+    definition.set_numerical_model("", "", [("organ-0", "organ", "surface", "kidney.vtp", ["a"])], [
+        (str(offset + index), "boundary", "a", [
+            ("NEEDLE_TIP_LOCATION", str(index), "float"),
+            ("NEEDLE_ACTIVE_LENGTH", "2", "float")
+        ])
+        for index in range(3)
+    ])
+    return definition
+
+
+def _kinds(diff):
+    return sorted((change.kind, change.location) for change in diff.changes)
+
+
+def test_changes_are_classified():
+    base = _definition("Base")
+    # Needle indices differ on each side, so needles are matched to the base
+    left = _definition("Left", 100)
+    right = _definition("Right", 200)
+
+    left.add_parameter("BANANA", "5", "float")
+    right.add_parameter("PEAR", "7", "integer")
+    left.add_parameter("PLUM", "4", "integer")
+    right.add_parameter("PLUM", "4", "integer")
+    left.numerical_model.needles["101"].parameters["NEEDLE_TIP_LOCATION"].value = 8.
+    right.numerical_model.needles["201"].parameters["NEEDLE_TIP_LOCATION"].value = 9.
+    del left.numerical_model.needles["102"].parameters["NEEDLE_ACTIVE_LENGTH"]
+    right.numerical_model.needles["202"].cls = "point"
+
+    diff = base.three_way(left, right)
+    assert _kinds(diff) == [
+        (BOTH, ("parameter", "PLUM")),
+        (CONFLICT, ("needle", "1")),
+        (LEFT, ("needle", "2")),
+        (LEFT, ("parameter", "BANANA")),
+        (RIGHT, ("needle", "2")),
+        (RIGHT, ("parameter", "PEAR")),
+    ]
+    assert [str(change) for change in diff.conflicts()] == [
+        "conflict: Parameter NEEDLE_TIP_LOCATION: values differ - 1.0 // 8.0 // "
+        "Parameter NEEDLE_TIP_LOCATION: values differ - 1.0 // 9.0"
+    ]
+    assert diff.of_kind(BOTH)[0].format() == "both: Parameter PLUM: values differ - 3 // 4"
+
+
+def test_removal_conflicts_with_change():
+    base = _definition("Base")
+    left = _definition("Left")
+    right = _definition("Right")
+    del left.parameters["BANANA"]
+    right.add_parameter("BANANA", "2", "float")
+    del left.numerical_model.regions["organ-0"]
+    del right.numerical_model.regions["organ-0"]
+    right.transferrer = None
+
+    assert _kinds(base.three_way(left, right)) == [
+        (BOTH, ("region", "organ-0")),
+        (CONFLICT, ("parameter", "BANANA")),
+        (RIGHT, ("section", "transferrer")),
+    ]
+
+
+def test_unchanged():
+    assert _definition("Base").three_way(_definition("Left", 10), _definition("Right")).changes == []
+
+
+def test_one_sided_additions():
+    base = _definition("Base")
+    left = _definition("Left")
+    right = _definition("Right")
+    for definition in (base, left, right):
+        definition.add_algorithm("POWER", ["Time"], "Time")
+    left.add_parameter("NEW", "1", "integer")
+    left.add_algorithm("EXTRA", ["Time"], "Time * 2")
+    right.numerical_model.regions["organ-1"] = SimulationDefinition.Region("organ-1", "organ", "surface", "liver.vtp", ["b"])
+
+    assert _kinds(base.three_way(left, right)) == [
+        (LEFT, ("algorithm", "EXTRA")),
+        (LEFT, ("parameter", "NEW")),
+        (RIGHT, ("region", "organ-1")),
+    ]
+
+
+def test_additions_on_both_sides():
+    base = _definition("Base")
+    left = _definition("Left")
+    right = _definition("Right")
+    for definition in (base, left, right):
+        definition.add_algorithm("POWER", ["Time"], "Time")
+
+    def added(definition, value, content, input, needle):
+        definition.add_parameter("Q", value, "integer")
+        definition.add_algorithm("EXTRA", ["Time"], content)
+        definition.numerical_model.regions["organ-1"] = SimulationDefinition.Region(
+            "organ-1", "organ", "surface", input, ["b"]
+        )
+        definition.numerical_model.needles["9"] = SimulationDefinition.Needle("9", "boundary", "a", [
+            ("NEEDLE_TIP_LOCATION", needle, "float")
+        ])
+
+    # The same additions agree...
+    added(left, "1", "Time * 2", "liver.vtp", "5")
+    added(right, "1", "Time * 2", "liver.vtp", "5")
+    assert _kinds(base.three_way(left, right)) == [
+        (BOTH, ("algorithm", "EXTRA")),
+        (BOTH, ("needle count", None)),
+        (BOTH, ("parameter", "Q")),
+        (BOTH, ("region", "organ-1")),
+    ]
+
+    # ...but different additions under the same key conflict
+    added(right, "2", "Time * 3", "lung.vtp", "6")
+    assert _kinds(base.three_way(left, right)) == [
+        (CONFLICT, ("algorithm", "EXTRA")),
+        (CONFLICT, ("needle count", None)),
+        (CONFLICT, ("parameter", "Q")),
+        (CONFLICT, ("region", "organ-1")),
+    ]
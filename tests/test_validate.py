@@ -0,0 +1,55 @@
+from glossia.comparator.parse import gssa_xml_to_definition
+from glossia.comparator.synthetic import DocumentGenerator
+from glossia.comparator.validate import schema, validate_document, validate_files
+from lxml import etree as ET
+from test_parse import DOCUMENT
+import pytest
+
+INVALID = b"""<simulationDefinition>
+  <parameters>
+    <parameter value="1"/>
+    <rogue/>
+  </parameters>
+  <algorithms>
+    <algorithm><content>1</content></algorithm>
+  </algorithms>
+</simulationDefinition>
+"""
+
+
+def test_valid_documents():
+    assert validate_document(DOCUMENT) == []
+    assert validate_document(DocumentGenerator(needles=3, algorithms=2).document()) == []
+    assert schema() is schema()
+
+
+def test_needle_input_is_valid():
+    # The parser takes input= in place of file= on a needle
+    document = DOCUMENT.replace(b"<needle index='2' class='boundary' file='library:cryo'/>",
+                                b"<needle index='2' class='boundary' input='library:cryo'/>")
+    assert b"input='library:cryo'" in document
+    assert validate_document(document) == []
+    assert gssa_xml_to_definition(ET.fromstring(document), validate=True).numerical_model.needles['2'].file == 'library:cryo'
+
+
+def test_all_errors_reported():
+    errors = validate_document(INVALID)
+    assert len(errors) == 3
+    assert errors[0].startswith("line 3: ")
+
+    assert validate_document(b"<simulationDefinition>")[0].startswith("line 1: ")
+
+    with pytest.raises(RuntimeError, match="Invalid GSSA-XML"):
+        gssa_xml_to_definition(ET.fromstring(INVALID), validate=True)
+
+
+def test_validate_files_in_parallel(tmp_path):
+    paths = []
+    for index in range(4):
+        path = tmp_path / ("%d.xml" % index)
+        path.write_bytes(INVALID if index == 2 else DOCUMENT)
+        paths.append(str(path))
+    paths.append(str(tmp_path / "missing.xml"))
+
+    results = validate_files(paths, processes=2, chunk_size=1)
+    assert [len(results[path]) for path in paths] == [0, 0, 3, 0, 1]